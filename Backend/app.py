@@ -1,30 +1,402 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
 from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
-from functools import wraps
+from functools import lru_cache, wraps
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import os
 from bson import ObjectId
+from bson.raw_bson import RawBSONDocument
 import uuid
+from urllib.parse import urlencode
+import math
+import time
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from query_monitor import QueryMonitor
+from profiler import SamplingProfiler
+from catalog_events import CatalogEvents
+from search_index import SearchIndex, start_search_index
+from fuzzy import FuzzyMatcher
+from suggest import TitleSuggester, start_suggester
+from similar import SimilarityIndex, start_similarity_index
+from dedupe import DuplicateIndex, start_duplicate_index
+from cache import ProductCache
+from shared_cache import SharedCache
+from mirror import CatalogMirror, start_catalog_mirror
+from records import ProductRecord, product_response
+from bson_json import RAW_CODEC_OPTIONS, FragmentEncoder, splice
+from email_filter import EmailFilter, start_email_filter
+from health import HealthProber, PoolMonitor
+from indexes import INDEXES, REQUIRED_INDEXES, build_index
+from ratelimit import RateLimiter, LocalBucketStore, SharedMemoryBucketStore
+from principal import Principal
+from tokens import RevocationSet, hash_refresh_token, new_refresh_token, new_token_id, start_revocation_sync
+from fanout import FanOut
+from deadlines import RequestDeadline, is_timeout, request_budget
+from roundtrips import RoundtripCounter, RoundtripBudgetExceeded, begin_request, end_request
 
 app = Flask(__name__)
 CORS(app)
 
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-in-production')
+# Short-lived: claims-only routes trust an access token without reading the
+# user, so a deleted or deactivated user keeps read access until it expires.
+# Clients renew it through /api/auth/refresh.
+app.config['ACCESS_TOKEN_MINUTES'] = int(os.getenv('ACCESS_TOKEN_MINUTES', '15'))
+app.config['REFRESH_TOKEN_DAYS'] = int(os.getenv('REFRESH_TOKEN_DAYS', '14'))
+# Routes marked claims_only build current_user from the access token instead of
+# fetching the user document; revocation is still checked against the jti set.
+app.config['AUTH_CLAIMS_ONLY'] = os.getenv('AUTH_CLAIMS_ONLY', '').lower() in ('1', 'true', 'yes')
+# Opt-in: claims_only routes look the user up on the fan-out pool while the
+# handler runs, and discard its response if the user no longer exists. When
+# the pool has no idle worker the lookup runs inline first instead.
+app.config['AUTH_SPECULATIVE_LOOKUP'] = os.getenv('AUTH_SPECULATIVE_LOOKUP', '').lower() in ('1', 'true', 'yes')
+# User ids (comma-separated) allowed on operator_only routes (bulk
+# registration, /debug/*). Anyone can register, so a valid token alone is
+# not enough for those.
+app.config['OPERATOR_USER_IDS'] = set(
+    user_id.strip() for user_id in os.getenv('OPERATOR_USER_IDS', '').split(',') if user_id.strip()
+)
+app.config['DB_STATS_DEV'] = os.getenv('DB_STATS_DEV', os.getenv('FLASK_DEBUG', '')).lower() in ('1', 'true', 'yes')
+# Maximum Mongo commands per request, keyed by endpoint. Includes the auth lookup.
+app.config['DB_ROUNDTRIP_BUDGETS'] = {
+    'register_jwt': 2,
+    'login_jwt': 2,
+    'refresh_token': 3,
+    'logout': 4,
+    'verify_token': 1,
+    'get_products': 2,
+    'create_product': 2,
+    'get_product': 2,
+    'suggest_products': 1,
+    'similar_products': 1,
+    'update_product': 4,
+    'delete_product': 3,
+    'register_user': 1,
+    'register_users_bulk': 2,
+    'login_user': 1,
+    'get_user': 1
+}
+app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# Number of reverse proxies in front of the app that append to
+# X-Forwarded-For ('true' means one). 0 uses the socket peer address.
+trust_proxy = os.getenv('RATE_LIMIT_TRUST_PROXY', '0').lower()
+app.config['RATE_LIMIT_TRUST_PROXY'] = 1 if trust_proxy in ('true', 'yes') else int(trust_proxy) if trust_proxy.isdigit() else 0
+# (key, capacity, per seconds) buckets, checked in order before any DB lookup
+# or hashing. IP buckets come first so a throttled address never reaches the
+# per-email bucket.
+app.config['RATE_LIMIT_RULES'] = {
+    'login': [('ip', 30, 60), ('email', 10, 60)],
+    'register': [('ip', 10, 60)],
+    'register_bulk': [('ip', 5, 3600)]
+}
+# None means strict only under app.testing, so over-budget handlers fail tests.
+app.config['DB_BUDGET_STRICT'] = None
+# Deadline in ms for a request's Mongo work, 0 for none. Endpoints listed in
+# REQUEST_TIMEOUTS_MS override the default; clients can shorten either with
+# an X-Request-Timeout-Ms header. Work past the deadline fails with 504.
+app.config['REQUEST_TIMEOUT_MS'] = int(os.getenv('REQUEST_TIMEOUT_MS', '5000'))
+app.config['REQUEST_TIMEOUTS_MS'] = {
+    'register_users_bulk': int(os.getenv('BULK_REQUEST_TIMEOUT_MS', '60000'))
+}
 
 MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/')
-client = MongoClient(MONGO_URI)
+# Bulk rows are hashed on a process pool. Unless BULK_REGISTRATION_LIMIT is
+# set, the row limit is derived from the measured hash cost so a full batch
+# hashes in about half of the bulk request deadline.
+BULK_HASH_WORKERS = int(os.getenv('BULK_HASH_WORKERS', str(os.cpu_count() or 1)))
+BULK_REGISTRATION_MAX = 1000
+PRICE_FACET_BOUNDARIES = [0, 10, 25, 50, 100, 250, 500, 1000]
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+query_monitor = QueryMonitor(slow_ms=SLOW_QUERY_MS)
+roundtrip_counter = RoundtripCounter(measure_bytes=app.config['DB_STATS_DEV'])
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+pool_monitor = PoolMonitor()
+client = MongoClient(
+    MONGO_URI,
+    maxPoolSize=MONGO_MAX_POOL_SIZE,
+    event_listeners=[query_monitor, roundtrip_counter, pool_monitor]
+)
+query_monitor.attach(client)
 db = client['registration_db']
 users_collection = db['users']
 products_collection = db['products']
+refresh_tokens_collection = db['refresh_tokens']
+revoked_tokens_collection = db['revoked_tokens']
+
+# Pool for running a request's independent DB calls concurrently.
+fanout = FanOut(
+    max_workers=int(os.getenv('FANOUT_WORKERS', '16')),
+    timeout=float(os.getenv('FANOUT_TIMEOUT_SECONDS', '10'))
+)
+
+profiler = SamplingProfiler(interval=float(os.getenv('PROFILER_INTERVAL_MS', '10')) / 1000)
+if os.getenv('PROFILER_AUTOSTART', '').lower() in ('1', 'true', 'yes'):
+    profiler.start()
+
+def create_rate_limit_store():
+    if os.getenv('RATE_LIMIT_STORE', 'shared') == 'shared':
+        shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+        path = os.getenv('RATE_LIMIT_PATH', os.path.join(shm_dir, 'registration-api-ratelimit'))
+        try:
+            return SharedMemoryBucketStore(path, slots=int(os.getenv('RATE_LIMIT_SLOTS', '65536')))
+        except (OSError, RuntimeError) as e:
+            app.logger.warning('Falling back to per-process rate limiting: %s', e)
+    return LocalBucketStore()
+
+rate_limiter = RateLimiter(create_rate_limit_store(), app.config['RATE_LIMIT_RULES'])
+
+# Indexes are built by the prober once Mongo is reachable, so startup does not
+# block on the database and /readyz stays false until the required ones exist.
+health_prober = HealthProber(
+    db,
+    pool_monitor,
+    MONGO_MAX_POOL_SIZE,
+    INDEXES,
+    lambda name: build_index(db, name),
+    interval=float(os.getenv('HEALTH_CHECK_INTERVAL', '2')),
+    saturation_limit=float(os.getenv('POOL_SATURATION_LIMIT', '0.9')),
+    required=REQUIRED_INDEXES,
+    retry_max=float(os.getenv('INDEX_RETRY_MAX_SECONDS', '300'))
+)
+health_prober.start()
+
+# Revoked access-token ids, synced from revoked_tokens so logouts on any
+# worker are enforced everywhere without a per-request DB lookup.
+revocations = RevocationSet(clock_margin=float(os.getenv('REVOCATION_CLOCK_MARGIN_SECONDS', '30')))
+start_revocation_sync(revocations, revoked_tokens_collection, float(os.getenv('REVOCATION_SYNC_SECONDS', '5')))
+
+# In-memory catalog structures follow product writes through these events.
+catalog_events = CatalogEvents()
+
+SEARCH_ENGINE = os.getenv('SEARCH_ENGINE', 'text')
+SEARCH_MAX_CANDIDATES = int(os.getenv('SEARCH_MAX_CANDIDATES', '1000'))
+search_index = SearchIndex()
+fuzzy_matcher = FuzzyMatcher()
+if SEARCH_ENGINE == 'inverted':
+    search_index.vocabulary_listeners.append(fuzzy_matcher)
+    catalog_events.subscribe(search_index.apply)
+    start_search_index(
+        search_index,
+        products_collection,
+        os.getenv('SEARCH_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'search_index.snapshot')),
+        float(os.getenv('SEARCH_SNAPSHOT_SECONDS', '300'))
+    )
+
+# Opt-in: every worker holds its own suffix array of all titles.
+SUGGEST_ENABLED = os.getenv('SUGGEST_ENABLED', '').lower() in ('1', 'true', 'yes')
+title_suggester = TitleSuggester()
+if SUGGEST_ENABLED:
+    catalog_events.subscribe(title_suggester.apply)
+    start_suggester(title_suggester, products_collection)
+
+# Opt-in: every worker holds its own term matrix for the whole catalog.
+SIMILAR_ENABLED = os.getenv('SIMILAR_ENABLED', '').lower() in ('1', 'true', 'yes')
+similarity_index = SimilarityIndex()
+if SIMILAR_ENABLED:
+    catalog_events.subscribe(similarity_index.apply)
+    start_similarity_index(similarity_index, products_collection, float(os.getenv('SIMILAR_REFRESH_SECONDS', '30')))
+
+# Hot products by id for GET /api/products/<id>; PRODUCT_CACHE_SIZE=0 disables it.
+product_cache = ProductCache(
+    int(os.getenv('PRODUCT_CACHE_SIZE', '10000')),
+    float(os.getenv('PRODUCT_CACHE_TTL', '60')),
+    int(os.getenv('PRODUCT_CACHE_NEGATIVE_SIZE', '10000')),
+    float(os.getenv('PRODUCT_CACHE_NEGATIVE_TTL', '10'))
+)
+catalog_events.subscribe(product_cache.apply)
+
+# Second cache tier shared by every worker on the host: serialised products
+# and whole listing responses in mmap'd slot tables. Any product write bumps
+# the listing table's generation, which retires every cached page at once.
+def create_shared_caches():
+    if os.getenv('SHARED_CACHE_ENABLED', '').lower() not in ('1', 'true', 'yes'):
+        return None, None
+    shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    cache_dir = os.getenv('SHARED_CACHE_DIR', shm_dir)
+    try:
+        products = SharedCache(
+            os.path.join(cache_dir, 'registration-api-products'),
+            slots=int(os.getenv('SHARED_CACHE_PRODUCT_SLOTS', '8192')),
+            slot_size=int(os.getenv('SHARED_CACHE_PRODUCT_BYTES', '4096')),
+            ttl=float(os.getenv('PRODUCT_CACHE_TTL', '60'))
+        )
+        listings = SharedCache(
+            os.path.join(cache_dir, 'registration-api-listings'),
+            slots=int(os.getenv('SHARED_CACHE_LISTING_SLOTS', '1024')),
+            slot_size=int(os.getenv('SHARED_CACHE_LISTING_BYTES', '65536')),
+            ttl=float(os.getenv('SHARED_CACHE_LISTING_TTL', '30')),
+            versioned=True
+        )
+        return products, listings
+    except (OSError, RuntimeError) as e:
+        app.logger.warning('Shared cache tier disabled: %s', e)
+        return None, None
+
+shared_products, shared_listings = create_shared_caches()
+
+def invalidate_shared_caches(operation, document):
+    if shared_products is not None:
+        if document.get('id') is not None:
+            shared_products.invalidate(document.get('id'))
+        else:
+            # Change-stream deletes carry only _id, and products are keyed by id.
+            shared_products.clear()
+        shared_listings.invalidate()
+
+catalog_events.subscribe(invalidate_shared_caches)
+
+# Optional full copy of the catalog in every worker. Listings without a
+# keyword and id lookups are served from it while its last sync is within
+# CATALOG_MIRROR_MAX_STALENESS seconds; otherwise they go to Mongo.
+CATALOG_MIRROR = os.getenv('CATALOG_MIRROR', '').lower() in ('1', 'true', 'yes')
+catalog_mirror = CatalogMirror(
+    PRICE_FACET_BOUNDARIES,
+    max_staleness=float(os.getenv('CATALOG_MIRROR_MAX_STALENESS', '10')),
+    clock_margin=float(os.getenv('CATALOG_MIRROR_CLOCK_MARGIN', '30'))
+)
+if CATALOG_MIRROR:
+    catalog_events.subscribe(catalog_mirror.apply)
+    start_catalog_mirror(catalog_mirror, products_collection, float(os.getenv('CATALOG_MIRROR_POLL_SECONDS', '2')))
+
+# LISTING_ENCODER=raw reads listing pages as RawBSONDocuments and builds the
+# products array from JSON fragments memoised by each product's raw bytes,
+# so products already seen are never decoded into dicts.
+LISTING_ENCODER = os.getenv('LISTING_ENCODER', 'dict')
+PRODUCTS_MARKER = 'products-%s' % uuid.uuid4().hex
+raw_products_collection = None
+if LISTING_ENCODER == 'raw':
+    raw_products_collection = products_collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+# LISTING_STRATEGY=parallel fetches the page and the counts/facets as two
+# concurrent queries instead of one $facet aggregation, so the page does not
+# wait for the full match to be counted and the counts skip the sort.
+LISTING_STRATEGY = os.getenv('LISTING_STRATEGY', 'facet')
+if LISTING_STRATEGY == 'parallel':
+    app.config['DB_ROUNDTRIP_BUDGETS']['get_products'] += 1
+product_fragments = FragmentEncoder(
+    lambda document: app.json.dumps(product_response(document), separators=(',', ':')),
+    capacity=int(os.getenv('LISTING_FRAGMENT_CACHE', '10000'))
+)
+
+# Near-duplicate check on create: 'flag' records matches on the new product,
+# 'reject' refuses it with 409, 'off' skips the index entirely.
+DEDUPE_MODE = os.getenv('DEDUPE_MODE', 'off').lower()
+duplicate_index = DuplicateIndex(threshold=float(os.getenv('DEDUPE_THRESHOLD', '0.8')))
+if DEDUPE_MODE in ('flag', 'reject'):
+    catalog_events.subscribe(duplicate_index.apply)
+    start_duplicate_index(duplicate_index, products_collection)
+
+if os.getenv('CATALOG_CHANGE_STREAM', 'true').lower() in ('1', 'true', 'yes'):
+    catalog_events.watch(products_collection)
+
+# Definite "not registered" answers skip the users lookup on login. They are
+# only given when every app worker writing to this database runs on this
+# host (EMAIL_FILTER_SINGLE_HOST) and the filter was verified recently, so
+# the filter is not loaded at all otherwise.
+EMAIL_FILTER_REFRESH_SECONDS = float(os.getenv('EMAIL_FILTER_REFRESH_SECONDS', '30'))
+email_filter = EmailFilter(
+    os.getenv('EMAIL_FILTER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'email_filter.bloom')),
+    capacity=int(os.getenv('EMAIL_FILTER_CAPACITY', '1000000')),
+    max_staleness=EMAIL_FILTER_REFRESH_SECONDS * 3 if EMAIL_FILTER_REFRESH_SECONDS > 0 else None,
+    single_host=os.getenv('EMAIL_FILTER_SINGLE_HOST', 'false').lower() in ('1', 'true', 'yes')
+)
+if email_filter.single_host and os.getenv('EMAIL_FILTER_ENABLED', 'true').lower() in ('1', 'true', 'yes'):
+    start_email_filter(email_filter, users_collection, EMAIL_FILTER_REFRESH_SECONDS)
+
+@app.before_request
+def start_db_stats():
+    g.db_stats, g.db_stats_token = begin_request()
+
+@app.after_request
+def report_db_stats(response):
+    stats = g.get('db_stats')
+    if stats is None:
+        return response
+
+    if app.debug or app.config['DB_STATS_DEV']:
+        response.headers['X-DB-Roundtrips'] = str(stats.commands)
+        if roundtrip_counter.measure_bytes:
+            response.headers['X-DB-Bytes-Sent'] = str(stats.bytes_sent)
+            response.headers['X-DB-Bytes-Received'] = str(stats.bytes_received)
+        app.logger.info('%s %s db_stats=%s', request.method, request.path, stats.to_dict())
+
+    budget = app.config['DB_ROUNDTRIP_BUDGETS'].get(request.endpoint)
+    if budget is not None and stats.commands > budget:
+        message = '%s made %d DB roundtrips, budget is %d: %s' % (
+            request.endpoint, stats.commands, budget, dict(stats.by_command)
+        )
+        strict = app.config['DB_BUDGET_STRICT']
+        if strict is None:
+            strict = app.testing
+        if strict:
+            raise RoundtripBudgetExceeded(message)
+        app.logger.warning(message)
+
+    return response
+
+@app.before_request
+def mark_profiled_request():
+    profiler.request_started()
+
+@app.before_request
+def start_deadline():
+    budget = request_budget(
+        app.config['REQUEST_TIMEOUTS_MS'].get(request.endpoint, app.config['REQUEST_TIMEOUT_MS']),
+        request.headers.get('X-Request-Timeout-Ms')
+    )
+    if budget is not None:
+        g.deadline = RequestDeadline(budget).__enter__()
+
+@app.teardown_request
+def finish_deadline(exc):
+    deadline = g.pop('deadline', None)
+    if deadline is not None:
+        deadline.__exit__(None, None, None)
+
+@app.teardown_request
+def unmark_profiled_request(exc):
+    profiler.request_finished()
+
+@app.teardown_request
+def finish_db_stats(exc):
+    token = g.pop('db_stats_token', None)
+    if token is not None:
+        end_request(token)
+
+def request_deadline():
+    deadline = time.monotonic() + fanout.timeout
+    if g.get('deadline') is not None:
+        deadline = min(deadline, g.deadline.expires_at)
+    return deadline
+
+def server_error(e):
+    if is_timeout(e):
+        return jsonify({
+            'error': 'Request deadline exceeded',
+            'details': str(e)
+        }), 504
+    return jsonify({
+        'error': 'Internal server error',
+        'details': str(e)
+    }), 500
+
+@app.errorhandler(PyMongoError)
+@app.errorhandler(TimeoutError)
+def unhandled_timeout(e):
+    return server_error(e)
+
+def load_user(user_id):
+    return users_collection.find_one({'_id': user_id})
 
-users_collection.create_index("email", unique=True)
-products_collection.create_index([("title", "text"), ("description", "text")])
+def auth_middleware(f=None, claims_only=False, operator_only=False):
+    if f is None:
+        return lambda f: auth_middleware(f, claims_only=claims_only, operator_only=operator_only)
 
-def auth_middleware(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -41,7 +413,19 @@ def auth_middleware(f):
         
         try:
             data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=['HS256'])
-            current_user = users_collection.find_one({'_id': ObjectId(data['user_id'])})
+            if data.get('jti') in revocations:
+                return jsonify({'error': 'Token has been revoked'}), 401
+            g.token_claims = data
+            lookup = None
+            current_user = None
+            if claims_only and app.config['AUTH_CLAIMS_ONLY'] and data.get('type') == 'access':
+                current_user = Principal(data, load_user)
+            elif claims_only and app.config['AUTH_SPECULATIVE_LOOKUP'] and data.get('type') == 'access':
+                lookup = fanout.try_submit(load_user, ObjectId(data['user_id']))
+                if lookup is not None:
+                    current_user = Principal(data, lambda user_id: lookup.result(timeout=max(request_deadline() - time.monotonic(), 0)))
+            if current_user is None:
+                current_user = load_user(ObjectId(data['user_id']))
             if not current_user:
                 return jsonify({'error': 'User not found'}), 401
         except jwt.ExpiredSignatureError:
@@ -49,14 +433,92 @@ def auth_middleware(f):
         except jwt.InvalidTokenError:
             return jsonify({'error': 'Token is invalid'}), 401
         except Exception as e:
+            if is_timeout(e):
+                return server_error(e)
             return jsonify({'error': 'Token validation failed'}), 401
-        
-        return f(current_user, *args, **kwargs)
+
+        if operator_only and str(current_user['_id']) not in app.config['OPERATOR_USER_IDS']:
+            return jsonify({'error': 'Operator access required'}), 403
+
+        response = f(current_user, *args, **kwargs)
+        if lookup is not None:
+            try:
+                user = lookup.result(timeout=max(request_deadline() - time.monotonic(), 0))
+            except Exception as e:
+                if is_timeout(e):
+                    return server_error(e)
+                return jsonify({'error': 'Token validation failed'}), 401
+            if not user:
+                return jsonify({'error': 'User not found'}), 401
+        return response
     
     return decorated
 
+def client_ip():
+    # Only hops appended by our own proxies can be trusted; anything to their
+    # left was sent by the client. With n proxies the client address is the
+    # n-th hop from the right.
+    proxies = app.config['RATE_LIMIT_TRUST_PROXY']
+    if proxies:
+        hops = [hop.strip() for hop in request.headers.get('X-Forwarded-For', '').split(',') if hop.strip()]
+        if len(hops) >= proxies:
+            return hops[-proxies]
+    return request.remote_addr
+
+def rate_limited(rule_name):
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            if not app.config['RATE_LIMIT_ENABLED']:
+                return f(*args, **kwargs)
+
+            data = request.get_json(silent=True)
+            email = data.get('email') if isinstance(data, dict) else None
+            keys = {
+                'ip': client_ip(),
+                'email': email.strip().lower() if isinstance(email, str) else None
+            }
+
+            throttled_by, retry_after = rate_limiter.check(rule_name, keys)
+            if throttled_by:
+                retry_after = max(1, int(math.ceil(retry_after)))
+                response = jsonify({
+                    'error': 'Too many requests, please try again later',
+                    'retryAfter': retry_after
+                })
+                response.headers['Retry-After'] = str(retry_after)
+                return response, 429
+
+            return f(*args, **kwargs)
+
+        return decorated
+
+    return decorator
+
+def email_index_required(f):
+    # Registration relies on the unique email index to reject duplicates.
+    # The health prober builds it in the background, so until it exists
+    # writes are refused; a duplicate inserted meanwhile would make the
+    # index build fail and leave uniqueness unenforced for good. Other
+    # indexes do not gate registration.
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if not health_prober.index_ready('users.email'):
+            response = jsonify({'error': 'Registration is not available yet, please try again shortly'})
+            response.headers['Retry-After'] = '5'
+            return response, 503
+        return f(*args, **kwargs)
+
+    return decorated
+
+def string_field_errors(data, fields):
+    # Validators call str methods, so reject other JSON types up front.
+    return {field: 'Must be a string' for field in fields if field in data and not isinstance(data[field], str)}
+
 def validate_auth_data(data, is_login=False):
-    errors = {}
+    errors = string_field_errors(data, ('name', 'email', 'password'))
+    if errors:
+        return errors
 
     if not is_login:
         name = data.get('name', '').strip()
@@ -66,7 +528,7 @@ def validate_auth_data(data, is_login=False):
             errors['name'] = 'Name must be at least 2 characters long'
 
     email = data.get('email', '').strip().lower()
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}
+    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     if not email:
         errors['email'] = 'Email is required'
     elif not re.match(email_pattern, email):
@@ -81,7 +543,9 @@ def validate_auth_data(data, is_login=False):
     return errors
 
 def validate_registration_data(data):
-    errors = {}
+    errors = string_field_errors(data, ('fullName', 'email', 'phone', 'password', 'confirmPassword'))
+    if errors:
+        return errors
 
     full_name = data.get('fullName', '').strip()
     if not full_name:
@@ -90,7 +554,7 @@ def validate_registration_data(data):
         errors['fullName'] = 'Full Name must be at least 2 characters long'
 
     email = data.get('email', '').strip().lower()
-    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}
+    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     if not email:
         errors['email'] = 'Email is required'
     elif not re.match(email_pattern, email):
@@ -119,7 +583,92 @@ def validate_registration_data(data):
 
     return errors
 
+def issue_access_token(user_id, email, name):
+    expires_at = datetime.utcnow() + timedelta(minutes=app.config['ACCESS_TOKEN_MINUTES'])
+    return jwt.encode({
+        'user_id': user_id,
+        'email': email,
+        'name': name,
+        'jti': new_token_id(),
+        'type': 'access',
+        'exp': expires_at
+    }, app.config['SECRET_KEY'], algorithm='HS256')
+
+def issue_refresh_token(user_id, family=None):
+    refresh_token = new_refresh_token()
+    now = datetime.utcnow()
+    refresh_tokens_collection.insert_one({
+        '_id': hash_refresh_token(refresh_token),
+        'userId': user_id,
+        'family': family or new_token_id(),
+        'createdAt': now,
+        'expiresAt': now + timedelta(days=app.config['REFRESH_TOKEN_DAYS']),
+        'usedAt': None,
+        'revoked': False
+    })
+    return refresh_token
+
+def token_pair(user_id, email, name, family=None):
+    return {
+        'token': issue_access_token(user_id, email, name),
+        'refreshToken': issue_refresh_token(user_id, family),
+        'expiresIn': app.config['ACCESS_TOKEN_MINUTES'] * 60
+    }
+
+def revoke_access_token(claims):
+    expires_at = datetime.utcfromtimestamp(claims['exp'])
+    revocations.add(claims['jti'], expires_at)
+    revoked_tokens_collection.update_one(
+        {'_id': claims['jti']},
+        {'$set': {'expiresAt': expires_at, 'revokedAt': datetime.utcnow()}},
+        upsert=True
+    )
+
+def registration_document(data, password_hash=None):
+    return {
+        'fullName': data['fullName'].strip(),
+        'email': data['email'].strip().lower(),
+        'phone': re.sub(r'\D', '', data['phone'].strip()),
+        'password': password_hash or generate_password_hash(data['password']),
+        'createdAt': datetime.utcnow(),
+        'isActive': True
+    }
+
+# Created on first use, so workers forked by the server each get their own.
+bulk_hash_executor = None
+bulk_hash_executor_lock = threading.Lock()
+
+def bulk_hash_pool():
+    global bulk_hash_executor
+    with bulk_hash_executor_lock:
+        if bulk_hash_executor is None:
+            bulk_hash_executor = ProcessPoolExecutor(max_workers=BULK_HASH_WORKERS)
+        return bulk_hash_executor
+
+@lru_cache(maxsize=1)
+def password_hash_seconds():
+    started = time.perf_counter()
+    generate_password_hash(uuid.uuid4().hex)
+    return time.perf_counter() - started
+
+def bulk_registration_limit():
+    if os.getenv('BULK_REGISTRATION_LIMIT'):
+        return int(os.getenv('BULK_REGISTRATION_LIMIT'))
+    budget = app.config['REQUEST_TIMEOUTS_MS'].get('register_users_bulk', app.config['REQUEST_TIMEOUT_MS']) / 1000.0
+    if not budget:
+        return BULK_REGISTRATION_MAX
+    rows = int(budget * 0.5 * BULK_HASH_WORKERS / password_hash_seconds())
+    return max(1, min(rows, BULK_REGISTRATION_MAX))
+
+def email_taken_response():
+    return jsonify({
+        'error': 'Validation failed',
+        'errors': {'email': 'Email already registered'}
+    }), 400
+
 @app.route('/api/auth/register', methods=['POST'])
+@rate_limited('register')
+@email_index_required
 def register_jwt():
     try:
         data = request.get_json()
@@ -134,13 +683,6 @@ def register_jwt():
                 'errors': validation_errors
             }), 400
 
-        existing_user = users_collection.find_one({'email': data['email'].strip().lower()})
-        if existing_user:
-            return jsonify({
-                'error': 'Validation failed',
-                'errors': {'email': 'Email already registered'}
-            }), 400
-
         hashed_password = generate_password_hash(data['password'])
 
         user_data = {
@@ -151,18 +693,19 @@ def register_jwt():
             'isActive': True
         }
 
-        result = users_collection.insert_one(user_data)
+        # The unique email index rejects duplicates, including concurrent double-submits.
+        try:
+            result = users_collection.insert_one(user_data)
+        except DuplicateKeyError:
+            return email_taken_response()
+        email_filter.add(user_data['email'], user_data['createdAt'])
         user_id = str(result.inserted_id)
 
-        token = jwt.encode({
-            'user_id': user_id,
-            'email': user_data['email'],
-            'exp': datetime.utcnow() + timedelta(hours=24)
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        tokens = token_pair(user_id, user_data['email'], user_data['name'])
 
         return jsonify({
             'message': 'User registered successfully',
-            'token': token,
+            **tokens,
             'user': {
                 'id': user_id,
                 'name': user_data['name'],
@@ -172,12 +715,10 @@ def register_jwt():
         }), 201
 
     except Exception as e:
-        return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+        return server_error(e)
 
 @app.route('/api/auth/login', methods=['POST'])
+@rate_limited('login')
 def login_jwt():
     try:
         data = request.get_json()
@@ -192,20 +733,20 @@ def login_jwt():
                 'errors': validation_errors
             }), 400
 
-        user = users_collection.find_one({'email': data['email'].strip().lower()})
+        email = data['email'].strip().lower()
+        if not email_filter.might_contain(email):
+            return jsonify({'error': 'Invalid email or password'}), 401
+
+        user = users_collection.find_one({'email': email})
 
         if not user or not check_password_hash(user['password'], data['password']):
             return jsonify({'error': 'Invalid email or password'}), 401
 
-        token = jwt.encode({
-            'user_id': str(user['_id']),
-            'email': user['email'],
-            'exp': datetime.utcnow() + timedelta(hours=24)
-        }, app.config['SECRET_KEY'], algorithm='HS256')
+        tokens = token_pair(str(user['_id']), user['email'], user.get('name', user.get('fullName', '')))
 
         return jsonify({
             'message': 'Login successful',
-            'token': token,
+            **tokens,
             'user': {
                 'id': str(user['_id']),
                 'name': user.get('name', user.get('fullName', '')),
@@ -214,13 +755,68 @@ def login_jwt():
         }), 200
 
     except Exception as e:
+        return server_error(e)
+
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh_token():
+    try:
+        data = request.get_json(silent=True) or {}
+        presented = data.get('refreshToken')
+        if not presented or not isinstance(presented, str):
+            return jsonify({'error': 'Refresh token is required'}), 400
+
+        token_hash = hash_refresh_token(presented)
+        now = datetime.utcnow()
+        stored = refresh_tokens_collection.find_one_and_update(
+            {'_id': token_hash, 'usedAt': None, 'revoked': False, 'expiresAt': {'$gt': now}},
+            {'$set': {'usedAt': now}}
+        )
+
+        if not stored:
+            reused = refresh_tokens_collection.find_one({'_id': token_hash})
+            if reused and reused['usedAt'] is not None and not reused['revoked']:
+                # A rotated token came back: assume it was stolen and end the whole session.
+                refresh_tokens_collection.update_many({'family': reused['family']}, {'$set': {'revoked': True}})
+            return jsonify({'error': 'Refresh token is invalid'}), 401
+
+        user = users_collection.find_one({'_id': ObjectId(stored['userId'])}, {'password': 0})
+        if not user or not user.get('isActive', True):
+            return jsonify({'error': 'User not found'}), 401
+
+        tokens = token_pair(
+            str(user['_id']), user['email'], user.get('name', user.get('fullName', '')), stored['family']
+        )
+
         return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+            'message': 'Token refreshed successfully',
+            **tokens
+        }), 200
 
-@app.route('/api/auth/verify', methods=['GET'])
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/auth/logout', methods=['POST'])
 @auth_middleware
+def logout(current_user):
+    try:
+        claims = g.token_claims
+        if claims.get('jti'):
+            revoke_access_token(claims)
+
+        data = request.get_json(silent=True) or {}
+        presented = data.get('refreshToken')
+        if isinstance(presented, str) and presented:
+            stored = refresh_tokens_collection.find_one({'_id': hash_refresh_token(presented)})
+            if stored and stored['userId'] == str(current_user['_id']):
+                refresh_tokens_collection.update_many({'family': stored['family']}, {'$set': {'revoked': True}})
+
+        return jsonify({'message': 'Logged out successfully'}), 200
+
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/api/auth/verify', methods=['GET'])
+@auth_middleware(claims_only=True)
 def verify_token(current_user):
     return jsonify({
         'message': 'Token is valid',
@@ -231,10 +827,75 @@ def verify_token(current_user):
         }
     }), 200
 
+def parse_date_param(value):
+    # Stored dates are naive UTC; offsets are converted, naive input is taken as UTC.
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def build_product_filter(args):
+    query_filter = {}
+    filters = {}
+    errors = {}
+
+    keyword = args.get('keyword', '')
+    if keyword:
+        query_filter['$text'] = {'$search': keyword}
+
+    price_range = {}
+    for param, operator in (('minPrice', '$gte'), ('maxPrice', '$lte')):
+        if args.get(param):
+            try:
+                price_range[operator] = float(args[param])
+                filters[param] = price_range[operator]
+            except ValueError:
+                errors[param] = f'{param} must be a valid number'
+    if price_range:
+        query_filter['price'] = price_range
+
+    created_by = args.get('createdBy', '')
+    if created_by:
+        query_filter['createdBy'] = created_by
+        filters['createdBy'] = created_by
+
+    created_range = {}
+    for param, operator in (('createdFrom', '$gte'), ('createdTo', '$lt')):
+        if args.get(param):
+            value = parse_date_param(args[param])
+            if value is None:
+                errors[param] = f'{param} must be an ISO 8601 date'
+            else:
+                created_range[operator] = value
+                filters[param] = args[param]
+    if created_range:
+        query_filter['createdAt'] = created_range
+
+    return query_filter, filters, errors
+
+def price_facet(buckets):
+    counts = {bucket['_id']: bucket['count'] for bucket in buckets}
+    ranges = []
+    for index, lower in enumerate(PRICE_FACET_BOUNDARIES[:-1]):
+        ranges.append({'min': lower, 'max': PRICE_FACET_BOUNDARIES[index + 1], 'count': counts.get(lower, 0)})
+    ranges.append({'min': PRICE_FACET_BOUNDARIES[-1], 'max': None, 'count': counts.get('other', 0)})
+    return ranges
+
 @app.route('/api/products', methods=['GET'])
-@auth_middleware
+@auth_middleware(claims_only=True)
 def get_products(current_user):
     try:
+        listing_key = None
+        if shared_listings is not None:
+            listing_key = urlencode(sorted(request.args.items(multi=True)))
+            body = shared_listings.get(listing_key)
+            if body is not None:
+                return app.response_class(body, mimetype=app.json.mimetype), 200
+            listing_generation = shared_listings.generation
+
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
         sort_param = request.args.get('sort', '-createdAt')
@@ -245,40 +906,106 @@ def get_products(current_user):
         if limit < 1 or limit > 100:
             limit = 10
 
-        query_filter = {}
-        if keyword:
-            query_filter['$text'] = {'$search': keyword}
+        query_filter, filters, errors = build_product_filter(request.args)
+        if errors:
+            return jsonify({
+                'error': 'Validation failed',
+                'errors': errors
+            }), 400
+
+        fuzzy = request.args.get('fuzzy', '').lower() in ('1', 'true', 'yes')
+        ranked_ids = None
+        total_capped = False
+        if keyword and SEARCH_ENGINE == 'inverted' and search_index.ready:
+            # Fuzzy mode replaces misspelled words with close vocabulary terms
+            # before scoring; without the index it falls back to plain $text.
+            weighted_terms = fuzzy_matcher.weighted_terms(keyword) if fuzzy else None
+            matches, candidates = search_index.search(
+                keyword, SEARCH_MAX_CANDIDATES, weighted_terms=weighted_terms, with_total=True
+            )
+            ranked_ids = [product_id for product_id, _ in matches]
+            # Only the best SEARCH_MAX_CANDIDATES matches can be paged through.
+            total_capped = candidates > len(ranked_ids)
+            del query_filter['$text']
+            query_filter['id'] = {'$in': ranked_ids}
+
+        skip = (page - 1) * limit
 
-        sort_criteria = []
-        if sort_param:
+        pipeline = [{'$match': query_filter}]
+        if sort_param == 'relevance' and ranked_ids is not None:
+            pipeline.append({'$addFields': {'_relevance': {'$indexOfArray': [ranked_ids, '$id']}}})
+            pipeline.append({'$sort': {'_relevance': 1}})
+            pipeline.append({'$project': {'_relevance': 0}})
+        elif sort_param == 'relevance':
+            if keyword:
+                pipeline.append({'$sort': {'_relevance': {'$meta': 'textScore'}}})
+        elif sort_param:
             if sort_param.startswith('-'):
                 field = sort_param[1:]
                 direction = -1
             else:
                 field = sort_param
                 direction = 1
-            sort_criteria.append((field, direction))
-
-        skip = (page - 1) * limit
-
-        cursor = products_collection.find(query_filter)
-
-        if sort_criteria:
-            cursor = cursor.sort(sort_criteria)
-
-        cursor = cursor.skip(skip).limit(limit)
-
-        products = list(cursor)
-
-        for product in products:
-            product['_id'] = str(product['_id'])
-            if 'createdAt' in product:
-                product['createdAt'] = product['createdAt'].isoformat()
-
-        total_count = products_collection.count_documents(query_filter)
+            # Sorting ahead of $facet lets the sort use an index; stages inside
+            # $facet cannot.
+            pipeline.append({'$sort': {field: direction}})
+
+        facets = {
+            'total': [{'$count': 'count'}],
+            'priceRanges': [{'$bucket': {
+                'groupBy': '$price',
+                'boundaries': PRICE_FACET_BOUNDARIES,
+                'default': 'other',
+                'output': {'count': {'$sum': 1}}
+            }}],
+            'creators': [
+                {'$group': {'_id': '$createdBy', 'count': {'$sum': 1}}},
+                {'$sort': {'count': -1}},
+                {'$limit': 10}
+            ]
+        }
+        # Page, total and facet counts come back from a single roundtrip.
+        pipeline.append({'$facet': dict(facets, items=[{'$skip': skip}, {'$limit': limit}])})
+
+        if CATALOG_MIRROR and not keyword and catalog_mirror.supports(sort_param) and catalog_mirror.fresh():
+            price_range = query_filter.get('price', {})
+            created_range = query_filter.get('createdAt', {})
+            result = catalog_mirror.listing(
+                sort_param,
+                skip,
+                limit,
+                min_price=price_range.get('$gte'),
+                max_price=price_range.get('$lte'),
+                created_by=query_filter.get('createdBy'),
+                created_from=created_range.get('$gte'),
+                created_to=created_range.get('$lt')
+            )
+        elif LISTING_STRATEGY == 'parallel':
+            page_collection = raw_products_collection if LISTING_ENCODER == 'raw' else products_collection
+            page_pipeline = pipeline[:-1] + [{'$skip': skip}, {'$limit': limit}]
+            items, counts = fanout.gather(
+                lambda: list(page_collection.aggregate(page_pipeline, allowDiskUse=True)),
+                lambda: next(products_collection.aggregate([pipeline[0], {'$facet': facets}], allowDiskUse=True), None) or {},
+                deadline=request_deadline()
+            )
+            result = dict(counts, items=items)
+        elif LISTING_ENCODER == 'raw':
+            result = next(raw_products_collection.aggregate(pipeline, allowDiskUse=True), None) or {}
+        else:
+            result = next(products_collection.aggregate(pipeline, allowDiskUse=True), None) or {}
+
+        items = result.get('items', [])
+        products_json = None
+        if items and isinstance(items[0], RawBSONDocument):
+            products_json = product_fragments.encode_array(items)
+            products = PRODUCTS_MARKER
+        else:
+            products = [product_response(product) for product in items]
+
+        total_count = result['total'][0]['count'] if result.get('total') else 0
         total_pages = (total_count + limit - 1) // limit
 
-        return jsonify({
+        response = {
             'message': 'Products retrieved successfully',
             'products': products,
             'pagination': {
@@ -287,19 +1014,31 @@ def get_products(current_user):
                 'totalItems': total_count,
                 'itemsPerPage': limit,
                 'hasNext': page < total_pages,
-                'hasPrev': page > 1
+                'hasPrev': page > 1,
+                'totalCapped': total_capped
             },
-            'filters': {
-                'keyword': keyword,
-                'sort': sort_param
+            'filters': dict(filters, keyword=keyword, sort=sort_param, fuzzy=fuzzy and ranked_ids is not None),
+            'facets': {
+                'priceRanges': price_facet(result.get('priceRanges', [])),
+                'creators': [
+                    {'createdBy': creator['_id'], 'count': creator['count']}
+                    for creator in result.get('creators', [])
+                ]
             }
-        }), 200
+        }
+
+        if listing_key is None and products_json is None:
+            return jsonify(response), 200
+        body = jsonify(response).get_data(as_text=True)
+        if products_json is not None:
+            body = splice(body, PRODUCTS_MARKER, products_json)
+        body = body.encode()
+        if listing_key is not None:
+            shared_listings.put(listing_key, body, listing_generation)
+        return app.response_class(body, mimetype=app.json.mimetype), 200
 
     except Exception as e:
-        return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+        return server_error(e)
 
 @app.route('/api/products', methods=['POST'])
 @auth_middleware
@@ -330,6 +1069,9 @@ def create_product(current_user):
                 'errors': errors
             }), 400
 
+        # BSON dates keep milliseconds; in-memory copies should match what Mongo stores.
+        now = datetime.utcnow()
+        now = now.replace(microsecond=now.microsecond // 1000 * 1000)
         product_data = {
             'id': str(uuid.uuid4()),
             'title': data['title'].strip(),
@@ -337,12 +1079,25 @@ def create_product(current_user):
             'price': float(data['price']),
             'image': data.get('image', 'https://via.placeholder.com/300x200'),
             'createdBy': str(current_user['_id']),
-            'createdAt': datetime.utcnow()
+            'createdAt': now,
+            'updatedAt': now
         }
 
+        if DEDUPE_MODE in ('flag', 'reject') and duplicate_index.ready:
+            duplicates = duplicate_index.query(product_data)
+            if duplicates and DEDUPE_MODE == 'reject':
+                return jsonify({
+                    'error': 'Product is a near-duplicate of an existing product',
+                    'duplicates': duplicates
+                }), 409
+            if duplicates:
+                product_data['possibleDuplicateOf'] = [duplicate['id'] for duplicate in duplicates]
+
         result = products_collection.insert_one(product_data)
+        catalog_events.publish('upsert', dict(product_data))
         product_data['_id'] = str(result.inserted_id)
         product_data['createdAt'] = product_data['createdAt'].isoformat()
+        product_data['updatedAt'] = product_data['updatedAt'].isoformat()
 
         return jsonify({
             'message': 'Product created successfully',
@@ -350,34 +1105,95 @@ def create_product(current_user):
         }), 201
 
     except Exception as e:
+        return server_error(e)
+
+@app.route('/api/products/suggest', methods=['GET'])
+@auth_middleware(claims_only=True)
+def suggest_products(current_user):
+    try:
+        query = request.args.get('q', '')
+        limit = int(request.args.get('limit', 10))
+        if limit < 1 or limit > 20:
+            limit = 10
+
+        if not SUGGEST_ENABLED:
+            return jsonify({'error': 'Suggestions are not enabled'}), 404
+        if not title_suggester.ready:
+            return jsonify({'error': 'Suggestions are not available yet'}), 503
+
         return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+            'message': 'Suggestions retrieved successfully',
+            'query': query,
+            'suggestions': title_suggester.suggest(query, limit)
+        }), 200
+
+    except ValueError:
+        return jsonify({'error': 'Limit must be a number'}), 400
+
+@app.route('/api/products/<product_id>/similar', methods=['GET'])
+@auth_middleware(claims_only=True)
+def similar_products(current_user, product_id):
+    try:
+        limit = int(request.args.get('limit', 10))
+        if limit < 1 or limit > 50:
+            limit = 10
+
+        if not SIMILAR_ENABLED:
+            return jsonify({'error': 'Similar products are not enabled'}), 404
+        if not similarity_index.ready:
+            return jsonify({'error': 'Similar products are not available yet'}), 503
+
+        products = similarity_index.similar(product_id, limit)
+        if products is None:
+            return jsonify({'error': 'Product not found'}), 404
+
+        return jsonify({
+            'message': 'Similar products retrieved successfully',
+            'productId': product_id,
+            'products': products
+        }), 200
+
+    except ValueError:
+        return jsonify({'error': 'Limit must be a number'}), 400
 
 @app.route('/api/products/<product_id>', methods=['GET'])
-@auth_middleware
+@auth_middleware(claims_only=True)
 def get_product(current_user, product_id):
     try:
-        product = products_collection.find_one({'id': product_id})
+        if CATALOG_MIRROR and catalog_mirror.fresh():
+            product = catalog_mirror.get(product_id)
+        else:
+            # Local entries are tagged with the shared generation, so writes
+            # through other workers on the host retire them too.
+            shared_generation = shared_products.generation if shared_products is not None else None
+            cached, product = product_cache.get(product_id, shared_generation)
+            if not cached and shared_products is not None:
+                generation = product_cache.generation
+                payload = shared_products.get(product_id)
+                if payload is not None:
+                    cached, product = True, ProductRecord.from_document(app.json.loads(payload))
+                    product_cache.put(product_id, product, generation, shared_generation)
+            if not cached:
+                generation = product_cache.generation
+                document = products_collection.find_one({'id': product_id})
+                if not document:
+                    product_cache.put_missing(product_id, generation, shared_generation)
+                else:
+                    product = ProductRecord.from_document(document)
+                    product_cache.put(product_id, product, generation, shared_generation)
+                    if shared_products is not None:
+                        shared_products.put(product_id, app.json.dumps(product.response()).encode(), shared_generation)
 
         if not product:
             return jsonify({'error': 'Product not found'}), 404
 
-        product['_id'] = str(product['_id'])
-        if 'createdAt' in product:
-            product['createdAt'] = product['createdAt'].isoformat()
-
         return jsonify({
             'message': 'Product retrieved successfully',
-            'product': product
+            'product': product.response()
         }), 200
 
     except Exception as e:
-        return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+        return server_error(e)
 
 @app.route('/api/products/<product_id>', methods=['PUT'])
 @auth_middleware
@@ -413,6 +1229,7 @@ def update_product(current_user, product_id):
         products_collection.update_one({'id': product_id}, {'$set': update_data})
 
         updated_product = products_collection.find_one({'id': product_id})
+        catalog_events.publish('upsert', dict(updated_product))
         updated_product['_id'] = str(updated_product['_id'])
         if 'createdAt' in updated_product:
             updated_product['createdAt'] = updated_product['createdAt'].isoformat()
@@ -425,10 +1242,7 @@ def update_product(current_user, product_id):
         }), 200
 
     except Exception as e:
-        return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+        return server_error(e)
 
 @app.route('/api/products/<product_id>', methods=['DELETE'])
 @auth_middleware
@@ -440,6 +1254,7 @@ def delete_product(current_user, product_id):
             return jsonify({'error': 'Product not found'}), 404
 
         products_collection.delete_one({'id': product_id})
+        catalog_events.publish('delete', product)
 
         return jsonify({
             'message': 'Product deleted successfully',
@@ -450,12 +1265,11 @@ def delete_product(current_user, product_id):
         }), 200
 
     except Exception as e:
-        return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+        return server_error(e)
 
 @app.route('/api/register', methods=['POST'])
+@rate_limited('register')
+@email_index_required
 def register_user():
     try:
         data = request.get_json()
@@ -470,23 +1284,13 @@ def register_user():
                 'errors': validation_errors
             }), 400
 
-        existing_user = users_collection.find_one({'email': data['email'].strip().lower()})
-        if existing_user:
-            return jsonify({
-                'error': 'Validation failed',
-                'errors': {'email': 'Email already registered'}
-            }), 400
+        user_data = registration_document(data)
 
-        user_data = {
-            'fullName': data['fullName'].strip(),
-            'email': data['email'].strip().lower(),
-            'phone': re.sub(r'\D', '', data['phone'].strip()),
-            'password': generate_password_hash(data['password']),
-            'createdAt': datetime.utcnow(),
-            'isActive': True
-        }
-
-        result = users_collection.insert_one(user_data)
+        try:
+            result = users_collection.insert_one(user_data)
+        except DuplicateKeyError:
+            return email_taken_response()
+        email_filter.add(user_data['email'], user_data['createdAt'])
 
         response_data = {
             'id': str(result.inserted_id),
@@ -502,12 +1306,94 @@ def register_user():
         }), 201
 
     except Exception as e:
+        return server_error(e)
+
+@app.route('/api/users/bulk', methods=['POST'])
+@rate_limited('register_bulk')
+@auth_middleware(operator_only=True)
+@email_index_required
+def register_users_bulk(current_user):
+    try:
+        data = request.get_json()
+
+        if not data or not isinstance(data.get('users'), list) or not data['users']:
+            return jsonify({'error': 'A non-empty users list is required'}), 400
+
+        rows = data['users']
+        limit = bulk_registration_limit()
+        if len(rows) > limit:
+            return jsonify({'error': f'At most {limit} users per request'}), 400
+
+        results = [None] * len(rows)
+        valid = []
+        positions = []
+        for index, row in enumerate(rows):
+            validation_errors = validate_registration_data(row) if isinstance(row, dict) else {'user': 'Must be an object'}
+            if validation_errors:
+                results[index] = {'index': index, 'status': 'invalid', 'errors': validation_errors}
+                continue
+            valid.append(row)
+            positions.append(index)
+
+        # Refuse up front rather than hash for the whole deadline and then
+        # have insert_many fail on the expired timeout.
+        deadline = g.get('deadline')
+        if valid and deadline is not None:
+            estimate = math.ceil(len(valid) / float(BULK_HASH_WORKERS)) * password_hash_seconds()
+            if estimate > deadline.remaining() * 0.8:
+                return jsonify({
+                    'error': 'Batch cannot be hashed within the request deadline',
+                    'estimatedSeconds': round(estimate, 2),
+                    'remainingSeconds': round(deadline.remaining(), 2)
+                }), 503
+
+        documents = []
+        if valid:
+            hashes = bulk_hash_pool().map(
+                generate_password_hash,
+                [row['password'] for row in valid],
+                timeout=deadline.remaining() if deadline is not None else None,
+                chunksize=max(1, len(valid) // (BULK_HASH_WORKERS * 4))
+            )
+            documents = [registration_document(row, password_hash) for row, password_hash in zip(valid, hashes)]
+
+        failed = {}
+        if documents:
+            try:
+                users_collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details['writeErrors']:
+                    failed[error['index']] = error
+
+        for offset, user_data in enumerate(documents):
+            index = positions[offset]
+            error = failed.get(offset)
+            if error is None:
+                email_filter.add(user_data['email'], user_data['createdAt'])
+                results[index] = {'index': index, 'status': 'created', 'id': str(user_data['_id'])}
+            elif error['code'] == 11000:
+                results[index] = {
+                    'index': index,
+                    'status': 'duplicate',
+                    'errors': {'email': 'Email already registered'}
+                }
+            else:
+                results[index] = {'index': index, 'status': 'failed', 'errors': {'user': error.get('errmsg', '')}}
+
+        created = sum(1 for result in results if result['status'] == 'created')
+
         return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+            'message': f'{created} of {len(rows)} users registered',
+            'created': created,
+            'failed': len(rows) - created,
+            'results': results
+        }), 201 if created == len(rows) else 207
+
+    except Exception as e:
+        return server_error(e)
 
 @app.route('/api/login', methods=['POST'])
+@rate_limited('login')
 def login_user():
     try:
         data = request.get_json()
@@ -515,7 +1401,11 @@ def login_user():
         if not data or not data.get('email') or not data.get('password'):
             return jsonify({'error': 'Email and password are required'}), 400
 
-        user = users_collection.find_one({'email': data['email'].strip().lower()})
+        email = data['email'].strip().lower()
+        if not email_filter.might_contain(email):
+            return jsonify({'error': 'Invalid email or password'}), 401
+
+        user = users_collection.find_one({'email': email})
 
         if not user or not check_password_hash(user['password'], data['password']):
             return jsonify({'error': 'Invalid email or password'}), 401
@@ -533,10 +1423,7 @@ def login_user():
         }), 200
 
     except Exception as e:
-        return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+        return server_error(e)
 
 @app.route('/api/users', methods=['GET'])
 def get_all_users():
@@ -555,10 +1442,7 @@ def get_all_users():
         }), 200
 
     except Exception as e:
-        return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+        return server_error(e)
 
 @app.route('/api/users/<user_id>', methods=['GET'])
 def get_user(user_id):
@@ -578,28 +1462,209 @@ def get_user(user_id):
         }), 200
 
     except Exception as e:
+        return server_error(e)
+
+@app.route('/debug/queries', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_queries(current_user):
+    try:
+        limit = int(request.args.get('limit', 20))
+        if limit < 1 or limit > 500:
+            limit = 20
+
+        shapes, slow_queries = query_monitor.top_shapes(limit)
+
         return jsonify({
-            'error': 'Internal server error',
-            'details': str(e)
-        }), 500
+            'message': 'Query statistics retrieved successfully',
+            'slowThresholdMs': SLOW_QUERY_MS,
+            'shapes': shapes,
+            'slowQueries': slow_queries
+        }), 200
+
+    except Exception as e:
+        return server_error(e)
+
+@app.route('/debug/ratelimit', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_ratelimit(current_user):
+    return jsonify({
+        'message': 'Rate limit statistics retrieved successfully',
+        'enabled': app.config['RATE_LIMIT_ENABLED'],
+        'rules': app.config['RATE_LIMIT_RULES'],
+        'rateLimiter': rate_limiter.stats()
+    }), 200
+
+@app.route('/debug/email-filter', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_email_filter(current_user):
+    return jsonify({
+        'message': 'Email filter statistics retrieved successfully',
+        'emailFilter': email_filter.stats()
+    }), 200
+
+@app.route('/debug/search', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_search(current_user):
+    return jsonify({
+        'message': 'Search index statistics retrieved successfully',
+        'engine': SEARCH_ENGINE,
+        'searchIndex': search_index.stats(),
+        'fuzzy': fuzzy_matcher.stats()
+    }), 200
+
+@app.route('/debug/suggest', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_suggest(current_user):
+    return jsonify({
+        'message': 'Suggester statistics retrieved successfully',
+        'suggester': title_suggester.stats()
+    }), 200
+
+@app.route('/debug/similar', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_similar(current_user):
+    return jsonify({
+        'message': 'Similarity index statistics retrieved successfully',
+        'similarityIndex': similarity_index.stats()
+    }), 200
+
+@app.route('/debug/cache', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_cache(current_user):
+    return jsonify({
+        'message': 'Product cache statistics retrieved successfully',
+        'productCache': product_cache.stats()
+    }), 200
+
+@app.route('/debug/shared-cache', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_shared_cache(current_user):
+    if shared_products is None:
+        return jsonify({'message': 'Shared cache tier is disabled', 'enabled': False}), 200
+    return jsonify({
+        'message': 'Shared cache statistics retrieved successfully',
+        'enabled': True,
+        'products': shared_products.stats(),
+        'listings': shared_listings.stats()
+    }), 200
+
+@app.route('/debug/mirror', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_mirror(current_user):
+    return jsonify({
+        'message': 'Catalog mirror statistics retrieved successfully',
+        'enabled': CATALOG_MIRROR,
+        'mirror': catalog_mirror.stats()
+    }), 200
+
+@app.route('/debug/listing-encoder', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_listing_encoder(current_user):
+    return jsonify({
+        'message': 'Listing encoder statistics retrieved successfully',
+        'encoder': LISTING_ENCODER,
+        'fragments': product_fragments.stats()
+    }), 200
+
+@app.route('/debug/fanout', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_fanout(current_user):
+    return jsonify({
+        'message': 'Fan-out statistics retrieved successfully',
+        'listingStrategy': LISTING_STRATEGY,
+        'speculativeAuthLookup': app.config['AUTH_SPECULATIVE_LOOKUP'] and not app.config['AUTH_CLAIMS_ONLY'],
+        'fanout': fanout.stats()
+    }), 200
+
+@app.route('/debug/dedupe', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_dedupe(current_user):
+    return jsonify({
+        'message': 'Duplicate index statistics retrieved successfully',
+        'mode': DEDUPE_MODE,
+        'duplicateIndex': duplicate_index.stats()
+    }), 200
+
+@app.route('/debug/profile', methods=['GET'])
+@auth_middleware(operator_only=True)
+def debug_profile(current_user):
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'message': 'Profiler status retrieved successfully',
+            'profiler': profiler.stats()
+        }), 200
+
+    return Response(
+        profiler.folded(),
+        mimetype='text/plain',
+        headers={'Content-Disposition': 'attachment; filename=profile.folded'}
+    )
+
+@app.route('/debug/profile/start', methods=['POST'])
+@auth_middleware(operator_only=True)
+def start_profile(current_user):
+    try:
+        data = request.get_json(silent=True) or {}
+        interval_ms = data.get('intervalMs')
+        interval = None
+        if interval_ms is not None:
+            interval = float(interval_ms) / 1000
+            if interval < 0.001 or interval > 1:
+                return jsonify({'error': 'intervalMs must be between 1 and 1000'}), 400
+
+        threads = data.get('threads', 'requests')
+        if threads not in ('requests', 'all'):
+            return jsonify({'error': "threads must be 'requests' or 'all'"}), 400
+
+        if data.get('reset'):
+            profiler.reset()
+
+        started = profiler.start(interval, threads)
+
+        return jsonify({
+            'message': 'Profiler started' if started else 'Profiler already running',
+            'profiler': profiler.stats()
+        }), 200
+
+    except (ValueError, TypeError):
+        return jsonify({'error': 'intervalMs must be a number'}), 400
+
+@app.route('/debug/profile/stop', methods=['POST'])
+@auth_middleware(operator_only=True)
+def stop_profile(current_user):
+    stopped = profiler.stop()
+
+    return jsonify({
+        'message': 'Profiler stopped' if stopped else 'Profiler is not running',
+        'profiler': profiler.stats()
+    }), 200
+
+@app.route('/livez', methods=['GET'])
+def liveness_check():
+    return jsonify({'status': 'alive'}), 200
+
+@app.route('/readyz', methods=['GET'])
+def readiness_check():
+    status = health_prober.status()
+    return jsonify(status), 200 if status['ready'] else 503
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    try:
-        db.command('ping')
+    status = health_prober.status()
+    if status['database'] == 'connected' and 'health status is stale' not in status['reasons']:
         return jsonify({
             'status': 'healthy',
             'message': 'Registration API is running',
             'database': 'connected',
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': status['checkedAt']
         }), 200
-    except Exception as e:
-        return jsonify({
-            'status': 'unhealthy',
-            'message': 'Database connection failed',
-            'error': str(e),
-            'timestamp': datetime.utcnow().isoformat()
-        }), 500
+
+    return jsonify({
+        'status': 'unhealthy',
+        'message': 'Database connection failed',
+        'error': status.get('databaseError') or ', '.join(status['reasons']),
+        'timestamp': status['checkedAt'] or datetime.utcnow().isoformat()
+    }), 500
 
 if __name__ == '__main__':
     app.run(debug=True, host='localhost', port=5001)
\ No newline at end of file
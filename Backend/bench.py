@@ -0,0 +1,295 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+
+from bson_json import RAW_CODEC_OPTIONS, FragmentEncoder
+from records import ProductRecord, product_response
+
+from standin import load_app
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def product_page(size=100, seed=42):
+    rng = random.Random(seed)
+    created = datetime(2024, 1, 1)
+    return [{
+        '_id': ObjectId(b'%012d' % index),
+        'id': '%08x-0000-4000-8000-%012x' % (rng.getrandbits(32), index),
+        'title': 'Product %d %s' % (index, rng.choice(['lamp', 'desk', 'chair', 'cable', 'monitor'])),
+        'description': ' '.join(rng.choice(['quality', 'compact', 'durable', 'wireless', 'premium']) for _ in range(30)),
+        'price': round(rng.uniform(1, 1000), 2),
+        'image': 'https://via.placeholder.com/300x200',
+        'createdBy': str(ObjectId(b'user%08d' % (index % 10))),
+        'createdAt': created + timedelta(minutes=index)
+    } for index in range(size)]
+
+
+def fix_up(products):
+    for product in products:
+        product['_id'] = str(product['_id'])
+        if 'createdAt' in product:
+            product['createdAt'] = product['createdAt'].isoformat()
+    return products
+
+
+@benchmark('validate_auth_data/valid')
+def bench_validate_auth(app):
+    data = {'name': 'Jane Doe', 'email': 'Jane.Doe@Example.com', 'password': 'correct-horse'}
+    return lambda: app.validate_auth_data(data)
+
+
+@benchmark('validate_auth_data/login_invalid')
+def bench_validate_auth_invalid(app):
+    data = {'email': 'not-an-email', 'password': '123'}
+    return lambda: app.validate_auth_data(data, is_login=True)
+
+
+@benchmark('validate_registration_data/valid')
+def bench_validate_registration(app):
+    data = {
+        'fullName': 'Jane Doe',
+        'email': 'jane.doe@example.com',
+        'phone': '+1 (555) 123-4567',
+        'password': 'correct-horse',
+        'confirmPassword': 'correct-horse'
+    }
+    return lambda: app.validate_registration_data(data)
+
+
+@benchmark('jwt/encode')
+def bench_jwt_encode(app):
+    secret = app.app.config['SECRET_KEY']
+    claims = {'user_id': '65a1f0c2e4b0a1b2c3d4e5f6', 'email': 'jane.doe@example.com',
+              'exp': datetime(2030, 1, 1)}
+    return lambda: app.jwt.encode(claims, secret, algorithm='HS256')
+
+
+@benchmark('jwt/decode')
+def bench_jwt_decode(app):
+    secret = app.app.config['SECRET_KEY']
+    token = app.jwt.encode({'user_id': '65a1f0c2e4b0a1b2c3d4e5f6', 'email': 'jane.doe@example.com',
+                            'exp': datetime(2030, 1, 1)}, secret, algorithm='HS256')
+    return lambda: app.jwt.decode(token, secret, algorithms=['HS256'])
+
+
+@benchmark('fix_up/page_100')
+def bench_fix_up(app):
+    page = product_page()
+    # Copying the page would dominate the timing, so the originals are put
+    # back instead; that adds two dict writes per product to the figure.
+    pool = [[dict(product) for product in page] for _ in range(64)]
+    state = {'index': 0}
+
+    def run():
+        index = state['index']
+        state['index'] = (index + 1) % len(pool)
+        products = pool[index]
+        fix_up(products)
+        for original, product in zip(page, products):
+            product['_id'] = original['_id']
+            product['createdAt'] = original['createdAt']
+    return run
+
+
+@benchmark('jsonify/page_100')
+def bench_jsonify(app):
+    products = fix_up(product_page())
+    context = app.app.test_request_context('/api/products?limit=100')
+    context.push()
+    body = {
+        'message': 'Products retrieved successfully',
+        'products': products,
+        'pagination': {'currentPage': 1, 'totalPages': 10, 'totalItems': 1000, 'itemsPerPage': 100,
+                       'hasNext': True, 'hasPrev': False},
+        'filters': {'keyword': '', 'sort': '-createdAt'}
+    }
+    return lambda: app.jsonify(body).get_data()
+
+
+@benchmark('products/decode_dicts_page_100')
+def bench_decode_dicts(app):
+    raw = bson.encode({'items': product_page()})
+    return lambda: bson.decode(raw)['items']
+
+
+@benchmark('products/decode_records_page_100')
+def bench_decode_records(app):
+    raw = bson.encode({'items': product_page()})
+    return lambda: [ProductRecord.from_document(product) for product in bson.decode(raw)['items']]
+
+
+@benchmark('products/response_dicts_page_100')
+def bench_response_dicts(app):
+    page = product_page()
+    return lambda: [product_response(product) for product in page]
+
+
+@benchmark('products/response_records_page_100')
+def bench_response_records(app):
+    page = [ProductRecord.from_document(product) for product in product_page()]
+    return lambda: [product.response() for product in page]
+
+
+@benchmark('listing/dict_encode_page_100')
+def bench_listing_dicts(app):
+    raw = bson.encode({'items': product_page()})
+    context = app.app.test_request_context('/api/products?limit=100')
+    context.push()
+    return lambda: app.jsonify([product_response(product) for product in bson.decode(raw)['items']]).get_data()
+
+
+@benchmark('listing/raw_fragments_page_100')
+def bench_listing_fragments(app):
+    raw = bson.encode({'items': product_page()})
+    context = app.app.test_request_context('/api/products?limit=100')
+    context.push()
+    encoder = FragmentEncoder(lambda document: app.app.json.dumps(product_response(document), separators=(',', ':')))
+    encoder.encode_array(bson.decode(raw, RAW_CODEC_OPTIONS)['items'])
+    return lambda: encoder.encode_array(bson.decode(raw, RAW_CODEC_OPTIONS)['items']).encode()
+
+
+def memory_per_product(build, count=5000):
+    raw = [bson.encode(product) for product in product_page(count)]
+    tracemalloc.start()
+    try:
+        products = [build(bson.decode(document)) for document in raw]
+        allocated = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return allocated / float(len(products))
+
+
+def memory_report():
+    dicts = memory_per_product(lambda document: document)
+    records = memory_per_product(ProductRecord.from_document)
+    print('%-36s %10.0f bytes' % ('memory/dict_product', dicts))
+    print('%-36s %10.0f bytes  (%.1fx smaller)' % ('memory/record_product', records, dicts / records))
+
+
+def calibrate(func, target_seconds):
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= target_seconds / 4:
+            return max(1, int(loops * target_seconds / elapsed))
+        loops *= 4
+
+
+def measure(func, repeats, target_seconds):
+    for _ in range(3):
+        func()
+    loops = calibrate(func, target_seconds)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        samples.append((time.perf_counter() - started) / loops * 1e9)
+    quartiles = statistics.quantiles(samples, n=4)
+    return {
+        'loops': loops,
+        'repeats': repeats,
+        'medianNs': round(statistics.median(samples), 1),
+        'meanNs': round(statistics.fmean(samples), 1),
+        'stdevNs': round(statistics.stdev(samples), 1) if len(samples) > 1 else 0.0,
+        'minNs': round(min(samples), 1),
+        'iqrNs': round(quartiles[2] - quartiles[0], 1)
+    }
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'timestamp': datetime.utcnow().isoformat()
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print('%-36s %12s %12s %9s' % ('benchmark', 'baseline', 'current', 'change'))
+    for name, result in results.items():
+        old = baseline.get('results', {}).get(name)
+        if old is None:
+            print('%-36s %12s %10.0fns %9s' % (name, '-', result['medianNs'], 'new'))
+            continue
+        change = (result['medianNs'] - old['medianNs']) / old['medianNs']
+        # Only flag changes that exceed both the threshold and the run-to-run spread.
+        noise = (result['iqrNs'] + old['iqrNs']) / old['medianNs']
+        flag = ''
+        if change > max(threshold, noise):
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif change < -max(threshold, noise):
+            flag = '  improved'
+        print('%-36s %10.0fns %10.0fns %+8.1f%%%s' % (name, old['medianNs'], result['medianNs'], change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Micro-benchmarks for per-call costs of the API hot paths.')
+    parser.add_argument('filter', nargs='*', help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--repeats', type=int, default=15)
+    parser.add_argument('--target-ms', type=float, default=20, help='approximate duration of each repeat')
+    parser.add_argument('--stand-in', action='store_true', help='import app.py against mongomock')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save', action='store_true', help='write results to the baseline file')
+    parser.add_argument('--threshold', type=float, default=0.10, help='relative slowdown reported as a regression')
+    parser.add_argument('--fail-on-regression', action='store_true')
+    parser.add_argument('--memory', action='store_true', help='also report bytes held per cached product')
+    args = parser.parse_args(argv)
+
+    app = load_app(args.stand_in)
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if args.filter and not any(part in name for part in args.filter):
+            continue
+        results[name] = measure(setup(app), args.repeats, args.target_ms / 1000.0)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    regressions = compare(results, baseline, args.threshold)
+    if args.memory:
+        memory_report()
+
+    if args.save:
+        merged = dict(baseline.get('results', {}))
+        merged.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump({'environment': environment(), 'results': merged}, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if regressions and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,62 @@
+import threading
+from collections import OrderedDict
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+class FragmentEncoder:
+    # JSON text for raw BSON products, memoised by the raw bytes themselves.
+    # The same bytes always render to the same JSON, so entries never need
+    # invalidating: an edited product has different bytes and simply misses.
+    # On a hit the product is never decoded, so a page of known products
+    # costs one dict lookup each instead of a dict, a copy and a re-encode.
+    def __init__(self, render, capacity=10000):
+        self.render = render
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def fragment(self, raw):
+        with self._lock:
+            fragment = self._fragments.get(raw)
+            if fragment is not None:
+                self._fragments.move_to_end(raw)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+        fragment = self.render(bson.decode(raw))
+        with self._lock:
+            self._fragments[raw] = fragment
+            if len(self._fragments) > self.capacity:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def encode_array(self, documents):
+        return '[%s]' % ','.join([self.fragment(document.raw) for document in documents])
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'capacity': self.capacity,
+                'size': len(self._fragments),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / float(lookups), 4) if lookups else None
+            }
+
+
+def splice(body, marker, fragment):
+    # Replaces the JSON string "marker" with already-encoded JSON. Keys are
+    # sorted, so the placeholder is the last occurrence even if a filter
+    # value echoed earlier in the body happened to contain the marker.
+    head, found, tail = body.rpartition('"%s"' % marker)
+    if not found:
+        raise ValueError('Marker not found in response body')
+    return head + fragment + tail
@@ -0,0 +1,236 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class FrequencySketch:
+    # Count-min sketch of recent access frequency with 4-bit style counters
+    # (capped at 15). Every sample_size increments all counters are halved,
+    # so popularity from an hour ago fades instead of pinning entries forever.
+    def __init__(self, capacity, depth=4):
+        width = 64
+        while width < capacity * 4:
+            width *= 2
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(depth)]
+        self._sample_size = max(capacity, 1) * 10
+        self._additions = 0
+
+    def _slots(self, key):
+        return [hash((seed, key)) & self._mask for seed in range(len(self._rows))]
+
+    def increment(self, key):
+        for row, slot in zip(self._rows, self._slots(key)):
+            if row[slot] < 15:
+                row[slot] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._rows = [bytearray(value >> 1 for value in row) for row in self._rows]
+            self._additions //= 2
+
+    def estimate(self, key):
+        return min(row[slot] for row, slot in zip(self._rows, self._slots(key)))
+
+
+class TinyLfuCache:
+    # W-TinyLFU: new entries land in a small LRU window; when the window
+    # overflows, its oldest entry only enters the main segmented LRU if the
+    # sketch says it is requested more often than the main segment's next
+    # victim. One-off scans therefore cannot flush the hot set.
+    def __init__(self, capacity, ttl, window_ratio=0.01, protected_ratio=0.8):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.window_capacity = max(1, int(capacity * window_ratio))
+        self.main_capacity = max(1, capacity - self.window_capacity)
+        self.protected_capacity = int(self.main_capacity * protected_ratio)
+        self._lock = threading.Lock()
+        self._sketch = FrequencySketch(capacity)
+        self._window = OrderedDict()
+        self._probation = OrderedDict()
+        self._protected = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    def get(self, key):
+        with self._lock:
+            self._sketch.increment(key)
+            for segment in (self._window, self._probation, self._protected):
+                entry = segment.get(key)
+                if entry is not None:
+                    break
+            else:
+                self.misses += 1
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del segment[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            if segment is self._probation:
+                del self._probation[key]
+                self._protected[key] = entry
+                if len(self._protected) > self.protected_capacity:
+                    demoted_key, demoted = self._protected.popitem(last=False)
+                    self._probation[demoted_key] = demoted
+            else:
+                segment.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl=None):
+        entry = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        with self._lock:
+            for segment in (self._window, self._probation, self._protected):
+                if key in segment:
+                    segment[key] = entry
+                    return
+            self._window[key] = entry
+            if len(self._window) > self.window_capacity:
+                candidate_key, candidate = self._window.popitem(last=False)
+                self._admit(candidate_key, candidate)
+
+    def _admit(self, key, entry):
+        if len(self._probation) + len(self._protected) < self.main_capacity:
+            self._probation[key] = entry
+            return
+        victims = self._probation if self._probation else self._protected
+        victim_key = next(iter(victims))
+        self.evictions += 1
+        if self._sketch.estimate(key) > self._sketch.estimate(victim_key):
+            del victims[victim_key]
+            self._probation[key] = entry
+        else:
+            self.rejections += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            for segment in (self._window, self._probation, self._protected):
+                if segment.pop(key, None) is not None:
+                    return True
+        return False
+
+    def invalidate_where(self, predicate):
+        with self._lock:
+            for segment in (self._window, self._probation, self._protected):
+                for key in [key for key, (value, _) in segment.items() if predicate(value)]:
+                    del segment[key]
+
+    def clear(self):
+        with self._lock:
+            self._window.clear()
+            self._probation.clear()
+            self._protected.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'capacity': self.capacity,
+                'size': len(self),
+                'window': len(self._window),
+                'probation': len(self._probation),
+                'protected': len(self._protected),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / float(lookups), 4) if lookups else None,
+                'evictions': self.evictions,
+                'admissionRejections': self.rejections,
+                'expirations': self.expirations
+            }
+
+
+class ProductCache:
+    # Serialised products by public id, plus a separate LRU of ids known not
+    # to exist so a flood of bad ids cannot evict hot products. Catalog
+    # events invalidate both; a fill that started before an invalidation
+    # is dropped so a slow read cannot re-cache the old version.
+    #
+    # Catalog events only reach this worker, so entries can also carry a tag
+    # (the shared tier's generation, bumped by writes on any worker on the
+    # host). A lookup with a different tag is a miss.
+    def __init__(self, capacity, ttl, negative_capacity, negative_ttl):
+        self.enabled = capacity > 0
+        self.products = TinyLfuCache(max(capacity, 1), ttl)
+        self.negative_capacity = negative_capacity
+        self.negative_ttl = negative_ttl
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._missing = OrderedDict()
+        self.negative_hits = 0
+        self.stale_tags = 0
+
+    def get(self, product_id, tag=None):
+        if not self.enabled:
+            return False, None
+        with self._lock:
+            entry = self._missing.get(product_id)
+            if entry is not None:
+                expires_at, entry_tag = entry
+                if expires_at > time.monotonic() and entry_tag == tag:
+                    self.negative_hits += 1
+                    return True, None
+                del self._missing[product_id]
+        entry = self.products.get(product_id)
+        if entry is None:
+            return False, None
+        product, entry_tag = entry
+        if entry_tag != tag:
+            with self._lock:
+                self.stale_tags += 1
+            return False, None
+        return True, product
+
+    def put(self, product_id, product, generation, tag=None):
+        if not self.enabled:
+            return
+        with self._lock:
+            if generation == self.generation:
+                self.products.put(product_id, (product, tag))
+
+    def put_missing(self, product_id, generation, tag=None):
+        if not self.enabled or not self.negative_capacity:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._missing[product_id] = (time.monotonic() + self.negative_ttl, tag)
+            self._missing.move_to_end(product_id)
+            if len(self._missing) > self.negative_capacity:
+                self._missing.popitem(last=False)
+
+    def invalidate(self, product_id):
+        with self._lock:
+            self.generation += 1
+            self._missing.pop(product_id, None)
+        self.products.invalidate(product_id)
+
+    def apply(self, operation, document):
+        product_id = document.get('id')
+        if product_id is not None:
+            self.invalidate(product_id)
+            return
+        # Deletes from the change stream only carry _id, so find them by value.
+        object_id = str(document['_id'])
+        with self._lock:
+            self.generation += 1
+        self.products.invalidate_where(lambda entry: entry[0].get('_id') == object_id)
+
+    def stats(self):
+        stats = self.products.stats()
+        with self._lock:
+            stats.update({
+                'enabled': self.enabled,
+                'negativeSize': len(self._missing),
+                'negativeHits': self.negative_hits,
+                'staleTags': self.stale_tags
+            })
+        return stats
@@ -0,0 +1,57 @@
+import logging
+import threading
+import time
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+logger = logging.getLogger('catalog_events')
+
+
+class CatalogEvents:
+    # Fan-out of product changes to the in-memory catalog structures.
+    # Write handlers publish their own changes; the optional change-stream
+    # watcher publishes changes made through other workers and hosts.
+    # Subscribers key products by str(_id), which deletes always carry.
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def publish(self, operation, document):
+        for callback in self._subscribers:
+            try:
+                callback(operation, document)
+            except Exception:
+                logger.exception('Catalog subscriber %r failed on %s', callback, operation)
+
+    def watch(self, collection, retry_interval=5):
+        def run():
+            resume_token = None
+            while True:
+                try:
+                    with collection.watch(full_document='updateLookup', resume_after=resume_token) as stream:
+                        for change in stream:
+                            resume_token = stream.resume_token
+                            self._publish_change(change)
+                except OperationFailure as e:
+                    # Standalone servers have no change streams; local publishing still works.
+                    logger.info('Catalog change stream unavailable: %s', e)
+                    return
+                except PyMongoError as e:
+                    logger.warning('Catalog change stream interrupted, retrying: %s', e)
+                    time.sleep(retry_interval)
+                except Exception as e:
+                    logger.warning('Catalog change stream stopped: %s', e)
+                    return
+
+        thread = threading.Thread(target=run, name='catalog-change-stream', daemon=True)
+        thread.start()
+        return thread
+
+    def _publish_change(self, change):
+        operation = change['operationType']
+        if operation in ('insert', 'update', 'replace') and change.get('fullDocument'):
+            self.publish('upsert', change['fullDocument'])
+        elif operation == 'delete':
+            self.publish('delete', change['documentKey'])
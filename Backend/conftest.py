@@ -0,0 +1,43 @@
+import os
+import tempfile
+import time
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    pytest.importorskip('mongomock')
+    scratch = tempfile.mkdtemp()
+    os.environ.update({
+        'DB_STATS_DEV': 'true',
+        'EMAIL_FILTER_PATH': os.path.join(scratch, 'email_filter.bloom'),
+        'SEARCH_INDEX_PATH': os.path.join(scratch, 'search_index.snapshot'),
+        'RATE_LIMIT_STORE': 'local',
+        'SIMILAR_ENABLED': 'false',
+        'CATALOG_CHANGE_STREAM': 'false'
+    })
+    from standin import load_app
+
+    module = load_app(stand_in=True)
+    deadline = time.monotonic() + 30
+    while module.health_prober.index_state != 'ready' and time.monotonic() < deadline:
+        time.sleep(0.05)
+    module.app.config['TESTING'] = True
+    module.app.config['RATE_LIMIT_ENABLED'] = False
+    module.app.config['DB_BUDGET_STRICT'] = None
+    return module
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def auth(client):
+    credentials = {'name': 'Budget Tester', 'email': 'budget@example.com', 'password': 'secret1'}
+    response = client.post('/api/auth/register', json=credentials)
+    if response.status_code != 201:
+        response = client.post('/api/auth/login', json=credentials)
+    return {'Authorization': 'Bearer ' + response.get_json()['token']}
@@ -0,0 +1,46 @@
+import time
+
+import pymongo
+from pymongo.errors import PyMongoError
+
+
+class RequestDeadline:
+    # Monotonic deadline for one request. While active, pymongo.timeout
+    # applies the time left to every operation in the request's context:
+    # maxTimeMS on the server, plus socket and connection-pool waits on the
+    # client. Fan-out tasks run in a copy of that context and inherit it.
+    __slots__ = ('budget', 'expires_at', '_timeout')
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self._timeout = pymongo.timeout(budget)
+
+    def remaining(self):
+        return max(self.expires_at - time.monotonic(), 0)
+
+    def __enter__(self):
+        self._timeout.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self._timeout.__exit__(exc_type, exc, traceback)
+
+
+def request_budget(route_ms, header_value):
+    # Clients may shorten the route's budget but never extend it; malformed
+    # or non-positive header values are ignored. 0 means no deadline.
+    budget = route_ms
+    try:
+        requested = int(header_value) if header_value else 0
+    except ValueError:
+        requested = 0
+    if requested > 0 and (not budget or requested < budget):
+        budget = requested
+    return budget / 1000.0 if budget else None
+
+
+def is_timeout(error):
+    if isinstance(error, PyMongoError):
+        return error.timeout
+    return isinstance(error, TimeoutError)
@@ -0,0 +1,244 @@
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from search_index import TOKEN_PATTERN
+
+logger = logging.getLogger('dedupe')
+
+MERSENNE_PRIME = (1 << 31) - 1
+SHINGLE_WORDS = 3
+
+
+def shingles(text, size=SHINGLE_WORDS):
+    words = TOKEN_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[index:index + size]) for index in range(len(words) - size + 1)}
+
+
+def product_text(document):
+    return '%s %s' % (document.get('title') or '', document.get('description') or '')
+
+
+class MinHasher:
+    # crc32 of each shingle pushed through num_perm universal hash functions;
+    # the same seed gives the same signatures in every process.
+    def __init__(self, num_perm=128, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.seed = seed
+        self._a = rng.randint(1, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+        self._b = rng.randint(0, MERSENNE_PRIME, size=(num_perm, 1)).astype(np.uint64)
+
+    def signature(self, text):
+        values = [zlib.crc32(shingle.encode()) % MERSENNE_PRIME for shingle in shingles(text)]
+        if not values:
+            return np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint32)
+        hashed = (self._a * np.asarray(values, dtype=np.uint64)[None, :] + self._b) % MERSENNE_PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+
+def similarity(left, right):
+    return float(np.count_nonzero(left == right)) / len(left)
+
+
+class DuplicateIndex:
+    # LSH over MinHash signatures: bands of rows_per_band values are
+    # bucketed, so only products sharing a whole band are compared. With
+    # 16 bands of 8 rows, pairs at 0.8 Jaccard collide in some band ~94%
+    # of the time and pairs at 0.4 almost never.
+    def __init__(self, threshold=0.8, num_perm=128, bands=16, seed=1):
+        if num_perm % bands:
+            raise ValueError('num_perm must be a multiple of bands')
+        self.threshold = threshold
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        self.hasher = MinHasher(num_perm, seed)
+        self.ready = False
+        self._lock = threading.Lock()
+        self._buckets = [{} for _ in range(bands)]
+        self._signatures = {}
+
+    def __len__(self):
+        return len(self._signatures)
+
+    def _band_keys(self, signature):
+        step = self.rows_per_band
+        return [signature[band * step:(band + 1) * step].tobytes() for band in range(self.bands)]
+
+    def candidates(self, signature):
+        found = set()
+        with self._lock:
+            for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+                found.update(buckets.get(band_key, ()))
+            return [(key, self._signatures[key]) for key in found]
+
+    def query(self, document, exclude=None):
+        signature = self.hasher.signature(product_text(document))
+        matches = []
+        for key, (product_id, other) in self.candidates(signature):
+            if key == exclude:
+                continue
+            score = similarity(signature, other)
+            if score >= self.threshold:
+                matches.append({'id': product_id, 'similarity': round(score, 3)})
+        matches.sort(key=lambda match: -match['similarity'])
+        return matches
+
+    def insert(self, key, product_id, signature):
+        with self._lock:
+            self._remove(key)
+            self._signatures[key] = (product_id, signature)
+            for buckets, band_key in zip(self._buckets, self._band_keys(signature)):
+                buckets.setdefault(band_key, set()).add(key)
+
+    def add(self, document):
+        self.insert(str(document['_id']), document.get('id'), self.hasher.signature(product_text(document)))
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(str(key))
+
+    def _remove(self, key):
+        entry = self._signatures.pop(key, None)
+        if entry is None:
+            return
+        for buckets, band_key in zip(self._buckets, self._band_keys(entry[1])):
+            bucket = buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del buckets[band_key]
+
+    def apply(self, operation, document):
+        if operation == 'delete':
+            self.remove(document['_id'])
+        else:
+            self.add(document)
+
+    def build(self, collection):
+        for document in collection.find({}, {'id': 1, 'title': 1, 'description': 1}):
+            self.add(document)
+
+    def clusters(self):
+        with self._lock:
+            signatures = dict(self._signatures)
+            buckets = [[list(bucket) for bucket in band.values() if len(bucket) > 1] for band in self._buckets]
+
+        parent = {}
+
+        def find(key):
+            parent.setdefault(key, key)
+            while parent[key] != key:
+                parent[key] = parent[parent[key]]
+                key = parent[key]
+            return key
+
+        checked = set()
+        for band in buckets:
+            for bucket in band:
+                for index, left in enumerate(bucket):
+                    for right in bucket[index + 1:]:
+                        pair = (left, right) if left < right else (right, left)
+                        if pair in checked:
+                            continue
+                        checked.add(pair)
+                        if similarity(signatures[left][1], signatures[right][1]) >= self.threshold:
+                            parent[find(left)] = find(right)
+
+        groups = {}
+        for key in list(parent):
+            groups.setdefault(find(key), []).append(signatures[key][0])
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1), key=len, reverse=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'products': len(self._signatures),
+                'threshold': self.threshold,
+                'bands': self.bands,
+                'rowsPerBand': self.rows_per_band,
+                'buckets': sum(len(band) for band in self._buckets)
+            }
+
+
+def start_duplicate_index(index, collection, retry_interval=5):
+    def run():
+        while not index.ready:
+            try:
+                index.build(collection)
+                index.ready = True
+                logger.info('Duplicate index ready with %d products', len(index))
+            except Exception as e:
+                logger.warning('Duplicate index build failed, retrying: %s', e)
+                time.sleep(retry_interval)
+
+    thread = threading.Thread(target=run, name='duplicate-index', daemon=True)
+    thread.start()
+    return thread
+
+
+def sign_chunk(documents, num_perm, seed):
+    hasher = MinHasher(num_perm, seed)
+    return [(key, product_id, hasher.signature(text)) for key, product_id, text in documents]
+
+
+def scan(collection, index, workers, chunk_size):
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        chunk = []
+        for document in collection.find({}, {'id': 1, 'title': 1, 'description': 1}):
+            chunk.append((str(document['_id']), document.get('id'), product_text(document)))
+            if len(chunk) == chunk_size:
+                futures.append(pool.submit(sign_chunk, chunk, index.hasher.num_perm, index.hasher.seed))
+                chunk = []
+        if chunk:
+            futures.append(pool.submit(sign_chunk, chunk, index.hasher.num_perm, index.hasher.seed))
+        for future in futures:
+            for key, product_id, signature in future.result():
+                index.insert(key, product_id, signature)
+
+
+def main(argv=None):
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description='Report clusters of near-duplicate products.')
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--database', default='registration_db')
+    parser.add_argument('--threshold', type=float, default=0.8, help='minimum estimated Jaccard similarity')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--limit', type=int, default=50, help='clusters to print')
+    parser.add_argument('--json', dest='json_path', help='write every cluster to this file')
+    args = parser.parse_args(argv)
+
+    client = MongoClient(args.mongo_uri)
+    index = DuplicateIndex(threshold=args.threshold)
+    started = time.perf_counter()
+    scan(client[args.database]['products'], index, args.workers, args.chunk_size)
+    clusters = index.clusters()
+    elapsed = time.perf_counter() - started
+    client.close()
+
+    duplicates = sum(len(cluster) - 1 for cluster in clusters)
+    print('%d products scanned in %.1fs: %d clusters, %d redundant products' % (len(index), elapsed, len(clusters), duplicates))
+    for cluster in clusters[:args.limit]:
+        print('%4d  %s' % (len(cluster), ' '.join(cluster)))
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'threshold': args.threshold, 'products': len(index), 'clusters': clusters}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
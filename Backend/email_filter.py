@@ -0,0 +1,287 @@
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger('email_filter')
+
+HEADER = struct.Struct('<8sQIQq')
+MAGIC = b'EMAILBF1'
+
+
+def bloom_parameters(capacity, error_rate):
+    bits = int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+    bits = (bits + 7) // 8 * 8
+    hashes = max(1, int(round(bits / float(capacity) * math.log(2))))
+    return bits, hashes
+
+
+class EmailFilter:
+    # Bloom filter of registered emails, kept in an mmap'd file so every
+    # worker on a host sees registrations immediately and restarts can skip
+    # the full collection scan. A positive answer still goes to Mongo, and
+    # the unique index stays authoritative.
+    #
+    # A negative answer is only given while it can be trusted: the filter
+    # must have been verified against the collection's size within
+    # max_staleness seconds, and every writer must share this file
+    # (single_host). Registrations through another host reach the filter
+    # only on the next refresh, so multi-host deployments always fall
+    # through to Mongo.
+    #
+    # createdAt is only a fast catch-up cursor. Holding fewer users than the
+    # collection means bits may be missing: negatives stop being trusted and,
+    # if the gap is still there on the next refresh, the collection is
+    # rescanned. Holding more (deletes, a user counted by two workers) can
+    # only cost false positives and is left to the scan every rebuild_every
+    # refreshes. Scans build a separate buffer without holding any lock and
+    # OR it into the file, so registrations are never blocked behind them.
+    def __init__(self, path, capacity=1000000, error_rate=0.01, max_staleness=None, single_host=True,
+                 rebuild_every=60):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits, self.hashes = bloom_parameters(capacity, error_rate)
+        self.max_staleness = max_staleness
+        self.single_host = single_host
+        self.rebuild_every = rebuild_every
+        self.ready = False
+        self.verified_at = None
+        self.refreshes = 0
+        self.rebuilds = 0
+        self.short_refreshes = 0
+        self.negatives = 0
+        self._map = None
+        self._fd = None
+        self._lock = threading.Lock()
+
+    def _positions(self, email):
+        digest = hashlib.blake2b(email.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def _lock_file(self):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER.size, 0)
+
+    def _unlock_file(self):
+        if fcntl is not None:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER.size, 0)
+
+    def _header(self):
+        return HEADER.unpack_from(self._map, 0)
+
+    def _write_header(self, count, high_water):
+        HEADER.pack_into(self._map, 0, MAGIC, self.bits, self.hashes, count, high_water)
+
+    def trusted(self):
+        if not self.ready or not self.single_host or self.verified_at is None:
+            return False
+        return self.max_staleness is None or time.monotonic() - self.verified_at <= self.max_staleness
+
+    def might_contain(self, email):
+        if not self.trusted():
+            return True
+        data = self._map
+        for position in self._positions(email):
+            if not data[HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                self.negatives += 1
+                return False
+        return True
+
+    def add(self, email, created_at=None):
+        if self._map is None:
+            return
+        with self._lock:
+            self._lock_file()
+            try:
+                self._set_bits(self._map, HEADER.size, email)
+                _, _, _, count, high_water = self._header()
+                if created_at is not None:
+                    high_water = max(high_water, to_millis(created_at))
+                self._write_header(count + 1, high_water)
+            finally:
+                self._unlock_file()
+
+    def _set_bits(self, data, offset, email):
+        for position in self._positions(email):
+            index = offset + (position >> 3)
+            data[index] = data[index] | (1 << (position & 7))
+
+    def load(self, users_collection):
+        size = HEADER.size + self.bits // 8
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        started = time.monotonic()
+        with self._lock:
+            self._lock_file()
+            try:
+                fresh = os.fstat(self._fd).st_size != size
+                if fresh:
+                    os.ftruncate(self._fd, 0)
+                    os.ftruncate(self._fd, size)
+                if self._map is None:
+                    self._map = mmap.mmap(self._fd, size)
+                magic, bits, hashes, _, _ = self._header()
+                warm = not fresh and magic == MAGIC and bits == self.bits and hashes == self.hashes
+                if not warm:
+                    # Incompatible layout: the only time bits are cleared.
+                    self._map[:] = bytes(size)
+                    self._write_header(0, 0)
+            finally:
+                self._unlock_file()
+
+        added = self._catch_up(users_collection) if warm else 0
+        count = self._header()[3]
+        total = users_collection.estimated_document_count()
+        if warm and count >= total:
+            logger.info('Email filter warm start: %d users, %d caught up', count, added)
+        else:
+            if warm:
+                logger.info('Email filter file holds %d users, collection has %d; rebuilding', count, total)
+            self._rebuild(users_collection)
+            count = self._header()[3]
+            logger.info('Email filter built from %d users', count)
+        if count > self.capacity:
+            logger.warning('Email filter holds %d emails, over its capacity of %d; '
+                           'raise EMAIL_FILTER_CAPACITY to keep false positives low', count, self.capacity)
+        self._map.flush()
+        self.verified_at = started
+        self.ready = True
+
+    def _rebuild(self, users_collection):
+        # Counts every document, with or without an email, so the total can
+        # be compared with the collection's size. Users registered through
+        # this host while the scan runs are counted by add() and kept.
+        with self._lock:
+            before = self._header()[3]
+        data = bytearray(self.bits // 8)
+        count = 0
+        high_water = 0
+        for user in users_collection.find({}, {'email': 1, 'createdAt': 1, '_id': 0}):
+            count += 1
+            if 'email' in user:
+                self._set_bits(data, 0, user['email'])
+            if isinstance(user.get('createdAt'), datetime):
+                high_water = max(high_water, to_millis(user['createdAt']))
+        scanned = int.from_bytes(data, 'little')
+
+        with self._lock:
+            self._lock_file()
+            try:
+                # Bits are only ever added: readers take no lock, and stale
+                # bits only cost false positives.
+                current = int.from_bytes(self._map[HEADER.size:], 'little')
+                self._map[HEADER.size:] = (current | scanned).to_bytes(len(data), 'little')
+                _, _, _, after, current_high_water = self._header()
+                self._write_header(count + max(0, after - before), max(current_high_water, high_water))
+            finally:
+                self._unlock_file()
+        self.rebuilds += 1
+
+    def _catch_up(self, users_collection):
+        high_water = self._header()[4]
+        query = {'createdAt': {'$gt': from_millis(high_water)}} if high_water else {}
+        users = list(users_collection.find(query, {'email': 1, 'createdAt': 1, '_id': 0}))
+
+        with self._lock:
+            self._lock_file()
+            try:
+                _, _, _, count, current_high_water = self._header()
+                latest = current_high_water
+                added = 0
+                for user in users:
+                    created = to_millis(user['createdAt']) if isinstance(user.get('createdAt'), datetime) else None
+                    if 'email' in user:
+                        self._set_bits(self._map, HEADER.size, user['email'])
+                    # Another worker may have caught up past some of these already.
+                    if created is None or created > current_high_water:
+                        added += 1
+                    if created is not None:
+                        latest = max(latest, created)
+                self._write_header(count + added, latest)
+            finally:
+                self._unlock_file()
+        return added
+
+    def refresh(self, users_collection):
+        if self._map is None:
+            return
+        started = time.monotonic()
+        self._catch_up(users_collection)
+        count = self._header()[3]
+        total = users_collection.estimated_document_count()
+        self.refreshes += 1
+        # A registration on another host between the catch-up and the count
+        # shows up as a gap that the next catch-up closes; only a gap that
+        # persists means bits are missing.
+        self.short_refreshes = self.short_refreshes + 1 if count < total else 0
+        if self.short_refreshes >= 2 or self.refreshes % self.rebuild_every == 0:
+            if count < total:
+                logger.info('Email filter holds %d users, collection has %d; rebuilding', count, total)
+            self._rebuild(users_collection)
+            self.short_refreshes = 0
+        elif count < total:
+            self.verified_at = None
+            return
+        self.verified_at = started
+
+    def stats(self):
+        count = self._header()[3] if self._map is not None else 0
+        fill = count / float(self.capacity)
+        return {
+            'ready': self.ready,
+            'trusted': self.trusted(),
+            'singleHost': self.single_host,
+            'secondsSinceVerified': round(time.monotonic() - self.verified_at, 2) if self.verified_at else None,
+            'refreshes': self.refreshes,
+            'rebuilds': self.rebuilds,
+            'shortRefreshes': self.short_refreshes,
+            'path': self.path,
+            'bits': self.bits,
+            'hashes': self.hashes,
+            'emails': count,
+            'capacity': self.capacity,
+            'expectedFalsePositiveRate': round((1 - math.exp(-self.hashes * count / float(self.bits))) ** self.hashes, 6),
+            'fill': round(fill, 4),
+            'negativeLookups': self.negatives
+        }
+
+
+def to_millis(value):
+    return int((value - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+
+def from_millis(value):
+    return datetime.utcfromtimestamp(value / 1000.0)
+
+
+def start_email_filter(email_filter, users_collection, refresh_interval, retry_interval=5):
+    def run():
+        while not email_filter.ready:
+            try:
+                email_filter.load(users_collection)
+            except Exception as e:
+                logger.warning('Email filter load failed, retrying: %s', e)
+                time.sleep(retry_interval)
+        while refresh_interval > 0:
+            time.sleep(refresh_interval)
+            try:
+                email_filter.refresh(users_collection)
+            except Exception as e:
+                logger.warning('Email filter refresh failed: %s', e)
+
+    thread = threading.Thread(target=run, name='email-filter', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,114 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+
+
+class FanOutTimeout(TimeoutError):
+    pass
+
+
+class FanOut:
+    # Runs a handler's independent calls (usually Mongo operations) at the
+    # same time, so the handler waits for the slowest call rather than the
+    # sum. Each task runs in a copy of the caller's context, so per-request
+    # context variables (roundtrip stats, Flask's request context) still
+    # apply inside the pool. The last call runs on the calling thread, which
+    # would otherwise sit idle, and a saturated pool only delays the others.
+    #
+    # gather() waits until the deadline at most. When it passes, or any call
+    # fails, calls that have not started are cancelled and the caller gets
+    # the error; a call already running cannot be interrupted from here and
+    # finishes in the background.
+    def __init__(self, max_workers=16, timeout=10, name='fanout'):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.gathers = 0
+        self.tasks = 0
+        self.timeouts = 0
+        self.failures = 0
+        self.cancelled = 0
+        self.declined = 0
+        self._outstanding = 0
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            self.tasks += 1
+            self._outstanding += 1
+        future = self._executor.submit(self._run, contextvars.copy_context(), fn, args, kwargs)
+        future.add_done_callback(self._cancelled)
+        return future
+
+    def _run(self, context, fn, args, kwargs):
+        try:
+            return context.run(fn, *args, **kwargs)
+        finally:
+            self._count('_outstanding', -1)
+
+    def _cancelled(self, future):
+        if future.cancelled():
+            self._count('_outstanding', -1)
+
+    def try_submit(self, fn, *args, **kwargs):
+        # For optional concurrency: returns None instead of queueing behind
+        # busy workers, so the caller can just run fn itself.
+        with self._lock:
+            if self._outstanding >= self.max_workers:
+                self.declined += 1
+                return None
+        return self.submit(fn, *args, **kwargs)
+
+    def cancel(self, futures):
+        cancelled = sum(1 for future in futures if future.cancel())
+        if cancelled:
+            self._count('cancelled', cancelled)
+
+    def wait(self, futures, deadline=None):
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        done, pending = wait(futures, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_EXCEPTION)
+        failed = [future for future in futures if future in done and future.exception() is not None]
+        if failed:
+            self.cancel(pending)
+            self._count('failures')
+            raise failed[0].exception()
+        if pending:
+            self.cancel(pending)
+            self._count('timeouts')
+            raise FanOutTimeout('%d of %d calls did not finish before the deadline' % (len(pending), len(futures)))
+        return [future.result() for future in futures]
+
+    def gather(self, *calls, deadline=None):
+        # calls are zero-argument callables; results come back in order.
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        self._count('gathers')
+        futures = [self.submit(call) for call in calls[:-1]]
+        try:
+            last = calls[-1]()
+        except Exception:
+            self.cancel(futures)
+            self._count('failures')
+            raise
+        return self.wait(futures, deadline) + [last]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'maxWorkers': self.max_workers,
+                'timeoutSeconds': self.timeout,
+                'queued': self._executor._work_queue.qsize(),
+                'outstanding': self._outstanding,
+                'declined': self.declined,
+                'gathers': self.gathers,
+                'tasks': self.tasks,
+                'timeouts': self.timeouts,
+                'failures': self.failures,
+                'cancelled': self.cancelled
+            }
@@ -0,0 +1,122 @@
+import heapq
+import threading
+
+from search_index import analyze
+
+
+def trigrams(term):
+    padded = '$$' + term + '$'
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+def bounded_distance(source, target, limit):
+    # Levenshtein distance, giving up as soon as every cell in a row exceeds limit.
+    if abs(len(source) - len(target)) > limit:
+        return None
+    previous = list(range(len(target) + 1))
+    for row, source_char in enumerate(source, 1):
+        current = [row]
+        for column, target_char in enumerate(target, 1):
+            current.append(min(
+                previous[column] + 1,
+                current[column - 1] + 1,
+                previous[column - 1] + (source_char != target_char)
+            ))
+        if min(current) > limit:
+            return None
+        previous = current
+    return previous[-1] if previous[-1] <= limit else None
+
+
+def max_edits(term):
+    if len(term) < 4:
+        return 0
+    return 1 if len(term) < 8 else 2
+
+
+class FuzzyMatcher:
+    # Trigram postings over the search index vocabulary, bucketed by term
+    # length. Candidate generation only reads buckets within the edit
+    # budget, skips trigrams shared by too many terms, and verifies at most
+    # max_candidates terms, so the cost per query does not grow with the
+    # catalog.
+    def __init__(self, max_candidates=50, max_posting=2000):
+        self.max_candidates = max_candidates
+        self.max_posting = max_posting
+        self._lock = threading.Lock()
+        self._grams = {}
+        self._terms = set()
+
+    def add_term(self, term):
+        with self._lock:
+            if term in self._terms:
+                return
+            self._terms.add(term)
+            for gram in trigrams(term):
+                self._grams.setdefault(gram, {}).setdefault(len(term), set()).add(term)
+
+    def remove_term(self, term):
+        with self._lock:
+            if term not in self._terms:
+                return
+            self._terms.discard(term)
+            for gram in trigrams(term):
+                buckets = self._grams.get(gram)
+                if not buckets:
+                    continue
+                bucket = buckets.get(len(term))
+                if bucket is not None:
+                    bucket.discard(term)
+                    if not bucket:
+                        del buckets[len(term)]
+                if not buckets:
+                    del self._grams[gram]
+
+    def reset(self, vocabulary):
+        grams = {}
+        for term in vocabulary:
+            for gram in trigrams(term):
+                grams.setdefault(gram, {}).setdefault(len(term), set()).add(term)
+        with self._lock:
+            self._grams = grams
+            self._terms = set(vocabulary)
+
+    def corrections(self, term):
+        limit = max_edits(term)
+        if not limit:
+            return []
+        lengths = range(len(term) - limit, len(term) + limit + 1)
+        overlap = {}
+        with self._lock:
+            for gram in trigrams(term):
+                buckets = self._grams.get(gram)
+                if not buckets:
+                    continue
+                postings = [buckets[length] for length in lengths if length in buckets]
+                if sum(len(bucket) for bucket in postings) > self.max_posting:
+                    continue
+                for bucket in postings:
+                    for candidate in bucket:
+                        overlap[candidate] = overlap.get(candidate, 0) + 1
+        candidates = heapq.nlargest(self.max_candidates, overlap.items(), key=lambda item: item[1])
+        matches = []
+        for candidate, _ in candidates:
+            if candidate == term:
+                continue
+            distance = bounded_distance(term, candidate, limit)
+            if distance is not None:
+                matches.append((candidate, distance))
+        return matches
+
+    def weighted_terms(self, query):
+        weighted = {}
+        for term in analyze(query):
+            if term in self._terms:
+                weighted[term] = 1.0
+            for candidate, distance in self.corrections(term):
+                weighted[candidate] = max(weighted.get(candidate, 0), 1.0 / (1 + distance))
+        return weighted
+
+    def stats(self):
+        with self._lock:
+            return {'terms': len(self._terms), 'trigrams': len(self._grams)}
@@ -0,0 +1,198 @@
+import threading
+import time
+from datetime import datetime
+
+from pymongo import monitoring
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked_out = {}
+        self.waiting = {}
+
+    def _add(self, counters, address, delta):
+        with self._lock:
+            counters[address] = max(0, counters.get(address, 0) + delta)
+
+    def connection_check_out_started(self, event):
+        self._add(self.waiting, event.address, 1)
+
+    def connection_checked_out(self, event):
+        self._add(self.waiting, event.address, -1)
+        self._add(self.checked_out, event.address, 1)
+
+    def connection_check_out_failed(self, event):
+        self._add(self.waiting, event.address, -1)
+
+    def connection_checked_in(self, event):
+        self._add(self.checked_out, event.address, -1)
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        with self._lock:
+            self.checked_out.pop(event.address, None)
+            self.waiting.pop(event.address, None)
+
+    def connection_created(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        pass
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.checked_out), dict(self.waiting)
+
+
+class HealthProber:
+    # Probes the database every interval and builds indexes in the background.
+    # Each index is tracked on its own: a failed build is retried with
+    # exponential backoff (capped at retry_max seconds) instead of on every
+    # probe, and only indexes listed in required keep the app unready once
+    # their first build has been attempted.
+    def __init__(self, db, pool_monitor, max_pool_size, indexes, build_index,
+                 interval=2.0, saturation_limit=0.9, required=(), retry_max=300.0):
+        self.db = db
+        self.pool_monitor = pool_monitor
+        self.max_pool_size = max_pool_size
+        self.build_index = build_index
+        self.interval = interval
+        self.saturation_limit = saturation_limit
+        self.required = tuple(required)
+        self.retry_max = retry_max
+        self.indexes = {
+            name: {'state': 'pending', 'error': None, 'failures': 0, 'retryAt': 0.0} for name in indexes
+        }
+        self._index_thread = None
+        self._status = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def index_state(self):
+        states = set(index['state'] for index in self.indexes.values())
+        for state in ('building', 'pending', 'failed'):
+            if state in states:
+                return state
+        return 'ready'
+
+    def index_ready(self, name):
+        return self.indexes[name]['state'] == 'ready'
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='health-prober', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _due_indexes(self):
+        now = time.monotonic()
+        return [
+            name for name, index in self.indexes.items()
+            if index['state'] == 'pending' or (index['state'] == 'failed' and index['retryAt'] <= now)
+        ]
+
+    def _build_indexes(self):
+        # Required indexes go first so the app becomes ready as early as possible.
+        due = sorted(self._due_indexes(), key=lambda name: name not in self.required)
+        for name in due:
+            index = self.indexes[name]
+            index['state'] = 'building'
+            try:
+                self.build_index(name)
+                index.update(state='ready', error=None, failures=0)
+            except Exception as e:
+                index['failures'] += 1
+                delay = min(self.interval * 2 ** index['failures'], self.retry_max)
+                index.update(state='failed', error=str(e), retryAt=time.monotonic() + delay)
+
+    def _pool_status(self):
+        checked_out, waiting = self.pool_monitor.snapshot()
+        in_use = max(checked_out.values(), default=0)
+        queued = sum(waiting.values())
+        saturation = in_use / float(self.max_pool_size) if self.max_pool_size else 0.0
+        return {
+            'inUse': in_use,
+            'waiting': queued,
+            'maxPoolSize': self.max_pool_size,
+            'saturation': round(saturation, 3)
+        }
+
+    def probe(self):
+        started = time.perf_counter()
+        database_error = None
+        try:
+            self.db.command('ping')
+        except Exception as e:
+            database_error = str(e)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        if database_error is None and self._due_indexes():
+            if self._index_thread is None or not self._index_thread.is_alive():
+                self._index_thread = threading.Thread(target=self._build_indexes, name='index-builder', daemon=True)
+                self._index_thread.start()
+
+        pool = self._pool_status()
+        reasons = []
+        if database_error is not None:
+            reasons.append('database unreachable')
+        for name, index in self.indexes.items():
+            if index['state'] == 'ready':
+                continue
+            if name in self.required or not index['failures']:
+                reasons.append('index %s %s' % (name, index['state']))
+        if pool['saturation'] >= self.saturation_limit:
+            reasons.append('connection pool saturated')
+
+        self._status = {
+            'ready': not reasons,
+            'reasons': reasons,
+            'database': 'connected' if database_error is None else 'disconnected',
+            'databaseError': database_error,
+            'pingMs': round(latency_ms, 3),
+            'indexes': self.index_state,
+            'indexErrors': {name: index['error'] for name, index in self.indexes.items() if index['error']},
+            'pool': pool,
+            'checkedAt': datetime.utcnow().isoformat(),
+            'checkedAtMonotonic': time.monotonic()
+        }
+        return self._status
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.probe()
+            self._stop.wait(self.interval)
+
+    def status(self):
+        status = self._status
+        if status is None:
+            return {'ready': False, 'reasons': ['not probed yet'], 'database': 'unknown',
+                    'indexes': self.index_state, 'checkedAt': None, 'ageSeconds': None}
+        status = dict(status)
+        age = time.monotonic() - status.pop('checkedAtMonotonic')
+        status['ageSeconds'] = round(age, 3)
+        # Pool usage is read live since it is cheap and changes fastest.
+        status['pool'] = self._pool_status()
+        reasons = [reason for reason in status['reasons'] if reason != 'connection pool saturated']
+        if status['pool']['saturation'] >= self.saturation_limit:
+            reasons.append('connection pool saturated')
+        if age > self.interval * 3:
+            reasons.append('health status is stale')
+        status['reasons'] = reasons
+        status['ready'] = not reasons
+        return status
@@ -0,0 +1,32 @@
+# Every index the app expects, by name: (collection, keys, options). The
+# health prober builds them one by one in the background and the seeder
+# creates the same set, so both agree on what the schema looks like.
+INDEXES = {
+    'users.email': ('users', 'email', {'unique': True}),
+    'users.createdAt': ('users', 'createdAt', {}),
+    'products.text': ('products', [('title', 'text'), ('description', 'text')], {}),
+    'products.createdAt': ('products', [('createdAt', -1)], {}),
+    'products.price': ('products', 'price', {}),
+    'products.createdBy_createdAt': ('products', [('createdBy', 1), ('createdAt', -1)], {}),
+    'products.updatedAt': ('products', 'updatedAt', {}),
+    'products.id': ('products', 'id', {'unique': True}),
+    'refresh_tokens.expiresAt': ('refresh_tokens', 'expiresAt', {'expireAfterSeconds': 0}),
+    'refresh_tokens.family': ('refresh_tokens', 'family', {}),
+    'revoked_tokens.expiresAt': ('revoked_tokens', 'expiresAt', {'expireAfterSeconds': 0}),
+    'revoked_tokens.revokedAt': ('revoked_tokens', 'revokedAt', {})
+}
+
+# Indexes that enforce correctness rather than speed. Until these exist the
+# app is not ready; any other index failing is reported and retried but
+# leaves the app serving (more slowly).
+REQUIRED_INDEXES = ('users.email',)
+
+
+def build_index(db, name):
+    collection, keys, options = INDEXES[name]
+    db[collection].create_index(keys, **options)
+
+
+def ensure_indexes(db):
+    for name in INDEXES:
+        build_index(db, name)
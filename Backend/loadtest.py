@@ -0,0 +1,491 @@
+import argparse
+import http.client
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from standin import load_app
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9, 99.99)
+
+
+class HdrHistogram:
+    # Log-linear buckets as in HdrHistogram: values are recorded in
+    # microseconds with `significant_figures` of precision across the range.
+    def __init__(self, lowest=1, highest=3600 * 1000 * 1000, significant_figures=3):
+        largest_single_unit = 2 * 10 ** significant_figures
+        self.unit_magnitude = int(math.floor(math.log2(lowest)))
+        self.sub_bucket_count_magnitude = int(math.ceil(math.log2(largest_single_unit)))
+        self.sub_bucket_half_count_magnitude = self.sub_bucket_count_magnitude - 1
+        self.sub_bucket_count = 1 << self.sub_bucket_count_magnitude
+        self.sub_bucket_half_count = self.sub_bucket_count // 2
+        self.sub_bucket_mask = (self.sub_bucket_count - 1) << self.unit_magnitude
+        smallest_untrackable = self.sub_bucket_count << self.unit_magnitude
+        self.bucket_count = 1
+        while smallest_untrackable <= highest:
+            smallest_untrackable <<= 1
+            self.bucket_count += 1
+        self.highest = highest
+        self.counts = [0] * ((self.bucket_count + 1) * self.sub_bucket_half_count)
+        self.total = 0
+        self.min = None
+        self.max = 0
+        self.sum = 0
+
+    def _index(self, value):
+        bucket_index = (value | self.sub_bucket_mask).bit_length() - self.unit_magnitude - self.sub_bucket_count_magnitude
+        sub_bucket_index = value >> (bucket_index + self.unit_magnitude)
+        return ((bucket_index + 1) << self.sub_bucket_half_count_magnitude) + sub_bucket_index - self.sub_bucket_half_count
+
+    def _highest_equivalent(self, index):
+        bucket_index = (index >> self.sub_bucket_half_count_magnitude) - 1
+        sub_bucket_index = (index & (self.sub_bucket_half_count - 1)) + self.sub_bucket_half_count
+        if bucket_index < 0:
+            sub_bucket_index -= self.sub_bucket_half_count
+            bucket_index = 0
+        lowest = sub_bucket_index << (bucket_index + self.unit_magnitude)
+        return lowest + (1 << (bucket_index + self.unit_magnitude)) - 1
+
+    def record(self, value, count=1):
+        value = min(max(int(value), 0), self.highest)
+        self.counts[self._index(value)] += count
+        self.total += count
+        self.sum += value * count
+        self.max = max(self.max, value)
+        self.min = value if self.min is None else min(self.min, value)
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            if count:
+                self.counts[index] += count
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def value_at_percentile(self, percentile):
+        if not self.total:
+            return 0
+        target = max(1, int(math.ceil(percentile / 100.0 * self.total)))
+        running = 0
+        for index, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                return min(self._highest_equivalent(index), self.max)
+        return self.max
+
+    def summary(self):
+        result = {
+            'count': self.total,
+            'minUs': self.min or 0,
+            'maxUs': self.max,
+            'meanUs': round(self.sum / self.total, 1) if self.total else 0
+        }
+        for percentile in PERCENTILES:
+            result['p%sUs' % ('%g' % percentile).replace('.', '')] = self.value_at_percentile(percentile)
+        result['buckets'] = [
+            [self._highest_equivalent(index), count]
+            for index, count in enumerate(self.counts) if count
+        ]
+        return result
+
+
+class HttpTarget:
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        self.name = base_url
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            conn = factory(self.host, self.port, timeout=self.timeout)
+            self._local.conn = conn
+        return conn
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        conn = self._connection()
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self._local.conn = None
+            raise
+        return response.status, data
+
+
+class InProcessTarget:
+    # The per-IP register/login limits would throttle setup and the login
+    # scenario, since every request comes from one address; they are off
+    # for the in-process app unless rate_limits is set.
+    def __init__(self, stand_in=False, rate_limits=False):
+        self.app = load_app(stand_in).app
+        if not rate_limits:
+            self.app.config['RATE_LIMIT_ENABLED'] = False
+        self.name = 'in-process' + (' (stand-in)' if stand_in else '')
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, headers=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body, headers=headers)
+        return response.status_code, response.get_data()
+
+
+def parse_json(data):
+    try:
+        return json.loads(data)
+    except ValueError:
+        return {}
+
+
+class Scenario:
+    weights = {}
+
+    def __init__(self, target, rng, users=20, products=200):
+        self.target = target
+        self.rng = rng
+        self.user_count = users
+        self.product_count = products
+        self.users = []
+        self.tokens = []
+        self.product_ids = []
+        self._lock = threading.Lock()
+
+    def wait_until_ready(self, timeout=30):
+        # Registration is refused until the server has built its indexes.
+        deadline = time.monotonic() + timeout
+        while True:
+            status, _ = self.target.request('GET', '/readyz')
+            if status == 200:
+                return
+            if time.monotonic() > deadline:
+                raise SystemExit('Target did not become ready within %ds (GET /readyz returned %d)' % (timeout, status))
+            time.sleep(0.2)
+
+    def setup(self):
+        self.wait_until_ready()
+        for index in range(self.user_count):
+            email = 'loadtest-%d@example.com' % index
+            credentials = {'name': 'Load Test %d' % index, 'email': email, 'password': 'loadtest-password'}
+            status, data = self.target.request('POST', '/api/auth/register', credentials)
+            if status != 201:
+                status, data = self.target.request('POST', '/api/auth/login', credentials)
+            if status == 429:
+                raise SystemExit('Rate limited while obtaining a token for %s (HTTP 429); start the server '
+                                 'with RATE_LIMIT_ENABLED=false to load test it' % email)
+            if status not in (200, 201):
+                raise SystemExit('Could not obtain a token for %s (HTTP %d)' % (email, status))
+            self.users.append(credentials)
+            self.tokens.append(parse_json(data)['token'])
+
+    def seed_products(self):
+        status, data = self.target.request('GET', '/api/products?limit=100', headers=self.auth())
+        existing = parse_json(data).get('products', []) if status == 200 else []
+        self.product_ids = [product['id'] for product in existing]
+        for index in range(len(self.product_ids), self.product_count):
+            status, data = self.target.request('POST', '/api/products', {
+                'title': 'Load test product %d %s' % (index, self.rng.choice(WORDS)),
+                'description': ' '.join(self.rng.choice(WORDS) for _ in range(20)),
+                'price': round(self.rng.uniform(1, 500), 2)
+            }, self.auth())
+            if status == 201:
+                self.product_ids.append(parse_json(data)['product']['id'])
+
+    def auth(self, rng=None):
+        return {'Authorization': 'Bearer ' + (rng or self.rng).choice(self.tokens)}
+
+    def next_operation(self, rng):
+        name = rng.choices(list(self.weights), weights=list(self.weights.values()))[0]
+        return name, getattr(self, 'op_' + name)(rng)
+
+
+WORDS = [
+    'wireless', 'keyboard', 'mouse', 'monitor', 'laptop', 'stand', 'cable', 'adapter',
+    'speaker', 'headphones', 'charger', 'camera', 'lens', 'tripod', 'desk', 'lamp',
+    'ergonomic', 'portable', 'compact', 'premium', 'bluetooth', 'usb', 'hdmi', 'gaming'
+]
+
+
+class LoginStorm(Scenario):
+    weights = {'login_valid': 3, 'login_unknown': 6, 'login_wrong_password': 1}
+
+    def op_login_valid(self, rng):
+        user = rng.choice(self.users)
+        return 'POST', '/api/auth/login', {'email': user['email'], 'password': user['password']}, None
+
+    def op_login_unknown(self, rng):
+        email = 'nobody-%d@example.com' % rng.randrange(10 ** 9)
+        return 'POST', '/api/auth/login', {'email': email, 'password': 'guessed-password'}, None
+
+    def op_login_wrong_password(self, rng):
+        user = rng.choice(self.users)
+        return 'POST', '/api/auth/login', {'email': user['email'], 'password': 'wrong-password'}, None
+
+
+class Browse(Scenario):
+    weights = {'list': 6, 'list_deep': 1, 'search': 2, 'detail': 3}
+
+    def setup(self):
+        super().setup()
+        self.seed_products()
+
+    def op_list(self, rng):
+        sort = rng.choice(['-createdAt', 'createdAt', 'price', '-price', 'title'])
+        path = '/api/products?page=%d&limit=%d&sort=%s' % (rng.randint(1, 5), rng.choice([10, 20, 50, 100]), sort)
+        return 'GET', path, None, self.auth(rng)
+
+    def op_list_deep(self, rng):
+        path = '/api/products?page=%d&limit=100' % rng.randint(1, max(1, self.product_count // 100))
+        return 'GET', path, None, self.auth(rng)
+
+    def op_search(self, rng):
+        return 'GET', '/api/products?keyword=%s' % rng.choice(WORDS), None, self.auth(rng)
+
+    def op_detail(self, rng):
+        return 'GET', '/api/products/%s' % rng.choice(self.product_ids), None, self.auth(rng)
+
+
+class MixedCrud(Browse):
+    weights = {'list': 2, 'detail': 4, 'create': 2, 'update': 1, 'delete': 1}
+
+    def op_create(self, rng):
+        body = {
+            'title': 'Mixed product %s' % rng.choice(WORDS),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(12)),
+            'price': round(rng.uniform(1, 500), 2)
+        }
+        return 'POST', '/api/products', body, self.auth(rng)
+
+    def op_update(self, rng):
+        body = {'price': round(rng.uniform(1, 500), 2)}
+        return 'PUT', '/api/products/%s' % rng.choice(self.product_ids), body, self.auth(rng)
+
+    def op_delete(self, rng):
+        with self._lock:
+            # Keep the detail/update working set stable by deleting only
+            # products this run created.
+            created = self.product_ids[self.product_count:]
+            product_id = rng.choice(created) if created else None
+            if product_id:
+                self.product_ids.remove(product_id)
+        if product_id is None:
+            return self.op_create(rng)
+        return 'DELETE', '/api/products/%s' % product_id, None, self.auth(rng)
+
+    def record_result(self, name, status, data):
+        if name == 'create' and status == 201:
+            with self._lock:
+                self.product_ids.append(parse_json(data)['product']['id'])
+
+
+SCENARIOS = {'login': LoginStorm, 'browse': Browse, 'mixed': MixedCrud}
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.statuses = {}
+        self.errors = {}
+
+    def record(self, name, latency_us, status):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = HdrHistogram()
+            histogram.record(latency_us)
+            statuses = self.statuses.setdefault(name, {})
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            if status == 'error' or int(status) >= 500:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def run_open_loop(scenario, rate, duration, workers, seed, poisson):
+    # Open-loop: requests are scheduled on a fixed timeline regardless of
+    # how fast responses come back, and latency is measured from the
+    # intended send time so queueing behind slow requests is not hidden.
+    recorder = Recorder()
+    rng = random.Random(seed)
+    total = int(rate * duration)
+
+    def execute(index, intended):
+        # One RNG per request, derived from (seed, index), so the same seed
+        # sends the same operation mix and payloads whichever thread runs it.
+        name, (method, path, body, headers) = scenario.next_operation(random.Random('%s-%d' % (seed, index)))
+        try:
+            status, data = scenario.target.request(method, path, body, headers)
+            if hasattr(scenario, 'record_result'):
+                scenario.record_result(name, status, data)
+        except Exception:
+            status = 'error'
+        recorder.record(name, (time.perf_counter() - intended) * 1e6, status)
+
+    schedule = []
+    offset = 0.0
+    for index in range(total):
+        schedule.append(offset)
+        offset += rng.expovariate(rate) if poisson else 1.0 / rate
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for index, offset in enumerate(schedule):
+            intended = started + offset
+            delay = intended - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(execute, index, intended)
+    elapsed = time.perf_counter() - started
+    return recorder, elapsed
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_report(args, target, recorder, elapsed):
+    overall = HdrHistogram()
+    operations = {}
+    for name, histogram in sorted(recorder.histograms.items()):
+        overall.merge(histogram)
+        operations[name] = {
+            'latency': histogram.summary(),
+            'statuses': recorder.statuses.get(name, {}),
+            'errors': recorder.errors.get(name, 0)
+        }
+    return {
+        'meta': {
+            'scenario': args.scenario,
+            'target': target.name,
+            'rate': args.rate,
+            'durationSeconds': args.duration,
+            'arrivals': 'poisson' if args.poisson else 'uniform',
+            'seed': args.seed,
+            'revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat()
+        },
+        'throughput': {
+            'completed': overall.total,
+            'elapsedSeconds': round(elapsed, 3),
+            'requestsPerSecond': round(overall.total / elapsed, 2) if elapsed else 0,
+            'errors': sum(recorder.errors.values())
+        },
+        'latency': overall.summary(),
+        'operations': operations
+    }
+
+
+def print_summary(report):
+    throughput = report['throughput']
+    print('%s against %s: %d requests in %.1fs (%.1f req/s, %d errors)' % (
+        report['meta']['scenario'], report['meta']['target'], throughput['completed'],
+        throughput['elapsedSeconds'], throughput['requestsPerSecond'], throughput['errors']
+    ))
+    rows = [('overall', report['latency'])] + [(name, op['latency']) for name, op in report['operations'].items()]
+    print('%-22s %8s %10s %10s %10s %10s' % ('operation', 'count', 'p50 ms', 'p99 ms', 'p999 ms', 'max ms'))
+    for name, latency in rows:
+        print('%-22s %8d %10.2f %10.2f %10.2f %10.2f' % (
+            name, latency['count'], latency['p50Us'] / 1000.0, latency['p99Us'] / 1000.0,
+            latency['p999Us'] / 1000.0, latency['maxUs'] / 1000.0
+        ))
+
+
+def compare(baseline_path, current_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(current_path) as f:
+        current = json.load(f)
+
+    def delta(old, new):
+        if not old:
+            return '     n/a'
+        return '%+7.1f%%' % (100.0 * (new - old) / old)
+
+    print('%-22s %-8s %12s %12s %9s' % ('operation', 'metric', 'baseline', 'current', 'change'))
+    rows = [('overall', baseline['latency'], current['latency'])]
+    for name, op in current['operations'].items():
+        if name in baseline['operations']:
+            rows.append((name, baseline['operations'][name]['latency'], op['latency']))
+    for name, old, new in rows:
+        for metric in ('p50Us', 'p99Us', 'p999Us'):
+            print('%-22s %-8s %10.2fms %10.2fms %9s' % (
+                name, metric[:-2], old[metric] / 1000.0, new[metric] / 1000.0, delta(old[metric], new[metric])
+            ))
+    old_rps = baseline['throughput']['requestsPerSecond']
+    new_rps = current['throughput']['requestsPerSecond']
+    print('%-22s %-8s %10.1f/s %10.1f/s %9s' % ('overall', 'rps', old_rps, new_rps, delta(old_rps, new_rps)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Open-loop load tests for the registration/products API.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='run a scenario and write a JSON report')
+    run.add_argument('--scenario', choices=sorted(SCENARIOS), default='browse')
+    run.add_argument('--url', help='base URL of a running server, e.g. http://localhost:5001; '
+                                   'start it with RATE_LIMIT_ENABLED=false')
+    run.add_argument('--stand-in', action='store_true', help='run in-process against mongomock instead of MONGO_URI')
+    run.add_argument('--rate-limits', action='store_true', help='keep the in-process app\'s rate limits on')
+    run.add_argument('--rate', type=float, default=100, help='target requests per second')
+    run.add_argument('--duration', type=float, default=30, help='seconds of traffic to generate')
+    run.add_argument('--workers', type=int, default=64, help='maximum concurrent requests')
+    run.add_argument('--users', type=int, default=20)
+    run.add_argument('--products', type=int, default=200)
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--poisson', action='store_true', help='use exponential inter-arrival times')
+    run.add_argument('--out', help='path of the JSON report')
+
+    diff = commands.add_parser('compare', help='compare two JSON reports')
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        compare(args.baseline, args.current)
+        return 0
+
+    target = HttpTarget(args.url) if args.url else InProcessTarget(stand_in=args.stand_in, rate_limits=args.rate_limits)
+    scenario = SCENARIOS[args.scenario](target, random.Random(args.seed), users=args.users, products=args.products)
+    scenario.setup()
+
+    recorder, elapsed = run_open_loop(scenario, args.rate, args.duration, args.workers, args.seed, args.poisson)
+    report = build_report(args, target, recorder, elapsed)
+    print_summary(report)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,309 @@
+import bisect
+import heapq
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from records import ProductRecord
+
+logger = logging.getLogger('mirror')
+
+SORTABLE_FIELDS = ('createdAt', 'price', 'title')
+
+
+def sort_key(document, field):
+    # Mongo orders missing and null values before everything else.
+    value = document.get(field)
+    return (0,) if value is None else (1, value)
+
+
+class CatalogMirror:
+    # Every product held in memory as a compact ProductRecord, with one
+    # sorted (key, _id) list per sortable field, kept ordered on each write,
+    # so a page under any supported sort is a slice. Local writes arrive through catalog events;
+    # writes from other workers are picked up by polling updatedAt, with a
+    # reconciliation of every _id and updatedAt whenever the counts disagree
+    # (deletes and documents written without updatedAt), and every
+    # reconcile_every polls regardless. Reads are refused once the last
+    # successful poll is older than max_staleness, so callers fall back to
+    # Mongo.
+    #
+    # updatedAt is stamped by each writer's clock, so the poll cursor only
+    # advances from documents read back from Mongo and each poll looks back
+    # clock_margin seconds; writers whose clocks lag by more than that are
+    # only caught by the next reconciliation.
+    def __init__(self, price_boundaries, max_staleness=10, clock_margin=30, reconcile_every=30):
+        self.price_boundaries = price_boundaries
+        self.max_staleness = max_staleness
+        self.clock_margin = clock_margin
+        self.reconcile_every = reconcile_every
+        self.ready = False
+        self.high_water = None
+        self.synced_at = None
+        self.polls = 0
+        self.reconciliations = 0
+        self.repaired = 0
+        self._lock = threading.RLock()
+        self._documents = {}
+        self._keys_by_id = {}
+        self._orderings = {field: [] for field in SORTABLE_FIELDS}
+        self._by_creator = {}
+        self._price_buckets = Counter()
+        self._creators = Counter()
+
+    def __len__(self):
+        return len(self._documents)
+
+    def fresh(self):
+        return self.ready and self.synced_at is not None and time.monotonic() - self.synced_at <= self.max_staleness
+
+    def _price_bucket(self, price):
+        if not isinstance(price, (int, float)) or price < self.price_boundaries[0] or price >= self.price_boundaries[-1]:
+            return 'other'
+        return self.price_boundaries[bisect.bisect_right(self.price_boundaries, price) - 1]
+
+    def _insert(self, key, document, ordered=True):
+        self._documents[key] = document
+        if document.get('id') is not None:
+            self._keys_by_id[document.get('id')] = key
+        for field, ordering in self._orderings.items():
+            if ordered:
+                bisect.insort(ordering, (sort_key(document, field), key))
+            else:
+                ordering.append((sort_key(document, field), key))
+        self._by_creator.setdefault(document.get('createdBy'), set()).add(key)
+        self._price_buckets[self._price_bucket(document.get('price'))] += 1
+        self._creators[document.get('createdBy')] += 1
+
+    def _remove(self, key):
+        document = self._documents.pop(key, None)
+        if document is None:
+            return
+        if self._keys_by_id.get(document.get('id')) == key:
+            del self._keys_by_id[document.get('id')]
+        for field, ordering in self._orderings.items():
+            entry = (sort_key(document, field), key)
+            index = bisect.bisect_left(ordering, entry)
+            if index < len(ordering) and ordering[index] == entry:
+                del ordering[index]
+        creator = document.get('createdBy')
+        keys = self._by_creator.get(creator)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_creator[creator]
+        bucket = self._price_bucket(document.get('price'))
+        self._price_buckets[bucket] -= 1
+        if not self._price_buckets[bucket]:
+            del self._price_buckets[bucket]
+        self._creators[creator] -= 1
+        if not self._creators[creator]:
+            del self._creators[creator]
+
+    def upsert(self, document):
+        document = ProductRecord.from_document(document)
+        key = document.get('_id')
+        with self._lock:
+            self._remove(key)
+            self._insert(key, document)
+        return document
+
+    def _advance(self, updated_at):
+        with self._lock:
+            if isinstance(updated_at, datetime) and (self.high_water is None or updated_at > self.high_water):
+                self.high_water = updated_at
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(str(key))
+
+    def apply(self, operation, document):
+        if operation == 'delete':
+            self.remove(document['_id'])
+        else:
+            self.upsert(document)
+
+    def get(self, product_id):
+        with self._lock:
+            key = self._keys_by_id.get(product_id)
+            document = self._documents.get(key) if key is not None else None
+        return document
+
+    def supports(self, sort_param):
+        return sort_param.lstrip('-') in SORTABLE_FIELDS
+
+    def listing(self, sort_param, skip, limit, min_price=None, max_price=None, created_by=None,
+                created_from=None, created_to=None):
+        # Returns the same shape as the $facet stage in get_products.
+        field = sort_param.lstrip('-')
+        descending = sort_param.startswith('-')
+
+        def matches(document):
+            price = document.get('price')
+            created_at = document.get('createdAt')
+            if min_price is not None and not (isinstance(price, (int, float)) and price >= min_price):
+                return False
+            if max_price is not None and not (isinstance(price, (int, float)) and price <= max_price):
+                return False
+            if created_by is not None and document.get('createdBy') != created_by:
+                return False
+            if created_from is not None and not (isinstance(created_at, datetime) and created_at >= created_from):
+                return False
+            if created_to is not None and not (isinstance(created_at, datetime) and created_at < created_to):
+                return False
+            return True
+
+        filtered = any(value is not None for value in (min_price, max_price, created_by, created_from, created_to))
+        with self._lock:
+            ordering = self._orderings[field]
+            if not filtered:
+                total = len(ordering)
+                if descending:
+                    end = max(total - skip, 0)
+                    window = ordering[max(end - limit, 0):end][::-1]
+                else:
+                    window = ordering[skip:skip + limit]
+                page = [self._documents[key] for _, key in window]
+                price_buckets = dict(self._price_buckets)
+                creators = self._creators.most_common(10)
+            else:
+                keys = self._candidates(min_price, max_price, created_by, created_from, created_to)
+                selected = [self._documents[key] for key in keys if matches(self._documents[key])]
+                total = len(selected)
+                price_buckets = Counter(self._price_bucket(document.get('price')) for document in selected)
+                creators = Counter(document.get('createdBy') for document in selected).most_common(10)
+                ranked = (heapq.nlargest if descending else heapq.nsmallest)(
+                    skip + limit, selected, key=lambda document: (sort_key(document, field), document.get('_id'))
+                )
+                page = ranked[skip:]
+
+        return {
+            'items': page,
+            'total': [{'count': total}] if total else [],
+            'priceRanges': [{'_id': bucket, 'count': count} for bucket, count in price_buckets.items()],
+            'creators': [{'_id': creator, 'count': count} for creator, count in creators]
+        }
+
+    def _candidates(self, min_price, max_price, created_by, created_from, created_to):
+        # Start from the narrowest single index, then filter the rest.
+        options = []
+        if created_by is not None:
+            options.append(self._by_creator.get(created_by, ()))
+        if min_price is not None or max_price is not None:
+            options.append(self._range('price', min_price, max_price, inclusive_high=True))
+        if created_from is not None or created_to is not None:
+            options.append(self._range('createdAt', created_from, created_to, inclusive_high=False))
+        return min(options, key=len)
+
+    def _range(self, field, low, high, inclusive_high):
+        ordering = self._orderings[field]
+        start = bisect.bisect_left(ordering, ((1, low),)) if low is not None else bisect.bisect_left(ordering, ((1,),))
+        if high is None:
+            end = len(ordering)
+        elif inclusive_high:
+            # (1, high, 0) sorts after every (1, high) key, so equal values are kept.
+            end = bisect.bisect_left(ordering, ((1, high, 0),))
+        else:
+            end = bisect.bisect_left(ordering, ((1, high),))
+        return [key for _, key in ordering[start:end]]
+
+    def load(self, collection):
+        mirror = CatalogMirror(self.price_boundaries)
+        high_water = None
+        for document in collection.find({}):
+            document = ProductRecord.from_document(document)
+            mirror._insert(document.get('_id'), document, ordered=False)
+            updated_at = document.get('updatedAt')
+            if isinstance(updated_at, datetime) and (high_water is None or updated_at > high_water):
+                high_water = updated_at
+        for ordering in mirror._orderings.values():
+            ordering.sort()
+        with self._lock:
+            self._documents = mirror._documents
+            self._keys_by_id = mirror._keys_by_id
+            self._orderings = mirror._orderings
+            self._by_creator = mirror._by_creator
+            self._price_buckets = mirror._price_buckets
+            self._creators = mirror._creators
+            if high_water is not None and (self.high_water is None or high_water > self.high_water):
+                self.high_water = high_water
+        self.synced_at = time.monotonic()
+
+    def poll(self, collection):
+        started = time.monotonic()
+        if self.high_water is not None:
+            # Overlap by clock_margin: writers' clocks differ and re-applying is harmless.
+            since = self.high_water - timedelta(seconds=self.clock_margin)
+            for document in collection.find({'updatedAt': {'$gte': since}}):
+                self._advance(self.upsert(document).get('updatedAt'))
+        self.polls += 1
+        if self.polls % self.reconcile_every == 0 or collection.estimated_document_count() != len(self):
+            self.reconcile(collection)
+        self.synced_at = started
+
+    def reconcile(self, collection):
+        # Compares every _id and updatedAt with Mongo and re-fetches rows that
+        # are missing or differ, so missed updates are repaired as well as
+        # missed inserts and deletes. Only rows mirrored before the scan are
+        # dropped; anything upserted meanwhile may not be in the snapshot yet.
+        with self._lock:
+            known = set(self._documents)
+        live = {
+            str(document['_id']): document.get('updatedAt')
+            for document in collection.find({}, {'_id': 1, 'updatedAt': 1})
+        }
+        with self._lock:
+            for key in [key for key in known if key not in live]:
+                self._remove(key)
+            changed = [
+                key for key, updated_at in live.items()
+                if key not in self._documents or self._documents[key].get('updatedAt') != updated_at
+            ]
+        for start in range(0, len(changed), 1000):
+            ids = [ObjectId(key) if ObjectId.is_valid(key) else key for key in changed[start:start + 1000]]
+            for document in collection.find({'_id': {'$in': ids}}):
+                self.upsert(document)
+        self.reconciliations += 1
+        self.repaired += len(changed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'fresh': self.fresh(),
+                'products': len(self._documents),
+                'creators': len(self._creators),
+                'highWater': self.high_water.isoformat() if self.high_water else None,
+                'secondsSinceSync': round(time.monotonic() - self.synced_at, 2) if self.synced_at else None,
+                'maxStalenessSeconds': self.max_staleness,
+                'polls': self.polls,
+                'reconciliations': self.reconciliations,
+                'repaired': self.repaired
+            }
+
+
+def start_catalog_mirror(mirror, collection, poll_interval, retry_interval=5):
+    def run():
+        while not mirror.ready:
+            try:
+                mirror.load(collection)
+                mirror.ready = True
+                logger.info('Catalog mirror ready with %d products', len(mirror))
+            except Exception as e:
+                logger.warning('Catalog mirror load failed, retrying: %s', e)
+                time.sleep(retry_interval)
+
+        while True:
+            time.sleep(poll_interval)
+            try:
+                mirror.poll(collection)
+            except Exception as e:
+                logger.warning('Catalog mirror poll failed: %s', e)
+
+    thread = threading.Thread(target=run, name='catalog-mirror', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,41 @@
+from bson import ObjectId
+
+
+class Principal:
+    # Stand-in for the user document built from access-token claims. The
+    # fields the claims carry are served directly; anything else loads the
+    # full document once, on first access.
+    def __init__(self, claims, loader):
+        self._loader = loader
+        self._document = None
+        self._fields = {
+            '_id': ObjectId(claims['user_id']),
+            'email': claims['email'],
+            'name': claims.get('name', ''),
+            'fullName': claims.get('name', '')
+        }
+
+    @property
+    def document(self):
+        if self._document is None:
+            self._document = self._loader(self._fields['_id'])
+            if self._document is None:
+                raise LookupError('User not found')
+        return self._document
+
+    @property
+    def loaded(self):
+        return self._document is not None
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return self._fields[key]
+        return self.document[key]
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            return self._fields[key]
+        return self.document.get(key, default)
+
+    def __contains__(self, key):
+        return key in self._fields or key in self.document
@@ -0,0 +1,149 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return '%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+# Leaf frames of threads parked waiting for work: condition and event waits,
+# queue gets, selector polls and idle executor workers.
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('socketserver.py', 'serve_forever'),
+    ('thread.py', '_worker'),
+    ('process.py', '_worker')
+}
+
+
+def is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+class SamplingProfiler:
+    # threads='requests' samples only threads currently handling a request,
+    # so background loops sleeping between polls do not swamp the profile.
+    # threads='all' samples every thread but skips ones parked in a wait.
+    def __init__(self, interval=0.01, max_depth=128, max_stacks=20000, threads='requests'):
+        self.interval = interval
+        self.threads = threads
+        self.max_depth = max_depth
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._stacks = Counter()
+        self._samples = 0
+        self._dropped = 0
+        self._sampling_seconds = 0.0
+        self._started_at = None
+        self._elapsed = 0.0
+        self._thread = None
+        self._stop = threading.Event()
+        self._request_threads = set()
+        self._idle = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def request_started(self):
+        self._request_threads.add(threading.get_ident())
+
+    def request_finished(self):
+        self._request_threads.discard(threading.get_ident())
+
+    def start(self, interval=None, threads=None):
+        if interval:
+            self.interval = interval
+        if threads:
+            self.threads = threads
+        if self.running:
+            return False
+        self._stop.clear()
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return False
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._elapsed += time.monotonic() - self._started_at
+        self._started_at = None
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self._samples = 0
+            self._dropped = 0
+            self._idle = 0
+            self._sampling_seconds = 0.0
+            self._elapsed = 0.0
+            if self._started_at is not None:
+                self._started_at = time.monotonic()
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            began = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            request_threads = set(self._request_threads) if self.threads == 'requests' else None
+            collected = []
+            idle = 0
+            for ident, frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+                if request_threads is not None and ident not in request_threads:
+                    continue
+                if is_idle(frame):
+                    idle += 1
+                    continue
+                labels = []
+                while frame is not None and len(labels) < self.max_depth:
+                    labels.append(frame_label(frame))
+                    frame = frame.f_back
+                labels.append(names.get(ident, 'thread-%d' % ident))
+                labels.reverse()
+                collected.append(';'.join(labels))
+            with self._lock:
+                for stack in collected:
+                    if stack in self._stacks or len(self._stacks) < self.max_stacks:
+                        self._stacks[stack] += 1
+                    else:
+                        self._dropped += 1
+                self._samples += 1
+                self._idle += idle
+                self._sampling_seconds += time.perf_counter() - began
+
+    def folded(self):
+        with self._lock:
+            items = sorted(self._stacks.items())
+        return ''.join('%s %d\n' % (stack, count) for stack, count in items)
+
+    def stats(self):
+        with self._lock:
+            elapsed = self._elapsed
+            if self._started_at is not None:
+                elapsed += time.monotonic() - self._started_at
+            return {
+                'running': self.running,
+                'intervalMs': self.interval * 1000,
+                'threads': self.threads,
+                'samples': self._samples,
+                'uniqueStacks': len(self._stacks),
+                'droppedStacks': self._dropped,
+                'idleStacksSkipped': self._idle,
+                'elapsedSeconds': round(elapsed, 3),
+                'overheadPercent': round(100 * self._sampling_seconds / elapsed, 3) if elapsed else 0.0
+            }
@@ -0,0 +1,189 @@
+import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+from pymongo import monitoring
+
+logger = logging.getLogger('slow_queries')
+
+EXPLAINABLE_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'findAndModify'}
+IGNORED_COMMANDS = {
+    'explain', 'hello', 'isMaster', 'ismaster', 'ping', 'endSessions',
+    'saslStart', 'saslContinue', 'authenticate', 'buildInfo', 'getLastError'
+}
+SESSION_FIELDS = {
+    'lsid', '$db', '$clusterTime', '$readPreference', 'txnNumber', 'autocommit',
+    'startTransaction', 'readConcern', 'writeConcern', 'maxTimeMS', 'cursor',
+    'batchSize', 'singleBatch', 'comment', 'apiVersion', 'apiStrict'
+}
+SHAPE_FIELDS = (
+    'filter', 'query', 'sort', 'projection', 'pipeline', 'key', 'update',
+    'updates', 'deletes', 'hint'
+)
+OTHER_SHAPE = '<other>'
+
+
+def normalize(value):
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return []
+        if all(not isinstance(item, (dict, list, tuple)) for item in value):
+            return ['?']
+        return [normalize(item) for item in value]
+    return '?'
+
+
+def command_shape(command_name, command):
+    parts = {'command': command_name, 'collection': command.get(command_name)}
+    for field in SHAPE_FIELDS:
+        if field in command:
+            parts[field] = normalize(command[field])
+    if command_name in ('find', 'aggregate', 'count', 'distinct') and 'sort' in command:
+        # Sort directions matter for index selection, keep them as-is.
+        parts['sort'] = dict(command['sort'])
+    return json.dumps(parts, sort_keys=True, default=str)
+
+
+def plan_summary(stage):
+    if not isinstance(stage, dict):
+        return None
+    names = []
+    while stage:
+        names.append(stage.get('stage', '?'))
+        if 'indexName' in stage:
+            names[-1] += '(' + stage['indexName'] + ')'
+        stage = stage.get('inputStage') or (stage.get('inputStages') or [None])[0]
+    return ' <- '.join(names)
+
+
+class QueryMonitor(monitoring.CommandListener):
+    def __init__(self, slow_ms=100, max_shapes=500, max_slow=100, explain_interval=60):
+        self.slow_ms = slow_ms
+        self.max_shapes = max_shapes
+        self.explain_interval = explain_interval
+        self.client = None
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._shapes = {}
+        self._slow = []
+        self._max_slow = max_slow
+        self._last_explained = {}
+        self._explain_queue = queue.Queue(maxsize=100)
+        self._local = threading.local()
+        self._worker = None
+
+    def attach(self, client):
+        self.client = client
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._explain_loop, name='query-explain', daemon=True)
+            self._worker.start()
+
+    def started(self, event):
+        if getattr(self._local, 'explaining', False) or event.command_name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        shape = command_shape(event.command_name, command)
+        explainable = event.command_name in EXPLAINABLE_COMMANDS
+        with self._lock:
+            self._pending[event.request_id] = (
+                shape,
+                event.database_name,
+                {k: v for k, v in command.items() if k not in SESSION_FIELDS} if explainable else None
+            )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed):
+        with self._lock:
+            pending = self._pending.pop(event.request_id, None)
+        if pending is None:
+            return
+        shape, database_name, command = pending
+        duration_ms = event.duration_micros / 1000.0
+        with self._lock:
+            stats = self._shapes.get(shape)
+            if stats is None:
+                if len(self._shapes) >= self.max_shapes:
+                    shape = OTHER_SHAPE
+                    stats = self._shapes.get(shape)
+                if stats is None:
+                    stats = {'count': 0, 'failures': 0, 'totalMs': 0.0, 'maxMs': 0.0}
+                    self._shapes[shape] = stats
+            stats['count'] += 1
+            stats['totalMs'] += duration_ms
+            stats['maxMs'] = max(stats['maxMs'], duration_ms)
+            if failed:
+                stats['failures'] += 1
+
+        if duration_ms < self.slow_ms:
+            return
+
+        entry = {
+            'shape': shape,
+            'durationMs': round(duration_ms, 3),
+            'failed': failed,
+            'timestamp': datetime.utcnow().isoformat(),
+            'plan': None
+        }
+        with self._lock:
+            self._slow.append(entry)
+            del self._slow[:-self._max_slow]
+
+        if command is not None and self.client is not None and self._should_explain(shape):
+            try:
+                self._explain_queue.put_nowait((entry, database_name, command))
+            except queue.Full:
+                pass
+        else:
+            logger.warning('slow query %s', json.dumps(entry))
+
+    def _should_explain(self, shape):
+        now = time.monotonic()
+        with self._lock:
+            last = self._last_explained.get(shape)
+            if last is not None and now - last < self.explain_interval:
+                return False
+            self._last_explained[shape] = now
+            return True
+
+    def _explain_loop(self):
+        while True:
+            entry, database_name, command = self._explain_queue.get()
+            self._local.explaining = True
+            try:
+                result = self.client[database_name].command({'explain': command, 'verbosity': 'queryPlanner'})
+                planner = result.get('queryPlanner') or {}
+                if not planner and 'stages' in result:
+                    planner = result['stages'][0].get('$cursor', {}).get('queryPlanner', {})
+                entry['plan'] = plan_summary(planner.get('winningPlan'))
+            except Exception as e:
+                entry['plan'] = 'explain failed: ' + str(e)
+            finally:
+                self._local.explaining = False
+            logger.warning('slow query %s', json.dumps(entry))
+
+    def top_shapes(self, limit=20):
+        with self._lock:
+            shapes = [dict(stats, shape=shape) for shape, stats in self._shapes.items()]
+            slow = list(self._slow)
+        shapes.sort(key=lambda s: s['totalMs'], reverse=True)
+        for stats in shapes:
+            stats['avgMs'] = round(stats['totalMs'] / stats['count'], 3)
+            stats['totalMs'] = round(stats['totalMs'], 3)
+            stats['maxMs'] = round(stats['maxMs'], 3)
+        return shapes[:limit], slow[-limit:]
+
+    def reset(self):
+        with self._lock:
+            self._shapes.clear()
+            self._slow.clear()
+            self._last_explained.clear()
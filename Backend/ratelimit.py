@@ -0,0 +1,154 @@
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SLOT = struct.Struct('<Qdd8x')
+HEADER = struct.Struct('<8sII')
+MAGIC = b'TBUCKET1'
+
+
+def key_hash(key):
+    # 0 marks an empty slot in the shared table.
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+def refill(tokens, updated, now, capacity, rate):
+    return min(float(capacity), tokens + max(0.0, now - updated) * rate)
+
+
+class LocalBucketStore:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = {}
+
+    def take(self, key, capacity, rate, cost=1.0, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (float(capacity), now))
+            tokens = refill(tokens, updated, now, capacity, rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            if key not in self._buckets and len(self._buckets) >= self.max_keys:
+                self._buckets.pop(next(iter(self._buckets)))
+            self._buckets[key] = (tokens, now)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+class SharedMemoryBucketStore:
+    # Fixed-size open-addressing table in an mmap'd file shared by every
+    # worker on the host. Slots are grouped into stripes; a key only ever
+    # probes inside its own stripe, so one fcntl range lock (plus a thread
+    # lock, since fcntl locks are per process) guards each update.
+    def __init__(self, path, slots=65536, stripe_size=64):
+        if fcntl is None:
+            raise RuntimeError('SharedMemoryBucketStore requires fcntl')
+        self.stripe_size = stripe_size
+        self.stripes = max(1, slots // stripe_size)
+        self.slots = self.stripes * stripe_size
+        size = HEADER.size + self.slots * SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER.size, 0)
+        try:
+            if os.fstat(self._fd).st_size != size or os.pread(self._fd, 8, 0) != MAGIC:
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, self.slots, self.stripe_size), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER.size, 0)
+        self._map = mmap.mmap(self._fd, size)
+        self._thread_locks = [threading.Lock() for _ in range(min(self.stripes, 256))]
+
+    def _offset(self, slot):
+        return HEADER.size + slot * SLOT.size
+
+    def take(self, key, capacity, rate, cost=1.0, now=None):
+        now = time.time() if now is None else now
+        hashed = key_hash(key)
+        stripe = hashed % self.stripes
+        base = stripe * self.stripe_size
+        start = (hashed >> 32) % self.stripe_size
+        lock_offset = self._offset(base)
+        lock_length = self.stripe_size * SLOT.size
+
+        with self._thread_locks[stripe % len(self._thread_locks)]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, lock_length, lock_offset)
+            try:
+                target = None
+                oldest = None
+                for probe in range(self.stripe_size):
+                    slot = base + (start + probe) % self.stripe_size
+                    stored_hash, tokens, updated = SLOT.unpack_from(self._map, self._offset(slot))
+                    if stored_hash == hashed:
+                        target = slot
+                        break
+                    if stored_hash == 0:
+                        target = slot
+                        tokens, updated = float(capacity), now
+                        break
+                    if oldest is None or updated < oldest[1]:
+                        oldest = (slot, updated)
+                if target is None:
+                    # Stripe is full: recycle the least recently touched bucket.
+                    target = oldest[0]
+                    tokens, updated = float(capacity), now
+
+                tokens = refill(tokens, updated, now, capacity, rate)
+                allowed = tokens >= cost
+                if allowed:
+                    tokens -= cost
+                SLOT.pack_into(self._map, self._offset(target), hashed, tokens, now)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, lock_length, lock_offset)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+
+class RateLimiter:
+    def __init__(self, store, rules):
+        # rules: {name: [(key_kind, capacity, per_seconds), ...]}
+        self.store = store
+        self.rules = rules
+        self._lock = threading.Lock()
+        self.allowed = Counter()
+        self.throttled = Counter()
+
+    def check(self, rule_name, keys):
+        # Buckets are keyed by rule, not route, so every endpoint sharing a
+        # rule draws on one budget. Checking stops at the first denial: a
+        # throttled caller must not keep draining later buckets (an attacker
+        # behind a blocked IP would otherwise lock the victim's email out).
+        retry_after = 0.0
+        throttled_by = None
+        for kind, capacity, per_seconds in self.rules.get(rule_name, ()):
+            value = keys.get(kind)
+            if not value:
+                continue
+            key = '%s:%s:%s' % (rule_name, kind, value)
+            allowed, retry_after = self.store.take(key, capacity, capacity / float(per_seconds))
+            if not allowed:
+                throttled_by = kind
+                break
+        with self._lock:
+            if throttled_by is None:
+                self.allowed[rule_name] += 1
+            else:
+                self.throttled['%s:%s' % (rule_name, throttled_by)] += 1
+        return throttled_by, retry_after if throttled_by else 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'store': type(self.store).__name__,
+                'allowed': dict(self.allowed),
+                'throttled': dict(self.throttled)
+            }
@@ -0,0 +1,60 @@
+import contextvars
+from collections import Counter
+
+import bson
+from pymongo import monitoring
+
+current_request_stats = contextvars.ContextVar('current_request_stats', default=None)
+
+
+class RoundtripBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestStats:
+    __slots__ = ('commands', 'bytes_sent', 'bytes_received', 'by_command')
+
+    def __init__(self):
+        self.commands = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.by_command = Counter()
+
+    def to_dict(self):
+        return {
+            'commands': self.commands,
+            'bytesSent': self.bytes_sent,
+            'bytesReceived': self.bytes_received,
+            'byCommand': dict(self.by_command)
+        }
+
+
+class RoundtripCounter(monitoring.CommandListener):
+    def __init__(self, measure_bytes=False):
+        self.measure_bytes = measure_bytes
+
+    def started(self, event):
+        stats = current_request_stats.get()
+        if stats is None:
+            return
+        stats.commands += 1
+        stats.by_command[event.command_name] += 1
+        if self.measure_bytes:
+            stats.bytes_sent += len(bson.encode(event.command))
+
+    def succeeded(self, event):
+        stats = current_request_stats.get()
+        if stats is not None and self.measure_bytes:
+            stats.bytes_received += len(bson.encode(event.reply))
+
+    def failed(self, event):
+        pass
+
+
+def begin_request():
+    stats = RequestStats()
+    return stats, current_request_stats.set(stats)
+
+
+def end_request(token):
+    current_request_stats.reset(token)
@@ -0,0 +1,297 @@
+import bisect
+import heapq
+import logging
+import math
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('search_index')
+
+# Snapshots are plain JSON (data only, never executed on load); bump the
+# version whenever their layout changes.
+SNAPSHOT_FORMAT = 'search-index'
+SNAPSHOT_VERSION = 2
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the this to was were will with'.split()
+)
+DERIVATIONAL_SUFFIXES = ('ingly', 'edly', 'ness', 'ment', 'ing', 'ful', 'ed', 'ly')
+VOWELS = frozenset('aeiouy')
+
+
+def stem(word):
+    # A light Porter-style stemmer: plural forms first, then one common
+    # suffix, then a trailing e, so "cable", "cables" and "cabled" agree.
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith('sses'):
+        word = word[:-2]
+    elif word.endswith('ies') and len(word) > 4:
+        word = word[:-3] + 'y'
+    elif word.endswith(('ches', 'shes', 'xes', 'zes')):
+        word = word[:-2]
+    elif word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        word = word[:-1]
+
+    for suffix in DERIVATIONAL_SUFFIXES:
+        if not word.endswith(suffix) or (suffix == 'ed' and word.endswith('eed')):
+            continue
+        base = word[:-len(suffix)]
+        if len(base) >= 3 and VOWELS.intersection(base):
+            word = base
+            if suffix in ('ingly', 'edly', 'ing', 'ed') and word[-1] == word[-2] and word[-1] not in 'lsz':
+                word = word[:-1]
+        break
+
+    if word.endswith('e') and len(word) > 4:
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def analyze(text):
+    return [stem(token) for token in tokenize(text)]
+
+
+class SearchIndex:
+    def __init__(self, title_weight=2, k1=1.2, b=0.75, max_prefix_expansions=20):
+        self.title_weight = title_weight
+        self.k1 = k1
+        self.b = b
+        self.max_prefix_expansions = max_prefix_expansions
+        self.ready = False
+        self.dirty = False
+        self._lock = threading.RLock()
+        self._postings = {}
+        self._documents = {}
+        self._total_length = 0
+        self._sorted_terms = None
+        # Objects with add_term/remove_term/reset, told about vocabulary changes.
+        self.vocabulary_listeners = []
+
+    def __len__(self):
+        return len(self._documents)
+
+    def document_terms(self, document):
+        counts = Counter(analyze(document.get('title') or ''))
+        for term in counts:
+            counts[term] *= self.title_weight
+        counts.update(analyze(document.get('description') or ''))
+        return counts
+
+    def add(self, document):
+        key = str(document['_id'])
+        counts = self.document_terms(document)
+        length = sum(counts.values())
+        with self._lock:
+            self._remove(key)
+            for term, frequency in counts.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    self._sorted_terms = None
+                    for listener in self.vocabulary_listeners:
+                        listener.add_term(term)
+                postings[key] = frequency
+            self._documents[key] = (document.get('id'), length, tuple(counts))
+            self._total_length += length
+            self.dirty = True
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(str(key))
+            self.dirty = True
+
+    def _remove(self, key):
+        entry = self._documents.pop(key, None)
+        if entry is None:
+            return
+        _, length, terms = entry
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+                self._sorted_terms = None
+                for listener in self.vocabulary_listeners:
+                    listener.remove_term(term)
+
+    def _reset_listeners(self):
+        for listener in self.vocabulary_listeners:
+            listener.reset(self._postings)
+
+    def apply(self, operation, document):
+        if operation == 'delete':
+            self.remove(document['_id'])
+        else:
+            self.add(document)
+
+    def terms(self):
+        with self._lock:
+            if self._sorted_terms is None:
+                self._sorted_terms = sorted(self._postings)
+            return self._sorted_terms
+
+    def expand_prefix(self, prefix):
+        terms = self.terms()
+        start = bisect.bisect_left(terms, prefix)
+        expansions = []
+        for term in terms[start:start + self.max_prefix_expansions]:
+            if not term.startswith(prefix):
+                break
+            expansions.append(term)
+        return expansions
+
+    def query_terms(self, query, prefix_last=True):
+        tokens = tokenize(query)
+        weighted = {}
+        for position, token in enumerate(tokens):
+            term = stem(token)
+            weighted[term] = max(weighted.get(term, 0), 1.0)
+            if prefix_last and position == len(tokens) - 1:
+                # The last word may still be being typed; expansions count for less.
+                for expansion in self.expand_prefix(token):
+                    weighted.setdefault(expansion, 0.5)
+        return weighted
+
+    def search(self, query, limit=1000, prefix_last=True, weighted_terms=None, with_total=False):
+        # with_total also returns how many documents matched before the limit.
+        weighted = weighted_terms if weighted_terms is not None else self.query_terms(query, prefix_last)
+        scores = {}
+        with self._lock:
+            count = len(self._documents)
+            if not count or not weighted:
+                return ([], 0) if with_total else []
+            average_length = self._total_length / float(count)
+            for term, weight in weighted.items():
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5)) * weight
+                for key, frequency in postings.items():
+                    length = self._documents[key][1]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[key] = scores.get(key, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            results = [(self._documents[key][0], score) for key, score in best]
+        return (results, len(scores)) if with_total else results
+
+    def build(self, collection, clock_margin=60):
+        started = datetime.utcnow()
+        index = SearchIndex(self.title_weight, self.k1, self.b, self.max_prefix_expansions)
+        for document in collection.find({}, {'id': 1, 'title': 1, 'description': 1}):
+            index.add(document)
+        with self._lock:
+            self._postings = index._postings
+            self._documents = index._documents
+            self._total_length = index._total_length
+            self._sorted_terms = None
+            self.dirty = True
+            self._reset_listeners()
+        # Writes published while the scan ran went to the old structures.
+        self._catch_up(collection, started - timedelta(seconds=clock_margin))
+
+    def _catch_up(self, collection, since):
+        changed = collection.find(
+            {'$or': [{'createdAt': {'$gt': since}}, {'updatedAt': {'$gt': since}}]},
+            {'id': 1, 'title': 1, 'description': 1}
+        )
+        for document in changed:
+            self.add(document)
+
+    def save(self, path):
+        with self._lock:
+            state = {
+                'format': SNAPSHOT_FORMAT,
+                'version': SNAPSHOT_VERSION,
+                'savedAt': datetime.utcnow().isoformat(),
+                'postings': self._postings,
+                'documents': self._documents,
+                'totalLength': self._total_length
+            }
+            data = json.dumps(state, separators=(',', ':')).encode()
+            self.dirty = False
+        temporary = '%s.%d.tmp' % (path, os.getpid())
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+
+    def load(self, path, collection, clock_margin=60):
+        with open(path, 'rb') as f:
+            state = json.load(f)
+        if not isinstance(state, dict) or state.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError('Not a search index snapshot')
+        if state.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unsupported search snapshot version %r' % state.get('version'))
+        postings = state['postings']
+        if not isinstance(postings, dict) or not isinstance(state['documents'], dict):
+            raise ValueError('Malformed search snapshot')
+        documents = {
+            key: (product_id, int(length), tuple(terms))
+            for key, (product_id, length, terms) in state['documents'].items()
+        }
+        saved_at = datetime.fromisoformat(state['savedAt'])
+        with self._lock:
+            self._postings = postings
+            self._documents = documents
+            self._total_length = int(state['totalLength'])
+            self._sorted_terms = None
+            self._reset_listeners()
+
+        # Catch up on writes since the snapshot, then drop deleted products.
+        self._catch_up(collection, saved_at - timedelta(seconds=clock_margin))
+        live = set(str(document['_id']) for document in collection.find({}, {'_id': 1}))
+        with self._lock:
+            for key in [key for key in self._documents if key not in live]:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'ready': self.ready,
+                'documents': len(self._documents),
+                'terms': len(self._postings),
+                'postings': sum(len(postings) for postings in self._postings.values())
+            }
+
+
+def start_search_index(index, collection, path, snapshot_interval, retry_interval=5):
+    def run():
+        while not index.ready:
+            try:
+                if path and os.path.exists(path):
+                    try:
+                        index.load(path, collection)
+                    except (OSError, ValueError, KeyError, TypeError) as e:
+                        logger.warning('Search snapshot unusable, rebuilding: %s', e)
+                        index.build(collection)
+                else:
+                    index.build(collection)
+                index.ready = True
+                logger.info('Search index ready with %d products', len(index))
+            except Exception as e:
+                logger.warning('Search index build failed, retrying: %s', e)
+                time.sleep(retry_interval)
+
+        while path and snapshot_interval > 0:
+            if index.dirty:
+                try:
+                    index.save(path)
+                except OSError as e:
+                    logger.warning('Search snapshot failed: %s', e)
+            time.sleep(snapshot_interval)
+
+    thread = threading.Thread(target=run, name='search-index', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,240 @@
+import argparse
+import hashlib
+import math
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import BulkWriteError, OperationFailure
+from werkzeug.security import generate_password_hash
+
+from indexes import ensure_indexes
+
+ADJECTIVES = [
+    'wireless', 'ergonomic', 'portable', 'compact', 'premium', 'vintage', 'smart', 'durable',
+    'lightweight', 'waterproof', 'modular', 'rechargeable', 'adjustable', 'foldable', 'classic',
+    'professional', 'silent', 'mechanical', 'organic', 'handmade', 'stainless', 'bamboo', 'leather'
+]
+NOUNS = [
+    'keyboard', 'mouse', 'monitor', 'laptop', 'stand', 'cable', 'adapter', 'speaker', 'headphones',
+    'charger', 'camera', 'lens', 'tripod', 'desk', 'lamp', 'chair', 'backpack', 'bottle', 'mug',
+    'notebook', 'pen', 'watch', 'router', 'drive', 'microphone', 'webcam', 'tablet', 'case', 'dock'
+]
+FILLER = [
+    'designed', 'for', 'everyday', 'use', 'with', 'a', 'sleek', 'finish', 'and', 'long', 'lasting',
+    'battery', 'built', 'from', 'recycled', 'materials', 'that', 'fits', 'any', 'workspace', 'easy',
+    'to', 'clean', 'includes', 'warranty', 'support', 'fast', 'shipping', 'quality', 'tested', 'the'
+]
+FIRST_NAMES = ['Ava', 'Liam', 'Maya', 'Noah', 'Zoe', 'Ethan', 'Aria', 'Lucas', 'Isla', 'Omar', 'Priya', 'Chen']
+LAST_NAMES = ['Smith', 'Patel', 'Garcia', 'Nguyen', 'Kim', 'Brown', 'Singh', 'Lopez', 'Martin', 'Okafor']
+
+
+def parse_distribution(spec):
+    name, _, params = spec.partition(':')
+    values = [float(value) for value in params.split(':') if value]
+    expected = {'uniform': 2, 'lognormal': 2, 'normal': 2, 'pareto': 2, 'fixed': 1}
+    if name not in expected or len(values) != expected[name]:
+        raise argparse.ArgumentTypeError(
+            '%r must be one of uniform:LOW:HIGH, lognormal:MU:SIGMA, normal:MEAN:STDDEV, '
+            'pareto:ALPHA:SCALE or fixed:VALUE' % spec
+        )
+    return (name, values)
+
+
+def sample(rng, distribution, low=None, high=None):
+    name, values = distribution
+    if name == 'uniform':
+        value = rng.uniform(values[0], values[1])
+    elif name == 'lognormal':
+        value = rng.lognormvariate(values[0], values[1])
+    elif name == 'normal':
+        value = rng.gauss(values[0], values[1])
+    elif name == 'pareto':
+        value = rng.paretovariate(values[0]) * values[1]
+    else:
+        value = values[0]
+    if low is not None:
+        value = max(low, value)
+    if high is not None:
+        value = min(high, value)
+    return value
+
+
+def user_object_id(seed, index):
+    return ObjectId(hashlib.blake2b(b'%d:user:%d' % (seed, index), digest_size=12).digest())
+
+
+def product_object_id(seed, index):
+    return ObjectId(hashlib.blake2b(b'%d:product:%d' % (seed, index), digest_size=12).digest())
+
+
+def batch_rng(seed, kind, batch_index):
+    return random.Random('%d:%s:%d' % (seed, kind, batch_index))
+
+
+def created_at(rng, options):
+    span = (options['created_to'] - options['created_from']).total_seconds()
+    if options['created_skew'] > 0:
+        # Exponential skew towards created_to, so recent items dominate like a live catalog.
+        fraction = 1 - min(1.0, rng.expovariate(options['created_skew']))
+    else:
+        fraction = rng.random()
+    return options['created_from'] + timedelta(seconds=fraction * span)
+
+
+def generate_users(rng, seed, start, count, options):
+    users = []
+    for index in range(start, start + count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES)
+        user = {
+            '_id': user_object_id(seed, index),
+            'email': 'user%d@%s' % (index, options['email_domain']),
+            'password': options['password_hash'],
+            'createdAt': created_at(rng, options),
+            'isActive': True
+        }
+        if rng.random() < options['jwt_fraction']:
+            user['name'] = '%s %s' % (first, last)
+        else:
+            user['fullName'] = '%s %s' % (first, last)
+            user['phone'] = '%010d' % rng.randrange(10 ** 10)
+        users.append(user)
+    return users
+
+
+def generate_products(rng, seed, start, count, options):
+    products = []
+    for index in range(start, start + count):
+        title_words = int(round(sample(rng, options['title_words'], low=1, high=20)))
+        words = [rng.choice(ADJECTIVES) for _ in range(max(0, title_words - 1))] + [rng.choice(NOUNS)]
+        description_words = int(round(sample(rng, options['description_words'], low=1, high=2000)))
+        products.append({
+            '_id': product_object_id(seed, index),
+            'id': str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            'title': ' '.join(words).capitalize(),
+            'description': ' '.join(rng.choice(FILLER + NOUNS + ADJECTIVES) for _ in range(description_words)),
+            'price': round(sample(rng, options['price'], low=0.01), 2),
+            'image': 'https://via.placeholder.com/300x200',
+            'createdBy': str(user_object_id(seed, rng.randrange(options['creators']))),
+            'createdAt': created_at(rng, options)
+        })
+        products[-1]['updatedAt'] = products[-1]['createdAt']
+    return products
+
+
+def insert_batch(kind, batch_index, start, count, options):
+    rng = batch_rng(options['seed'], kind, batch_index)
+    if kind == 'users':
+        documents = generate_users(rng, options['seed'], start, count, options)
+    else:
+        documents = generate_products(rng, options['seed'], start, count, options)
+
+    client = MongoClient(options['mongo_uri'])
+    try:
+        collection = client[options['database']][kind]
+        try:
+            inserted = len(collection.insert_many(documents, ordered=False).inserted_ids)
+            duplicates = 0
+        except BulkWriteError as e:
+            inserted = e.details['nInserted']
+            duplicates = sum(1 for error in e.details['writeErrors'] if error['code'] == 11000)
+            if duplicates != len(e.details['writeErrors']):
+                raise
+    finally:
+        client.close()
+    return kind, inserted, duplicates
+
+
+def load(kind, total, options, pool):
+    batch_size = options['batch_size']
+    futures = []
+    for batch_index in range(int(math.ceil(total / float(batch_size)))):
+        start = batch_index * batch_size
+        futures.append(pool.submit(insert_batch, kind, batch_index, start, min(batch_size, total - start), options))
+    return futures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-load synthetic users and products for scale testing.')
+    parser.add_argument('--mongo-uri', default=os.getenv('MONGO_URI', 'mongodb://localhost:27017/'))
+    parser.add_argument('--database', default='registration_db')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=1, help='same seed, same documents')
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4)
+    parser.add_argument('--drop', action='store_true', help='drop users and products first')
+    parser.add_argument('--password', default='password123', help='password shared by all generated users')
+    parser.add_argument('--email-domain', default='seed.example.com')
+    parser.add_argument('--jwt-fraction', type=float, default=0.5,
+                        help='share of users shaped like /api/auth/register (the rest like /api/register)')
+    parser.add_argument('--creators', type=int, default=None,
+                        help='how many of the generated users appear as createdBy (default: all)')
+    parser.add_argument('--title-words', type=parse_distribution, default='normal:3:1')
+    parser.add_argument('--description-words', type=parse_distribution, default='lognormal:3.5:0.6')
+    parser.add_argument('--price', type=parse_distribution, default='lognormal:3.5:1.0')
+    parser.add_argument('--created-from', type=datetime.fromisoformat, default=datetime(2022, 1, 1))
+    parser.add_argument('--created-to', type=datetime.fromisoformat, default=None)
+    parser.add_argument('--created-skew', type=float, default=0.0,
+                        help='exponential rate skewing createdAt towards --created-to (0 = uniform)')
+    args = parser.parse_args(argv)
+
+    options = {
+        'mongo_uri': args.mongo_uri,
+        'database': args.database,
+        'seed': args.seed,
+        'batch_size': args.batch_size,
+        'email_domain': args.email_domain,
+        'jwt_fraction': args.jwt_fraction,
+        'creators': max(1, min(args.creators or args.users, args.users or 1)),
+        'title_words': args.title_words,
+        'description_words': args.description_words,
+        'price': args.price,
+        'created_from': args.created_from,
+        'created_to': args.created_to or datetime(2025, 1, 1),
+        'created_skew': args.created_skew,
+        # Hashing once keeps generation fast; every user shares the password.
+        'password_hash': generate_password_hash(args.password)
+    }
+
+    client = MongoClient(args.mongo_uri)
+    db = client[args.database]
+    if args.drop:
+        db['users'].drop()
+        db['products'].drop()
+    # The app's full index set, before loading: the unique indexes are what
+    # make a rerun skip documents that are already there.
+    try:
+        ensure_indexes(db)
+    except OperationFailure as e:
+        raise SystemExit('Could not create indexes (%s); rerun with --drop to start from an empty catalog' % e)
+    finally:
+        client.close()
+
+    started = time.perf_counter()
+    totals = {'users': [0, 0], 'products': [0, 0]}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = load('users', args.users, options, pool) + load('products', args.products, options, pool)
+        for done, future in enumerate(as_completed(futures), 1):
+            kind, inserted, duplicates = future.result()
+            totals[kind][0] += inserted
+            totals[kind][1] += duplicates
+            if done % 20 == 0 or done == len(futures):
+                elapsed = time.perf_counter() - started
+                count = totals['users'][0] + totals['products'][0]
+                print('%d/%d batches, %d documents, %.0f docs/s' % (done, len(futures), count, count / elapsed))
+
+    for kind, (inserted, duplicates) in totals.items():
+        print('%s: %d inserted, %d already present' % (kind, inserted, duplicates))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,226 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from ratelimit import key_hash
+
+HEADER = struct.Struct('<8sQIII4x')
+SLOT_HEADER = struct.Struct('<QQdQII')
+SEQUENCE = struct.Struct('<Q')
+GENERATION_OFFSET = 8
+MAGIC = b'SHCACHE1'
+READ_ATTEMPTS = 3
+
+
+class SharedCache:
+    # Byte payloads in fixed-size slots of an mmap'd file shared by every
+    # worker on the host. Writers take a striped thread + fcntl lock and
+    # bump the slot's sequence number to odd while writing; readers take no
+    # lock and retry if the sequence moved or was odd (a seqlock), with a
+    # crc32 as a final guard against torn payloads.
+    #
+    # The header generation is bumped by every invalidation. Fills carry the
+    # generation they started at and are dropped if it moved; with
+    # versioned=True entries from an older generation also read as misses,
+    # which invalidates a whole table (listing pages) in one write.
+    def __init__(self, path, slots=8192, slot_size=4096, stripe_size=8, ttl=60, versioned=False):
+        if fcntl is None:
+            raise RuntimeError('SharedCache requires fcntl')
+        self.path = path
+        self.slot_size = slot_size
+        self.payload_size = slot_size - SLOT_HEADER.size
+        self.stripe_size = stripe_size
+        self.stripes = max(1, slots // stripe_size)
+        self.slots = self.stripes * stripe_size
+        self.ttl = ttl
+        self.versioned = versioned
+        size = HEADER.size + self.slots * slot_size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER.size, 0)
+        try:
+            header = os.pread(self._fd, HEADER.size, 0)
+            layout = None
+            if os.fstat(self._fd).st_size == size:
+                magic, _, stored_slots, stored_slot_size, stored_stripe_size = HEADER.unpack(header)
+                layout = (magic, stored_slots, stored_slot_size, stored_stripe_size)
+            if layout != (MAGIC, self.slots, slot_size, stripe_size):
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, 0, self.slots, slot_size, stripe_size), 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER.size, 0)
+        self._map = mmap.mmap(self._fd, size)
+        self._header_lock = threading.Lock()
+        self._thread_locks = [threading.Lock() for _ in range(min(self.stripes, 256))]
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.retries = 0
+        self.writes = 0
+        self.oversize = 0
+        self.dropped_fills = 0
+
+    @property
+    def generation(self):
+        return SEQUENCE.unpack_from(self._map, GENERATION_OFFSET)[0]
+
+    def _offset(self, slot):
+        return HEADER.size + slot * self.slot_size
+
+    def _stripe(self, hashed):
+        stripe = hashed % self.stripes
+        return stripe, stripe * self.stripe_size
+
+    def _count(self, name):
+        with self._counter_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _read_slot(self, offset, hashed):
+        data = self._map
+        for _ in range(READ_ATTEMPTS):
+            sequence, stored_hash, expires_at, generation, length, checksum = SLOT_HEADER.unpack_from(data, offset)
+            if stored_hash != hashed:
+                return None
+            if sequence & 1 or length > self.payload_size:
+                self._count('retries')
+                continue
+            start = offset + SLOT_HEADER.size
+            payload = data[start:start + length]
+            if SEQUENCE.unpack_from(data, offset)[0] == sequence and zlib.crc32(payload) == checksum:
+                return expires_at, generation, payload
+            self._count('retries')
+        return None
+
+    def get(self, key):
+        hashed = key_hash(key)
+        _, base = self._stripe(hashed)
+        for slot in range(base, base + self.stripe_size):
+            entry = self._read_slot(self._offset(slot), hashed)
+            if entry is None:
+                continue
+            expires_at, generation, payload = entry
+            if expires_at <= time.time() or (self.versioned and generation != self.generation):
+                self._count('stale')
+                break
+            self._count('hits')
+            return payload
+        self._count('misses')
+        return None
+
+    def _lock_stripe(self, base):
+        offset = self._offset(base)
+        length = self.stripe_size * self.slot_size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset)
+        return length, offset
+
+    def _write_slot(self, offset, hashed, expires_at, generation, payload):
+        sequence = SEQUENCE.unpack_from(self._map, offset)[0]
+        SEQUENCE.pack_into(self._map, offset, sequence + 1)
+        self._map[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + len(payload)] = payload
+        SLOT_HEADER.pack_into(
+            self._map, offset, sequence + 1, hashed, expires_at, generation, len(payload), zlib.crc32(payload)
+        )
+        SEQUENCE.pack_into(self._map, offset, sequence + 2)
+
+    def put(self, key, payload, generation, ttl=None):
+        if len(payload) > self.payload_size:
+            self._count('oversize')
+            return False
+        hashed = key_hash(key)
+        stripe, base = self._stripe(hashed)
+        now = time.time()
+        with self._thread_locks[stripe % len(self._thread_locks)]:
+            length, offset = self._lock_stripe(base)
+            try:
+                if generation != self.generation:
+                    self._count('dropped_fills')
+                    return False
+                target = None
+                oldest = None
+                for slot in range(base, base + self.stripe_size):
+                    _, stored_hash, expires_at, _, _, _ = SLOT_HEADER.unpack_from(self._map, self._offset(slot))
+                    if stored_hash == hashed:
+                        target = slot
+                        break
+                    if target is None and (stored_hash == 0 or expires_at <= now):
+                        target = slot
+                    if oldest is None or expires_at < oldest[1]:
+                        oldest = (slot, expires_at)
+                if target is None:
+                    # Stripe is full of live entries: replace the one closest to expiry.
+                    target = oldest[0]
+                self._write_slot(self._offset(target), hashed, now + (self.ttl if ttl is None else ttl), generation, payload)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+        self._count('writes')
+        return True
+
+    def invalidate(self, key=None):
+        with self._header_lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER.size, 0)
+            try:
+                SEQUENCE.pack_into(self._map, GENERATION_OFFSET, self.generation + 1)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER.size, 0)
+        if key is None:
+            return
+        hashed = key_hash(key)
+        stripe, base = self._stripe(hashed)
+        with self._thread_locks[stripe % len(self._thread_locks)]:
+            length, offset = self._lock_stripe(base)
+            try:
+                for slot in range(base, base + self.stripe_size):
+                    if SLOT_HEADER.unpack_from(self._map, self._offset(slot))[1] == hashed:
+                        self._write_slot(self._offset(slot), 0, 0.0, 0, b'')
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+    def clear(self):
+        # For invalidations that cannot name their key. Bumping the
+        # generation first drops fills that started before the clear.
+        self.invalidate()
+        for stripe in range(self.stripes):
+            base = stripe * self.stripe_size
+            with self._thread_locks[stripe % len(self._thread_locks)]:
+                length, offset = self._lock_stripe(base)
+                try:
+                    for slot in range(base, base + self.stripe_size):
+                        if SLOT_HEADER.unpack_from(self._map, self._offset(slot))[1]:
+                            self._write_slot(self._offset(slot), 0, 0.0, 0, b'')
+                finally:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+
+    def stats(self):
+        now = time.time()
+        generation = self.generation
+        live = 0
+        for slot in range(self.slots):
+            _, stored_hash, expires_at, entry_generation, _, _ = SLOT_HEADER.unpack_from(self._map, self._offset(slot))
+            if stored_hash and expires_at > now and (not self.versioned or entry_generation == generation):
+                live += 1
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return {
+                'path': self.path,
+                'slots': self.slots,
+                'slotBytes': self.slot_size,
+                'liveEntries': live,
+                'generation': generation,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hitRatio': round(self.hits / float(lookups), 4) if lookups else None,
+                'stale': self.stale,
+                'readRetries': self.retries,
+                'writes': self.writes,
+                'oversize': self.oversize,
+                'droppedFills': self.dropped_fills
+            }
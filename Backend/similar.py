@@ -0,0 +1,279 @@
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+from scipy import sparse
+
+from search_index import analyze
+
+logger = logging.getLogger('similar')
+
+
+class SimilarityIndex:
+    # Products as rows of a sparse matrix of log term frequencies. IDF is
+    # kept separately, from document frequencies that every write patches,
+    # so similarity to one product is a single sparse matrix-vector product
+    # scaled by precomputed row norms. Writes analyse only the product that
+    # changed; the refresh thread appends its new row and tombstones the old
+    # one, so results lag writes by at most one interval. Tombstoned rows are
+    # dropped once they make up compact_ratio of the matrix.
+    def __init__(self, title_weight=2, compact_ratio=0.25):
+        self.title_weight = title_weight
+        self.compact_ratio = compact_ratio
+        self.ready = False
+        self.dirty = False
+        self.refreshes = 0
+        self.compactions = 0
+        self._lock = threading.RLock()
+        self._products = {}
+        self._keys_by_id = {}
+        self._vocabulary = {}
+        self._document_frequency = np.zeros(1024, dtype=np.int32)
+        self._matrix = None
+        self._live = np.zeros(0, dtype=bool)
+        self._row_keys = []
+        self._rows = {}
+        self._idf = np.zeros(0, dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._built_at = None
+        # key -> (columns, weights), or None for a delete, not yet in the
+        # matrix. _applying holds the batch a refresh is working on.
+        self._pending = {}
+        self._applying = {}
+
+    def __len__(self):
+        return len(self._products)
+
+    def document_terms(self, document):
+        counts = Counter(analyze(document.get('title') or ''))
+        for term in counts:
+            counts[term] *= self.title_weight
+        counts.update(analyze(document.get('description') or ''))
+        return counts
+
+    def _row(self, counts):
+        vocabulary = self._vocabulary
+        columns = np.fromiter((vocabulary.setdefault(term, len(vocabulary)) for term in counts), dtype=np.int32, count=len(counts))
+        weights = np.log1p(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        return columns, weights
+
+    def _current_columns(self, key):
+        for batch in (self._pending, self._applying):
+            if key in batch:
+                return batch[key][0] if batch[key] is not None else None
+        row = self._rows.get(key)
+        if row is None:
+            return None
+        matrix = self._matrix
+        return matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+
+    def _set(self, key, entry):
+        # Document frequencies always describe the latest version of each
+        # product, whether or not it has reached the matrix yet.
+        old = self._current_columns(key)
+        if old is not None:
+            self._document_frequency[old] -= 1
+        if entry is not None:
+            if len(self._vocabulary) > len(self._document_frequency):
+                grown = np.zeros(max(len(self._vocabulary), 2 * len(self._document_frequency)), dtype=np.int32)
+                grown[:len(self._document_frequency)] = self._document_frequency
+                self._document_frequency = grown
+            self._document_frequency[entry[0]] += 1
+        self._pending[key] = entry
+        self.dirty = True
+
+    def add(self, document):
+        key = str(document['_id'])
+        summary = (document.get('id'), document.get('title'), document.get('price'))
+        counts = self.document_terms(document)
+        with self._lock:
+            self._forget(key)
+            self._products[key] = summary
+            if summary[0] is not None:
+                self._keys_by_id[summary[0]] = key
+            self._set(key, self._row(counts))
+
+    def remove(self, key):
+        key = str(key)
+        with self._lock:
+            self._forget(key)
+            self._set(key, None)
+
+    def _forget(self, key):
+        summary = self._products.pop(key, None)
+        if summary is not None and self._keys_by_id.get(summary[0]) == key:
+            del self._keys_by_id[summary[0]]
+
+    def apply(self, operation, document):
+        if operation == 'delete':
+            self.remove(document['_id'])
+        else:
+            self.add(document)
+
+    def vectorize(self):
+        with self._lock:
+            batch = self._applying = self._pending
+            self._pending = {}
+            self.dirty = False
+            matrix = self._matrix
+            live = self._live.copy()
+            row_keys = list(self._row_keys)
+            stale_rows = [self._rows[key] for key in batch if key in self._rows]
+            terms = len(self._vocabulary)
+            document_frequency = self._document_frequency[:terms].astype(np.float32)
+            products = len(self._products)
+
+        added = [(key, entry) for key, entry in batch.items() if entry is not None]
+        indptr = np.zeros(len(added) + 1, dtype=np.int32)
+        np.cumsum(np.fromiter((len(entry[0]) for _, entry in added), dtype=np.int32, count=len(added)), out=indptr[1:])
+        new_rows = sparse.csr_matrix((
+            np.concatenate([entry[1] for _, entry in added] or [np.zeros(0, dtype=np.float32)]),
+            np.concatenate([entry[0] for _, entry in added] or [np.zeros(0, dtype=np.int32)]),
+            indptr
+        ), shape=(len(added), terms))
+
+        live[stale_rows] = False
+        if matrix is None:
+            matrix = new_rows
+        else:
+            matrix = sparse.vstack([sparse.csr_matrix(
+                (matrix.data, matrix.indices, matrix.indptr), shape=(matrix.shape[0], terms)
+            ), new_rows], format='csr')
+        live = np.concatenate([live, np.ones(len(added), dtype=bool)])
+        row_keys.extend(key for key, _ in added)
+
+        compacted = live.size and (live.size - np.count_nonzero(live)) > self.compact_ratio * live.size
+        if compacted:
+            keep = np.flatnonzero(live)
+            matrix = matrix[keep]
+            row_keys = [row_keys[row] for row in keep]
+            live = np.ones(len(row_keys), dtype=bool)
+
+        idf = (np.log((1.0 + products) / (1.0 + document_frequency)) + 1.0).astype(np.float32)
+        norms = np.sqrt(matrix.multiply(matrix).dot(idf * idf)).astype(np.float32)
+        norms[norms == 0] = 1.0
+
+        with self._lock:
+            if compacted:
+                self._rows = {key: row for row, key in enumerate(row_keys)}
+                self.compactions += 1
+            else:
+                for key in batch:
+                    self._rows.pop(key, None)
+                first = len(row_keys) - len(added)
+                for offset, (key, _) in enumerate(added):
+                    self._rows[key] = first + offset
+            self._matrix = matrix
+            self._live = live
+            self._row_keys = row_keys
+            self._idf = idf
+            self._norms = norms
+            self._applying = {}
+            self._built_at = time.time()
+            self.refreshes += 1
+
+    def similar(self, product_id, limit=10):
+        with self._lock:
+            key = self._keys_by_id.get(product_id)
+            if key is None:
+                return None
+            matrix = self._matrix
+            if matrix is None or not matrix.shape[0]:
+                return []
+            row = self._rows.get(key)
+            entry = self._pending.get(key) or self._applying.get(key)
+            if entry is None and row is None:
+                return []
+            if entry is not None:
+                columns, weights = entry
+            else:
+                columns = matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+                weights = matrix.data[matrix.indptr[row]:matrix.indptr[row + 1]]
+            live = self._live
+            idf = self._idf
+            norms = self._norms
+            row_keys = self._row_keys
+            products = self._products
+            stale = len(self._pending) + len(self._applying)
+
+        # Terms first seen since the last refresh have no IDF yet and are ignored.
+        known = columns < len(idf)
+        columns = columns[known]
+        weighted = weights[known] * idf[columns]
+        query = np.zeros(len(idf), dtype=np.float32)
+        query[columns] = weighted * idf[columns] / (np.sqrt(np.dot(weighted, weighted)) or 1.0)
+        scores = matrix.dot(query) / norms
+        scores[~live] = -1.0
+        if row is not None:
+            scores[row] = -1.0
+        # Over-select by the number of rows that may be stale.
+        count = min(limit + 1 + stale, len(scores))
+        top = np.argpartition(-scores, count - 1)[:count]
+        top = top[np.argsort(-scores[top], kind='stable')]
+
+        results = []
+        for row_index in top:
+            score = float(scores[row_index])
+            if score <= 0 or len(results) == limit:
+                break
+            # Rows for products deleted since the last refresh are skipped.
+            summary = products.get(row_keys[row_index])
+            if summary is None or row_keys[row_index] == key:
+                continue
+            product_id, title, price = summary
+            results.append({'id': product_id, 'title': title, 'price': price, 'score': round(score, 4)})
+        return results
+
+    def build(self, collection, clock_margin=60):
+        started = datetime.utcnow()
+        projection = {'id': 1, 'title': 1, 'description': 1, 'price': 1}
+        for document in collection.find({}, projection):
+            self.add(document)
+        since = started - timedelta(seconds=clock_margin)
+        for document in collection.find({'$or': [{'createdAt': {'$gt': since}}, {'updatedAt': {'$gt': since}}]}, projection):
+            self.add(document)
+        self.vectorize()
+
+    def stats(self):
+        with self._lock:
+            matrix = self._matrix
+            return {
+                'ready': self.ready,
+                'products': len(self._products),
+                'rows': matrix.shape[0] if matrix is not None else 0,
+                'liveRows': int(np.count_nonzero(self._live)),
+                'terms': len(self._vocabulary),
+                'nonZeros': int(matrix.nnz) if matrix is not None else 0,
+                'pending': len(self._pending),
+                'dirty': self.dirty,
+                'refreshes': self.refreshes,
+                'compactions': self.compactions,
+                'ageSeconds': round(time.time() - self._built_at, 1) if self._built_at else None
+            }
+
+
+def start_similarity_index(index, collection, refresh_interval, retry_interval=5):
+    def run():
+        while not index.ready:
+            try:
+                index.build(collection)
+                index.ready = True
+                logger.info('Similarity index ready with %d products', len(index))
+            except Exception as e:
+                logger.warning('Similarity index build failed, retrying: %s', e)
+                time.sleep(retry_interval)
+
+        while True:
+            time.sleep(refresh_interval)
+            if index.dirty:
+                try:
+                    index.vectorize()
+                except Exception as e:
+                    logger.warning('Similarity refresh failed: %s', e)
+
+    thread = threading.Thread(target=run, name='similarity-index', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,113 @@
+import importlib
+import itertools
+import threading
+import time
+from datetime import timedelta
+from functools import wraps
+
+from pymongo import monitoring
+
+# Collection methods and the server command each would send.
+COMMANDS = {
+    'find': 'find',
+    'find_one': 'find',
+    'aggregate': 'aggregate',
+    'count_documents': 'aggregate',
+    'estimated_document_count': 'count',
+    'distinct': 'distinct',
+    'insert_one': 'insert',
+    'insert_many': 'insert',
+    'update_one': 'update',
+    'update_many': 'update',
+    'replace_one': 'update',
+    'bulk_write': 'update',
+    'delete_one': 'delete',
+    'delete_many': 'delete',
+    'find_one_and_update': 'findAndModify',
+    'find_one_and_replace': 'findAndModify',
+    'find_one_and_delete': 'findAndModify',
+    'create_index': 'createIndexes'
+}
+COMMAND_ARGUMENTS = {'find': 'filter', 'aggregate': 'pipeline', 'findAndModify': 'query', 'distinct': 'key'}
+
+_request_ids = itertools.count(1)
+_local = threading.local()
+
+
+def _monitored(method, command_name):
+    # Publishes one started/succeeded (or failed) pair per outermost call;
+    # mongomock's own nested calls (find_one -> find) are not counted again.
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        # vars(): mongomock turns unknown attributes into databases, and plain
+        # mongomock clients (without listeners) share the patched class.
+        listeners = vars(self.database.client).get('_command_listeners')
+        if not listeners or getattr(_local, 'active', False):
+            return method(self, *args, **kwargs)
+
+        command = {command_name: self.name}
+        argument = COMMAND_ARGUMENTS.get(command_name)
+        if argument and args and isinstance(args[0], (dict, list, str)):
+            command[argument] = args[0]
+        request_id = next(_request_ids)
+        address = ('stand-in', 27017)
+        database = self.database.name
+        for listener in listeners:
+            listener.started(monitoring.CommandStartedEvent(command, database, request_id, address, request_id))
+
+        _local.active = True
+        started = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        except Exception as e:
+            duration = timedelta(seconds=time.perf_counter() - started)
+            for listener in listeners:
+                listener.failed(monitoring.CommandFailedEvent(
+                    duration, {'ok': 0, 'errmsg': str(e)}, command_name, request_id, address, request_id,
+                    database_name=database
+                ))
+            raise
+        finally:
+            _local.active = False
+
+        duration = timedelta(seconds=time.perf_counter() - started)
+        for listener in listeners:
+            listener.succeeded(monitoring.CommandSucceededEvent(
+                duration, {'ok': 1}, command_name, request_id, address, request_id, database_name=database
+            ))
+        return result
+
+    return wrapper
+
+
+def monitored_client(mongomock):
+    # mongomock sends no commands, so nothing reaches pymongo's command
+    # listeners. This client publishes an event per collection call, which
+    # keeps roundtrip counting and budgets working against the stand-in.
+    collection_class = mongomock.collection.Collection
+    if not getattr(collection_class, '_monitored', False):
+        for name, command_name in COMMANDS.items():
+            setattr(collection_class, name, _monitored(getattr(collection_class, name), command_name))
+        collection_class._monitored = True
+
+    class MonitoredMongoClient(mongomock.MongoClient):
+        def __init__(self, *args, event_listeners=(), **kwargs):
+            super().__init__(*args, **kwargs)
+            self._command_listeners = [
+                listener for listener in event_listeners if isinstance(listener, monitoring.CommandListener)
+            ]
+
+    return MonitoredMongoClient
+
+
+def load_app(stand_in=False):
+    # The stand-in swaps pymongo's client for mongomock before app.py connects,
+    # so tooling can exercise the handlers without a running mongod.
+    if stand_in:
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit('The in-process stand-in requires mongomock (pip install mongomock)')
+        import pymongo
+        pymongo.MongoClient = monitored_client(mongomock)
+    return importlib.import_module('app')
@@ -0,0 +1,141 @@
+import bisect
+import heapq
+import logging
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from search_index import TOKEN_PATTERN
+
+logger = logging.getLogger('suggest')
+
+
+def normalize_words(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class TitleSuggester:
+    # Sorted array of title suffixes ("wireless usb keyboard", "usb keyboard",
+    # "keyboard") so a prefix query is a binary search plus a short scan.
+    def __init__(self, max_words=8, max_scan=500):
+        self.max_words = max_words
+        self.max_scan = max_scan
+        self.ready = False
+        self._lock = threading.RLock()
+        self._entries = []
+        self._products = {}
+
+    def __len__(self):
+        return len(self._products)
+
+    def _keys(self, title):
+        words = normalize_words(title)
+        return [' '.join(words[start:]) for start in range(min(len(words), self.max_words))]
+
+    def add(self, document):
+        key = str(document['_id'])
+        title = document.get('title') or ''
+        created_at = document.get('createdAt')
+        recency = created_at.timestamp() if isinstance(created_at, datetime) else 0.0
+        with self._lock:
+            self._remove(key)
+            self._products[key] = (document.get('id'), title, recency)
+            for position, suffix in enumerate(self._keys(title)):
+                bisect.insort(self._entries, (suffix, position, key))
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(str(key))
+
+    def _remove(self, key):
+        product = self._products.pop(key, None)
+        if product is None:
+            return
+        for position, suffix in enumerate(self._keys(product[1])):
+            entry = (suffix, position, key)
+            index = bisect.bisect_left(self._entries, entry)
+            if index < len(self._entries) and self._entries[index] == entry:
+                del self._entries[index]
+
+    def apply(self, operation, document):
+        if operation == 'delete':
+            self.remove(document['_id'])
+        else:
+            self.add(document)
+
+    def suggest(self, query, limit=10):
+        prefix = ' '.join(normalize_words(query))
+        if not prefix:
+            return []
+        best = {}
+        with self._lock:
+            entries = self._entries
+            start = bisect.bisect_left(entries, (prefix,))
+            for suffix, position, key in entries[start:start + self.max_scan]:
+                if not suffix.startswith(prefix):
+                    break
+                product_id, title, recency = self._products[key]
+                # Matches at the start of the title outrank mid-title ones, then newer first.
+                rank = (position == 0, -position, recency)
+                if key not in best or rank > best[key][0]:
+                    best[key] = (rank, product_id, title)
+        top = heapq.nlargest(limit, best.values(), key=lambda item: item[0])
+        return [{'id': product_id, 'title': title} for _, product_id, title in top]
+
+    def build(self, collection, clock_margin=60):
+        started = datetime.utcnow()
+        products = {}
+        entries = []
+        for document in collection.find({}, {'id': 1, 'title': 1, 'createdAt': 1}):
+            key = str(document['_id'])
+            title = document.get('title') or ''
+            created_at = document.get('createdAt')
+            products[key] = (document.get('id'), title, created_at.timestamp() if isinstance(created_at, datetime) else 0.0)
+            entries.extend((suffix, position, key) for position, suffix in enumerate(self._keys(title)))
+        entries.sort()
+        with self._lock:
+            self._entries = entries
+            self._products = products
+        since = started - timedelta(seconds=clock_margin)
+        for document in collection.find(
+            {'$or': [{'createdAt': {'$gt': since}}, {'updatedAt': {'$gt': since}}]},
+            {'id': 1, 'title': 1, 'createdAt': 1}
+        ):
+            self.add(document)
+
+    def memory_bytes(self):
+        with self._lock:
+            total = sys.getsizeof(self._entries) + sys.getsizeof(self._products)
+            for entry in self._entries:
+                total += sys.getsizeof(entry) + sys.getsizeof(entry[0])
+            for key, product in self._products.items():
+                total += sys.getsizeof(key) + sys.getsizeof(product) + sum(sys.getsizeof(value) for value in product)
+        return total
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            products = len(self._products)
+        return {
+            'ready': self.ready,
+            'products': products,
+            'entries': entries,
+            'memoryBytes': self.memory_bytes()
+        }
+
+
+def start_suggester(suggester, collection, retry_interval=5):
+    def run():
+        while not suggester.ready:
+            try:
+                suggester.build(collection)
+                suggester.ready = True
+                logger.info('Title suggester ready with %d products', len(suggester))
+            except Exception as e:
+                logger.warning('Title suggester build failed, retrying: %s', e)
+                time.sleep(retry_interval)
+
+    thread = threading.Thread(target=run, name='title-suggester', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,77 @@
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+from email_filter import EmailFilter
+
+
+@pytest.fixture
+def users():
+    return mongomock.MongoClient().db.users
+
+
+@pytest.fixture
+def email_filter():
+    return EmailFilter(os.path.join(tempfile.mkdtemp(), 'email_filter.bloom'), capacity=1000)
+
+
+def register(users, email, created_at=None):
+    users.insert_one({'email': email, 'createdAt': created_at or datetime.utcnow()})
+
+
+def test_warm_start_reuses_the_file(users, email_filter):
+    register(users, 'first@example.com')
+    email_filter.load(users)
+    restarted = EmailFilter(email_filter.path, capacity=1000)
+    restarted.load(users)
+
+    assert restarted.rebuilds == 0
+    assert restarted.might_contain('first@example.com')
+    assert not restarted.might_contain('nobody@example.com')
+
+
+def test_transient_gap_does_not_rescan(users, email_filter):
+    register(users, 'first@example.com')
+    email_filter.load(users)
+    rebuilds = email_filter.rebuilds
+    # Old-dated, so the createdAt catch-up cannot see it.
+    register(users, 'imported@example.com', datetime.utcnow() - timedelta(days=1))
+
+    email_filter.refresh(users)
+    assert email_filter.rebuilds == rebuilds
+    assert not email_filter.trusted()
+
+    email_filter.refresh(users)
+    assert email_filter.rebuilds == rebuilds + 1
+    assert email_filter.trusted()
+    assert email_filter.might_contain('imported@example.com')
+
+
+def test_registrations_are_not_blocked_by_a_rescan(users, email_filter):
+    for number in range(20):
+        register(users, 'user-%d@example.com' % number)
+    email_filter.load(users)
+
+    class SlowUsers:
+        def find(self, *args, **kwargs):
+            for user in users.find(*args, **kwargs):
+                time.sleep(0.05)
+                yield user
+
+    scan = threading.Thread(target=email_filter._rebuild, args=(SlowUsers(),))
+    scan.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    email_filter.add('during@example.com', datetime.utcnow())
+    blocked_for = time.monotonic() - started
+    scan.join()
+
+    assert blocked_for < 0.5
+    assert email_filter.might_contain('during@example.com')
+    assert email_filter.stats()['emails'] == 21
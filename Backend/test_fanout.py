@@ -0,0 +1,23 @@
+import threading
+
+from fanout import FanOut
+
+
+def test_try_submit_declines_when_every_worker_is_busy():
+    fanout = FanOut(max_workers=2)
+    release = threading.Event()
+    busy = [fanout.try_submit(release.wait) for _ in range(2)]
+
+    assert fanout.try_submit(lambda: 1) is None
+    assert fanout.stats()['declined'] == 1
+
+    release.set()
+    for future in busy:
+        future.result()
+    assert fanout.try_submit(lambda: 1).result() == 1
+
+
+def test_gather_returns_results_in_order():
+    fanout = FanOut(max_workers=2)
+
+    assert fanout.gather(lambda: 1, lambda: 2, lambda: 3) == [1, 2, 3]
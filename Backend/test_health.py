@@ -0,0 +1,63 @@
+import time
+
+from health import HealthProber, PoolMonitor
+
+
+class FakeDatabase:
+    def command(self, name):
+        return {'ok': 1}
+
+
+def prober(build_index):
+    return HealthProber(FakeDatabase(), PoolMonitor(), 10, ['users.email', 'products.id'], build_index,
+                        interval=1, required=['users.email'], retry_max=60)
+
+
+def run_builds(health_prober):
+    health_prober.probe()
+    health_prober._index_thread.join()
+    return health_prober.probe()
+
+
+def test_failed_optional_index_does_not_block_readiness():
+    def build_index(name):
+        if name == 'products.id':
+            raise RuntimeError('duplicate key')
+
+    health_prober = prober(build_index)
+    status = run_builds(health_prober)
+
+    assert health_prober.index_ready('users.email')
+    assert health_prober.index_state == 'failed'
+    assert status['ready']
+    assert status['indexErrors'] == {'products.id': 'duplicate key'}
+
+
+def test_failed_required_index_blocks_readiness():
+    def build_index(name):
+        if name == 'users.email':
+            raise RuntimeError('duplicate key')
+
+    health_prober = prober(build_index)
+    status = run_builds(health_prober)
+
+    assert not health_prober.index_ready('users.email')
+    assert status['reasons'] == ['index users.email failed']
+
+
+def test_failed_builds_back_off():
+    attempts = []
+
+    def build_index(name):
+        attempts.append(name)
+        if name == 'products.id':
+            raise RuntimeError('duplicate key')
+
+    health_prober = prober(build_index)
+    run_builds(health_prober)
+    for _ in range(5):
+        health_prober.probe()
+        time.sleep(0.005)
+
+    assert attempts == ['users.email', 'products.id']
+    assert health_prober.indexes['products.id']['retryAt'] > time.monotonic()
@@ -0,0 +1,37 @@
+import random
+import threading
+from collections import Counter
+
+from loadtest import LoginStorm, run_open_loop
+
+
+class RecordingTarget:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = Counter()
+
+    def request(self, method, path, body=None, headers=None):
+        with self._lock:
+            self.requests[(method, path, tuple(sorted((body or {}).items())))] += 1
+        return 200, b'{}'
+
+
+def run(seed):
+    target = RecordingTarget()
+    scenario = LoginStorm(target, random.Random(seed))
+    scenario.users = [{'email': 'user-%d@example.com' % number, 'password': 'secret'} for number in range(5)]
+    recorder, _ = run_open_loop(scenario, rate=2000, duration=0.1, workers=8, seed=seed, poisson=False)
+    return target.requests, recorder
+
+
+def test_same_seed_sends_the_same_requests():
+    first, recorder = run(11)
+    second, _ = run(11)
+
+    assert sum(first.values()) == 200
+    assert first == second
+    assert sum(histogram.total for histogram in recorder.histograms.values()) == 200
+
+
+def test_different_seeds_send_different_requests():
+    assert run(11)[0] != run(12)[0]
@@ -0,0 +1,92 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from mirror import CatalogMirror
+
+QUERIES = [
+    '',
+    'page=2&limit=7',
+    'sort=price&limit=20',
+    'sort=-price&page=3&limit=5',
+    'sort=title&page=2&limit=9',
+    'sort=-title',
+    'sort=createdAt&page=4&limit=6',
+    'minPrice=50&maxPrice=250&sort=price',
+    'maxPrice=25&sort=-createdAt&limit=50',
+    'createdBy=creator-3&sort=-price',
+    'createdBy=creator-1&minPrice=100&page=2&limit=3',
+    'createdFrom=2024-03-01T00:00:00&createdTo=2024-03-20T00:00:00&sort=title',
+    'createdFrom=2024-03-10T00:00:00%2B02:00&sort=createdAt&page=2&limit=4',
+    'createdBy=nobody'
+]
+
+
+@pytest.fixture
+def catalog(app_module):
+    collection = app_module.products_collection
+    collection.delete_many({})
+    rng = random.Random(3)
+    started = datetime(2024, 3, 1)
+    prices = rng.sample(range(1, 1500), 120)
+    collection.insert_many([{
+        'id': 'mirror-%d' % number,
+        'title': 'Product %03d %s' % (rng.randrange(1000), number),
+        'description': 'Mirrored product',
+        'price': float(prices[number]),
+        'createdBy': 'creator-%d' % (number % 6),
+        'createdAt': started + timedelta(hours=number * 7),
+        'updatedAt': started + timedelta(hours=number * 7)
+    } for number in range(120)])
+    mirror = CatalogMirror(app_module.PRICE_FACET_BOUNDARIES)
+    mirror.load(collection)
+    mirror.ready = True
+    yield mirror
+    collection.delete_many({})
+
+
+def listing(app_module, client, auth, query, mirror=None):
+    app_module.CATALOG_MIRROR = mirror is not None
+    app_module.catalog_mirror, original = mirror or app_module.catalog_mirror, app_module.catalog_mirror
+    try:
+        response = client.get('/api/products?' + query, headers=auth)
+    finally:
+        app_module.CATALOG_MIRROR = False
+        app_module.catalog_mirror = original
+    assert response.status_code == 200
+    # Only the auth lookup reaches Mongo when the mirror serves the page.
+    assert response.headers['X-DB-Roundtrips'] == ('1' if mirror is not None else '2')
+    body = response.get_json()
+    facets = body.pop('facets', None)
+    if facets is not None:
+        facets['creators'] = sorted(facets.get('creators', []), key=lambda creator: creator['createdBy'])
+    return body, facets
+
+
+@pytest.mark.parametrize('query', QUERIES)
+def test_mirror_listing_matches_mongo(app_module, client, auth, catalog, query):
+    expected = listing(app_module, client, auth, query)
+    actual = listing(app_module, client, auth, query, mirror=catalog)
+
+    assert actual == expected
+
+
+def test_reconcile_repairs_missed_updates(app_module, catalog):
+    collection = app_module.products_collection
+    # An update the poll never saw, e.g. stamped by a writer whose clock lags.
+    collection.update_one({'id': 'mirror-5'}, {'$set': {'price': 4.5, 'updatedAt': datetime(2020, 1, 1)}})
+    collection.delete_one({'id': 'mirror-6'})
+    catalog.poll(collection)
+    catalog.reconcile(collection)
+
+    assert catalog.get('mirror-5').get('price') == 4.5
+    assert catalog.get('mirror-6') is None
+    assert catalog.high_water == datetime(2024, 3, 1) + timedelta(hours=119 * 7)
+
+
+def test_local_writes_do_not_advance_the_poll_cursor(catalog):
+    high_water = catalog.high_water
+    catalog.upsert({'_id': 'local', 'id': 'local', 'price': 1.0, 'updatedAt': datetime(2099, 1, 1)})
+
+    assert catalog.high_water == high_water
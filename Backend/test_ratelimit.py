@@ -0,0 +1,42 @@
+from ratelimit import LocalBucketStore, RateLimiter
+
+
+def limiter():
+    return RateLimiter(LocalBucketStore(), {
+        'login': [('ip', 3, 60), ('email', 5, 60)]
+    })
+
+
+def test_throttled_ip_does_not_drain_email_bucket():
+    rate_limiter = limiter()
+    attacker = {'ip': '203.0.113.9', 'email': 'victim@example.com'}
+
+    results = [rate_limiter.check('login', attacker)[0] for _ in range(20)]
+
+    assert results[:3] == [None, None, None]
+    assert set(results[3:]) == {'ip'}
+    assert rate_limiter.check('login', {'ip': '198.51.100.1', 'email': 'victim@example.com'}) == (None, 0.0)
+
+
+def test_denial_reports_retry_after():
+    rate_limiter = limiter()
+    keys = {'ip': '203.0.113.9'}
+
+    for _ in range(3):
+        assert rate_limiter.check('login', keys)[0] is None
+
+    throttled_by, retry_after = rate_limiter.check('login', keys)
+    assert throttled_by == 'ip'
+    assert retry_after > 0
+
+
+def test_client_ip_uses_hop_added_by_trusted_proxy(app_module):
+    app = app_module.app
+    app.config['RATE_LIMIT_TRUST_PROXY'] = 1
+    try:
+        with app.test_request_context(headers={'X-Forwarded-For': '10.9.9.9, 198.51.100.7'}):
+            assert app_module.client_ip() == '198.51.100.7'
+        with app.test_request_context(environ_base={'REMOTE_ADDR': '10.0.0.2'}):
+            assert app_module.client_ip() == '10.0.0.2'
+    finally:
+        app.config['RATE_LIMIT_TRUST_PROXY'] = 0
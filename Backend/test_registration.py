@@ -0,0 +1,36 @@
+def register_row(index, **overrides):
+    row = {
+        'fullName': 'Bulk User %d' % index,
+        'email': 'bulk-%d@example.com' % index,
+        'phone': '555010%04d' % index,
+        'password': 'secret1',
+        'confirmPassword': 'secret1'
+    }
+    row.update(overrides)
+    return row
+
+
+def test_bulk_reports_wrongly_typed_rows_as_invalid(app_module, client, auth):
+    user_id = client.get('/api/auth/verify', headers=auth).get_json()['user']['id']
+    app_module.app.config['OPERATOR_USER_IDS'].add(user_id)
+    try:
+        response = client.post('/api/users/bulk', headers=auth, json={'users': [
+            register_row(1),
+            register_row(2, phone=5550100002),
+            register_row(3, fullName=None)
+        ]})
+    finally:
+        app_module.app.config['OPERATOR_USER_IDS'].discard(user_id)
+
+    assert response.status_code == 207
+    results = response.get_json()['results']
+    assert [result['status'] for result in results] == ['created', 'invalid', 'invalid']
+    assert results[1]['errors'] == {'phone': 'Must be a string'}
+    assert results[2]['errors'] == {'fullName': 'Must be a string'}
+
+
+def test_register_rejects_non_string_fields(client):
+    response = client.post('/api/auth/register', json={'name': 42, 'email': 'typed@example.com', 'password': 'secret1'})
+
+    assert response.status_code == 400
+    assert response.get_json()['errors'] == {'name': 'Must be a string'}
@@ -0,0 +1,59 @@
+import pytest
+
+pytest.importorskip('mongomock')
+
+from roundtrips import RoundtripBudgetExceeded
+
+
+@pytest.fixture
+def budgets(app_module):
+    original = dict(app_module.app.config['DB_ROUNDTRIP_BUDGETS'])
+    yield app_module.app.config['DB_ROUNDTRIP_BUDGETS']
+    app_module.app.config['DB_ROUNDTRIP_BUDGETS'].clear()
+    app_module.app.config['DB_ROUNDTRIP_BUDGETS'].update(original)
+
+
+def create_product(client, auth, title='Budget widget'):
+    response = client.post('/api/products', json={'title': title, 'description': 'A widget', 'price': 9.5}, headers=auth)
+    assert response.status_code == 201
+    return response.get_json()['product']['id']
+
+
+def test_stand_in_reports_roundtrips(client, auth):
+    response = client.post('/api/products', json={'title': 'Counted', 'description': 'A widget', 'price': 3}, headers=auth)
+
+    assert response.status_code == 201
+    assert int(response.headers['X-DB-Roundtrips']) >= 2
+
+
+def test_routes_stay_within_budget(client, auth):
+    product_id = create_product(client, auth)
+
+    responses = [
+        client.get('/api/products?limit=5', headers=auth),
+        client.get('/api/products/' + product_id, headers=auth),
+        client.put('/api/products/' + product_id, json={'price': 12}, headers=auth),
+        client.delete('/api/products/' + product_id, headers=auth),
+        client.get('/api/auth/verify', headers=auth)
+    ]
+
+    assert [response.status_code for response in responses] == [200, 200, 200, 200, 200]
+
+
+def test_over_budget_route_raises(client, auth, budgets):
+    product_id = create_product(client, auth)
+    budgets['update_product'] = 1
+
+    with pytest.raises(RoundtripBudgetExceeded, match='update_product made'):
+        client.put('/api/products/' + product_id, json={'price': 15}, headers=auth)
+
+
+def test_non_strict_mode_only_logs(app_module, client, auth, budgets):
+    budgets['get_products'] = 0
+    app_module.app.config['DB_BUDGET_STRICT'] = False
+    try:
+        response = client.get('/api/products', headers=auth)
+    finally:
+        app_module.app.config['DB_BUDGET_STRICT'] = None
+
+    assert response.status_code == 200
@@ -0,0 +1,71 @@
+import json
+import os
+import pickle
+import tempfile
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+from search_index import SearchIndex
+
+
+@pytest.fixture
+def products():
+    collection = mongomock.MongoClient().db.products
+    collection.insert_many([
+        {'id': 'kb', 'title': 'Wireless keyboard', 'description': 'Compact keys', 'createdAt': datetime(2024, 1, 1)},
+        {'id': 'ms', 'title': 'Wireless mouse', 'description': 'Silent clicks', 'createdAt': datetime(2024, 1, 2)},
+        {'id': 'lm', 'title': 'Desk lamp', 'description': 'Warm light', 'createdAt': datetime(2024, 1, 3)}
+    ])
+    return collection
+
+
+@pytest.fixture
+def path():
+    return os.path.join(tempfile.mkdtemp(), 'search_index.snapshot')
+
+
+def test_snapshot_round_trip(products, path):
+    index = SearchIndex()
+    index.build(products)
+    index.save(path)
+
+    restored = SearchIndex()
+    restored.load(path, products)
+
+    assert restored.search('wireless') == index.search('wireless')
+    assert restored.stats() == index.stats()
+
+
+class Exploit:
+    def __reduce__(self):
+        return (os.remove, (self.path,))
+
+
+def test_pickle_snapshots_are_rejected_without_running_them(products, path):
+    victim = path + '.victim'
+    open(victim, 'w').close()
+    exploit = Exploit()
+    exploit.path = victim
+    with open(path, 'wb') as f:
+        pickle.dump({'version': 1, 'payload': exploit}, f)
+
+    with pytest.raises(ValueError):
+        SearchIndex().load(path, products)
+    assert os.path.exists(victim)
+
+
+def test_other_snapshot_versions_are_rejected(products, path):
+    index = SearchIndex()
+    index.build(products)
+    index.save(path)
+    with open(path) as f:
+        state = json.load(f)
+    state['version'] = 1
+    with open(path, 'w') as f:
+        json.dump(state, f)
+
+    with pytest.raises(ValueError, match='version'):
+        SearchIndex().load(path, products)
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+import seed
+from indexes import INDEXES
+
+
+@pytest.fixture
+def options():
+    return {
+        'mongo_uri': 'mongodb://seed-test',
+        'database': 'seed_db',
+        'seed': 1,
+        'email_domain': 'seed.example.com',
+        'jwt_fraction': 0.5,
+        'creators': 5,
+        'title_words': seed.parse_distribution('normal:3:1'),
+        'description_words': seed.parse_distribution('fixed:8'),
+        'price': seed.parse_distribution('lognormal:3.5:1.0'),
+        'created_from': datetime(2022, 1, 1),
+        'created_to': datetime(2025, 1, 1),
+        'created_skew': 0.0,
+        'password_hash': 'hash'
+    }
+
+
+@pytest.fixture
+def database(monkeypatch):
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(seed, 'MongoClient', lambda uri: client)
+    assert seed.main(['--mongo-uri', 'mongodb://seed-test', '--database', 'seed_db', '--users', '0', '--products', '0']) == 0
+    return client['seed_db']
+
+
+def test_rerun_skips_existing_products(database, options):
+    assert seed.insert_batch('products', 0, 0, 50, options) == ('products', 50, 0)
+    assert seed.insert_batch('products', 0, 0, 50, options) == ('products', 0, 50)
+    assert database['products'].count_documents({}) == 50
+
+
+def test_products_carry_updated_at(database, options):
+    seed.insert_batch('products', 1, 50, 10, options)
+
+    for product in database['products'].find():
+        assert product['updatedAt'] == product['createdAt']
+
+
+def test_seeder_creates_the_app_indexes(database):
+    for name, (collection, keys, options) in INDEXES.items():
+        created = [index['key'] for index in database[collection].index_information().values()]
+        expected = [(keys, 1)] if isinstance(keys, str) else keys
+        assert list(expected) in [list(key) for key in created], name
@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+pytest.importorskip('scipy')
+
+from similar import SimilarityIndex
+
+WORDS = 'red blue green wireless usb keyboard mouse monitor cable lamp desk chair'.split()
+
+
+def product(rng, number):
+    return {
+        '_id': 'key-%d' % number,
+        'id': 'product-%d' % number,
+        'title': ' '.join(rng.sample(WORDS, 3)),
+        'description': ' '.join(rng.choices(WORDS, k=6)),
+        'price': number
+    }
+
+
+def scores(index, product_id):
+    return {result['id']: result['score'] for result in index.similar(product_id, 50)}
+
+
+def test_incremental_updates_match_a_fresh_build():
+    rng = random.Random(7)
+    documents = {number: product(rng, number) for number in range(100)}
+    incremental = SimilarityIndex()
+    for document in documents.values():
+        incremental.add(document)
+    incremental.vectorize()
+
+    for _ in range(20):
+        for _ in range(10):
+            number = rng.randrange(130)
+            if number in documents and rng.random() < 0.3:
+                incremental.remove(documents.pop(number)['_id'])
+            else:
+                documents[number] = product(rng, number)
+                incremental.add(documents[number])
+        incremental.vectorize()
+
+    fresh = SimilarityIndex()
+    for document in documents.values():
+        fresh.add(document)
+    fresh.vectorize()
+
+    assert incremental.compactions > 0
+    for number in list(documents)[:10]:
+        expected = scores(fresh, documents[number]['id'])
+        actual = scores(incremental, documents[number]['id'])
+        assert actual.keys() == expected.keys()
+        assert all(abs(actual[key] - expected[key]) < 1e-3 for key in expected)
+
+
+def test_deleted_products_are_not_returned():
+    index = SimilarityIndex()
+    index.add({'_id': 'a', 'id': 'a', 'title': 'usb keyboard', 'description': 'wireless'})
+    index.add({'_id': 'b', 'id': 'b', 'title': 'usb keyboard', 'description': 'wired'})
+    index.vectorize()
+    index.remove('b')
+
+    assert index.similar('a') == []
+    assert index.similar('b') is None
@@ -0,0 +1,59 @@
+import itertools
+
+import pytest
+
+emails = itertools.count()
+
+
+@pytest.fixture
+def session(client):
+    credentials = {'name': 'Token Tester', 'email': 'tokens-%d@example.com' % next(emails), 'password': 'secret1'}
+    response = client.post('/api/auth/register', json=credentials)
+    assert response.status_code == 201
+    return response.get_json()
+
+
+def refresh(client, refresh_token):
+    return client.post('/api/auth/refresh', json={'refreshToken': refresh_token})
+
+
+def bearer(token):
+    return {'Authorization': 'Bearer ' + token}
+
+
+def test_access_tokens_are_short_lived(session):
+    assert session['expiresIn'] == 15 * 60
+
+
+def test_refresh_rotates_the_token_pair(client, session):
+    response = refresh(client, session['refreshToken'])
+
+    assert response.status_code == 200
+    rotated = response.get_json()
+    assert rotated['refreshToken'] != session['refreshToken']
+    assert client.get('/api/auth/verify', headers=bearer(rotated['token'])).status_code == 200
+    assert refresh(client, rotated['refreshToken']).status_code == 200
+
+
+def test_reused_refresh_token_revokes_the_family(client, session):
+    rotated = refresh(client, session['refreshToken']).get_json()
+
+    assert refresh(client, session['refreshToken']).status_code == 401
+    # The legitimate holder's newer token is part of the same family.
+    assert refresh(client, rotated['refreshToken']).status_code == 401
+
+
+def test_logout_revokes_access_and_refresh_tokens(client, session):
+    response = client.post('/api/auth/logout', json={'refreshToken': session['refreshToken']},
+                           headers=bearer(session['token']))
+
+    assert response.status_code == 200
+    verify = client.get('/api/auth/verify', headers=bearer(session['token']))
+    assert verify.status_code == 401
+    assert verify.get_json()['error'] == 'Token has been revoked'
+    assert refresh(client, session['refreshToken']).status_code == 401
+
+
+def test_refresh_requires_a_token(client):
+    assert refresh(client, None).status_code == 400
+    assert refresh(client, 'not-a-real-token').status_code == 401
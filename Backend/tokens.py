@@ -0,0 +1,85 @@
+import hashlib
+import logging
+import secrets
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger('tokens')
+
+
+def new_refresh_token():
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token):
+    # Only the digest is stored, so a leaked refresh_tokens collection
+    # cannot be replayed.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def epoch_seconds(value):
+    if isinstance(value, datetime):
+        return (value - datetime(1970, 1, 1)).total_seconds()
+    return value
+
+
+def new_token_id():
+    return secrets.token_urlsafe(12)
+
+
+class RevocationSet:
+    # Revoked access-token ids, held until the token would have expired
+    # anyway. Compaction drops those entries, so the set stays as small as
+    # the number of revocations within one access-token lifetime.
+    def __init__(self, clock_margin=30):
+        self.clock_margin = clock_margin
+        self._lock = threading.Lock()
+        self._expiry = {}
+        self.high_water = None
+
+    def __contains__(self, token_id):
+        return token_id in self._expiry
+
+    def __len__(self):
+        return len(self._expiry)
+
+    def add(self, token_id, expires_at):
+        with self._lock:
+            self._expiry[token_id] = epoch_seconds(expires_at)
+
+    def compact(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            # Rebuilding keeps lookups on a plain dict without per-entry locking.
+            live = {token_id: expiry for token_id, expiry in self._expiry.items() if expiry > now}
+            removed = len(self._expiry) - len(live)
+            self._expiry = live
+        return removed
+
+    def sync(self, revoked_collection):
+        query = {'expiresAt': {'$gt': datetime.utcnow()}}
+        if self.high_water is not None:
+            # Overlap by clock_margin: revokedAt comes from the revoking host's
+            # clock, and several revocations can share a millisecond. Re-adding
+            # a known id is harmless.
+            query['revokedAt'] = {'$gte': self.high_water - timedelta(seconds=self.clock_margin)}
+        for entry in revoked_collection.find(query, {'expiresAt': 1, 'revokedAt': 1}):
+            self.add(entry['_id'], entry['expiresAt'])
+            if self.high_water is None or entry['revokedAt'] > self.high_water:
+                self.high_water = entry['revokedAt']
+
+
+def start_revocation_sync(revocations, revoked_collection, interval):
+    def run():
+        while True:
+            try:
+                revocations.sync(revoked_collection)
+                revocations.compact()
+            except Exception as e:
+                logger.warning('Revocation sync failed: %s', e)
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='revocation-sync', daemon=True)
+    thread.start()
+    return thread
@@ -1,4 +1,6 @@
-import React, { createContext, useContext, useState, useEffect, ReactNode } from 'react';
+import React, { createContext, useContext, useState, useEffect, useRef, ReactNode } from 'react';
+
+const AUTH_API_URL = 'http://localhost:5001/api/auth';
 
 interface User {
     _id: string;
@@ -11,7 +13,7 @@ interface AuthContextType {
     user: User | null;
     isAuthenticated: boolean;
     login: (email: string, password: string) => Promise<boolean>;
-    logout: () => void;
+    logout: () => Promise<void>;
     makeAuthenticatedRequest: (url: string, options?: RequestInit) => Promise<Response>;
 }
 
@@ -23,8 +25,34 @@ interface AuthProviderProps {
 
 export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
     const [user, setUser] = useState<User | null>(null);
-    const [token, setToken] = useState<string | null>(null);
     const [isAuthenticated, setIsAuthenticated] = useState<boolean>(false);
+    // Access tokens are short-lived; the refresh token is exchanged for a new
+    // pair when a request comes back 401. Concurrent 401s share one refresh,
+    // since each refresh token can only be used once.
+    const tokenRef = useRef<string | null>(null);
+    const refreshTokenRef = useRef<string | null>(null);
+    const refreshingRef = useRef<Promise<string | null> | null>(null);
+
+    const storeTokens = (accessToken: string, refreshToken: string | null) => {
+        tokenRef.current = accessToken;
+        refreshTokenRef.current = refreshToken;
+        localStorage.setItem('jwt_token', accessToken);
+        if (refreshToken) {
+            localStorage.setItem('refresh_token', refreshToken);
+        } else {
+            localStorage.removeItem('refresh_token');
+        }
+    };
+
+    const clearSession = () => {
+        tokenRef.current = null;
+        refreshTokenRef.current = null;
+        setUser(null);
+        setIsAuthenticated(false);
+        localStorage.removeItem('jwt_token');
+        localStorage.removeItem('refresh_token');
+        localStorage.removeItem('user');
+    };
 
     useEffect(() => {
         // Check for existing token on app load
@@ -33,13 +61,13 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
         
         if (savedToken && savedUser) {
             try {
-                setToken(savedToken);
+                tokenRef.current = savedToken;
+                refreshTokenRef.current = localStorage.getItem('refresh_token');
                 setUser(JSON.parse(savedUser));
                 setIsAuthenticated(true);
             } catch (error) {
                 // Clear invalid data
-                localStorage.removeItem('jwt_token');
-                localStorage.removeItem('user');
+                clearSession();
             }
         }
     }, []);
@@ -48,7 +76,7 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
         try {
             console.log('Attempting login with:', { email, password: '***' });
             
-            const response = await fetch('http://localhost:5001/api/auth/login', {
+            const response = await fetch(`${AUTH_API_URL}/login`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -75,12 +103,11 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
 
                     console.log('Setting user data:', userData);
                     
-                    setToken(token);
+                    storeTokens(token, data.refreshToken || null);
                     setUser(userData);
                     setIsAuthenticated(true);
 
                     // Save to localStorage
-                    localStorage.setItem('jwt_token', token);
                     localStorage.setItem('user', JSON.stringify(userData));
 
                     return true;
@@ -98,32 +125,85 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
         }
     };
 
-    const logout = () => {
-        setToken(null);
-        setUser(null);
-        setIsAuthenticated(false);
-        localStorage.removeItem('jwt_token');
-        localStorage.removeItem('user');
+    const refreshAccessToken = (): Promise<string | null> => {
+        const refreshToken = refreshTokenRef.current;
+        if (!refreshToken) {
+            return Promise.resolve(null);
+        }
+        if (!refreshingRef.current) {
+            refreshingRef.current = (async () => {
+                try {
+                    const response = await fetch(`${AUTH_API_URL}/refresh`, {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ refreshToken }),
+                    });
+                    if (!response.ok) {
+                        return null;
+                    }
+                    const data = await response.json();
+                    storeTokens(data.token, data.refreshToken);
+                    return data.token as string;
+                } catch (error) {
+                    console.error('Token refresh error:', error);
+                    return null;
+                } finally {
+                    refreshingRef.current = null;
+                }
+            })();
+        }
+        return refreshingRef.current;
+    };
+
+    const logout = async () => {
+        const accessToken = tokenRef.current;
+        const refreshToken = refreshTokenRef.current;
+        clearSession();
+        if (accessToken) {
+            // Revokes the access token and the whole refresh-token family.
+            try {
+                await fetch(`${AUTH_API_URL}/logout`, {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'Authorization': `Bearer ${accessToken}`,
+                    },
+                    body: JSON.stringify({ refreshToken }),
+                });
+            } catch (error) {
+                console.error('Logout error:', error);
+            }
+        }
     };
 
     const makeAuthenticatedRequest = async (url: string, options: RequestInit = {}): Promise<Response> => {
-        const headers = {
-            'Content-Type': 'application/json',
-            ...options.headers,
-        };
+        const send = (accessToken: string | null) => {
+            const headers: Record<string, string> = {
+                'Content-Type': 'application/json',
+                ...(options.headers as Record<string, string>),
+            };
+
+            if (accessToken) {
+                headers['Authorization'] = `Bearer ${accessToken}`;
+            }
 
-        if (token) {
-            headers['Authorization'] = `Bearer ${token}`;
-        }
+            return fetch(url, {
+                ...options,
+                headers,
+            });
+        };
 
-        const response = await fetch(url, {
-            ...options,
-            headers,
-        });
+        let response = await send(tokenRef.current);
 
-        // If token is invalid, logout
+        // An expired access token is replaced once; if that fails, logout
         if (response.status === 401) {
-            logout();
+            const refreshed = await refreshAccessToken();
+            if (refreshed) {
+                response = await send(refreshed);
+            }
+            if (response.status === 401) {
+                clearSession();
+            }
         }
 
         return response;